@@ -51,12 +51,60 @@ class Settings(BaseSettings):
     openrouter_model: str = (
         "meta-llama/llama-3.1-8b-instruct:free"  # OpenRouter model (free tier default)
     )
+    claude_input_cost_per_mtok: float = 3.0  # USD per million prompt tokens (cost estimates)
+    claude_output_cost_per_mtok: float = 15.0  # USD per million completion tokens
+    openrouter_input_cost_per_mtok: float = 0.0  # Free tier default
+    openrouter_output_cost_per_mtok: float = 0.0
+    llm_max_concurrent_calls: int = 4  # In-flight LLM calls per process (also the pool size)
+    llm_queue_timeout_seconds: float = 60.0  # Wait for a free call slot before failing as busy
+    llm_http_connect_timeout: float = 10.0  # Seconds to establish a connection
+    llm_http_read_timeout: float = 120.0  # Seconds to wait for a model response
+    llm_max_retries: int = 3  # Retries for 429 (rate limited) / 529 (overloaded)
+    llm_retry_backoff_base: float = 2.0  # Backoff base in seconds (doubles per retry, jittered)
+    categorization_write_batch_size: int = 20  # Streamed AI results written per DB batch
+    categorization_write_flush_seconds: float = 1.0  # Write a partial batch once it is this old
 
     # SimpleFin (optional, for development/testing only)
     simplefin_access_url: str | None = None  # Pre-claimed access URL for dev/test
-
-    # Cron Jobs
-    enable_cron_jobs: bool = True  # Enable/disable scheduled background tasks
+    simplefin_sync_overlap_days: int = 3  # Re-fetch window before the high-water mark for late-posting transactions
+    simplefin_initial_lookback_days: int = 30  # Scheduled-sync window for items never synced before
+    simplefin_balance_refresh_hours: int = 4  # Interval for the balances-only cron refresh
+    simplefin_http_connect_timeout: float = 10.0  # Seconds to establish a connection
+    simplefin_http_read_timeout: float = 60.0  # Seconds to wait for a response
+    simplefin_http_max_connections: int = 20  # Pooled connections across all hosts
+    simplefin_http_max_connections_per_host: int = 5  # Concurrent requests per bridge host
+    simplefin_http_max_retries: int = 3  # Retries for transient GET failures
+    simplefin_http_backoff_base: float = 1.0  # Backoff base in seconds (doubles per retry, jittered)
+    simplefin_breaker_failure_threshold: int = 3  # Consecutive failures before an institution's circuit opens
+    simplefin_breaker_cooldown_seconds: int = 900  # Fail-fast period before a half-open probe
+    simplefin_backfill_window_days: int = 30  # Days of history per backfill request
+    simplefin_backfill_concurrency: int = 2  # Backfill windows fetched in parallel
+    simplefin_stream_batch_size: int = 200  # Transactions decoded per upsert batch while streaming
+    simplefin_archive_enabled: bool = True  # Keep gzip'd raw payloads for replay
+    simplefin_archive_dir: str = "archive/simplefin"  # Content-addressed payload store
+    simplefin_archive_retention_days: int = 30  # Archived payloads older than this are deleted
+    simplefin_daily_request_quota: int = 24  # SimpleFin requests allowed per item per UTC day
+    simplefin_balance_refresh_quota_reserve: int = 2  # Requests kept back from balance refreshes
+    simplefin_scheduler_tick_seconds: int = 300  # How often due items are dispatched
+    simplefin_scheduler_max_per_tick: int = 20  # Items synced per tick (steady outbound rate)
+    simplefin_sync_lease_seconds: int = 900  # Single-flight lease; expires if a sync crashes
+    simplefin_sync_attach_timeout_seconds: int = 60  # How long a duplicate request waits on the in-flight sync
+    snapshot_gap_fill_hour_utc: int = 23  # UTC hour after which items not snapshotted today get a snapshot job
+
+    # Bulk writes (large SimpleFin syncs are split into chunks)
+    bulk_upsert_chunk_size: int = 500  # Rows per PostgREST upsert request
+    bulk_upsert_concurrency: int = 4  # Max chunk requests in flight at once
+
+    # Background worker (python -m app.worker)
+    enable_cron_jobs: bool = True  # Enable/disable scheduled background tasks in the worker
+    worker_poll_seconds: int = 5  # How often an idle worker polls the job queue
+    worker_concurrency: int = 4  # Queued jobs run at once per worker
+    job_lease_seconds: int = 120  # Claimed job lease; a crashed worker's jobs are reclaimed after this
+    job_max_attempts: int = 3  # Attempts per job before it is marked failed
+    job_retry_backoff_seconds: int = 30  # Retry delay after the first failure (doubles each attempt)
+    worker_lease_seconds: int = 30  # Scheduler lease TTL; a dead leader is replaced after this
+    worker_heartbeat_seconds: int = 10  # How often workers renew their leases
+    worker_sharding: bool = False  # Split scheduled item work across all live workers
 
     @property
     def is_development(self) -> bool:
@@ -1,213 +1,257 @@
-"""Scheduled cron jobs for background tasks."""
-
-from datetime import date, timedelta
+"""Scheduled cron jobs for background tasks.
+
+Started by the worker process (python -m app.worker), not the API. Every
+worker ticks these schedules, but scheduled item work only runs for the
+items this worker owns: all of them on the elected leader, none on standby
+workers, or its shard when WORKER_SHARDING is on. Per-item syncs, balance
+refreshes and snapshots are enqueued on the durable job queue (app/jobs.py)
+rather than run inline, so every worker's pool shares the work and failures
+are retried.
+"""
+
+import asyncio
+from datetime import date, datetime, timezone
 from fastapi_utils.tasks import repeat_every
 from app.database import Database, get_supabase_client
-from app.services.simplefin_service import (
-    fetch_accounts,
-    parse_simplefin_accounts,
-    parse_simplefin_transactions,
-)
-from app.services.snapshot_service import SnapshotService
-from app.utils.encryption import decrypt_token
+from app.services import simplefin_sync_service, sync_scheduler
+from app.services import job_queue, payload_archive
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.worker_leadership import leadership
 from app.config import get_settings
 
 
 settings = get_settings()
 
 
-@repeat_every(seconds=60 * 60 * 24)  # Run every 24 hours
+@repeat_every(seconds=settings.simplefin_scheduler_tick_seconds)
 async def sync_simplefin_transactions():
     """
-    Auto-sync SimpleFin transactions for all active items.
-
-    Runs daily to fetch new transactions from SimpleFin.
-    Respects the 24-hour rate limit per item.
+    Dispatch scheduled SimpleFin syncs for items whose daily slot has passed.
+
+    Each item has a stable, hashed slot in the UTC day; every tick queues a
+    sync for the items that have not synced since their latest slot (up to
+    simplefin_scheduler_max_per_tick, most overdue first), so load is spread
+    across the day and a missed slot is caught up on the next tick. Items
+    with no SimpleFin quota left today are skipped until the quota resets.
+    The worker pool runs the queued syncs and resumes any interrupted backfill.
     """
-    print("[CRON] Starting SimpleFin transaction sync...")
-
     try:
         # Get Supabase client with service role (admin access)
         client = get_supabase_client()
         db = Database(client)
 
-        # Get all active SimpleFin items
-        active_items = db.get_active_simplefin_items()
+        now = datetime.now(timezone.utc)
+        active_items = await asyncio.to_thread(db.get_active_simplefin_items)
+        due_items = sync_scheduler.select_due_items(
+            [item for item in active_items if leadership.owns_item(item["id"])],
+            now,
+            limit=settings.simplefin_scheduler_max_per_tick,
+        )
 
-        if not active_items:
-            print("[CRON] No active SimpleFin items to sync")
+        if not due_items:
             return
 
-        print(f"[CRON] Found {len(active_items)} active SimpleFin item(s)")
+        print(f"[CRON] Queueing syncs for {len(due_items)} due SimpleFin item(s)")
 
-        synced_count = 0
+        queued_count = 0
         skipped_count = 0
         error_count = 0
 
-        for item in active_items:
+        for item in due_items:
             try:
-                # Check if we've synced in the last 24 hours (rate limit)
-                if item.get("last_synced_at"):
-                    from datetime import datetime, timezone
-
-                    last_synced = item["last_synced_at"]
-                    if isinstance(last_synced, str):
-                        last_synced = datetime.fromisoformat(
-                            last_synced.replace("Z", "+00:00")
-                        )
-
-                    time_since_sync = datetime.now(timezone.utc) - last_synced
-                    if time_since_sync.total_seconds() < 86400:  # 24 hours
-                        print(f"[CRON] Skipping item {item['id']} - synced recently")
-                        skipped_count += 1
-                        continue
-
-                # Create sync job
-                sync_job = db.create_simplefin_sync_job(
-                    {
-                        "user_id": item["user_id"],
-                        "simplefin_item_id": item["id"],
-                        "status": "running",
-                    }
+                if sync_scheduler.quota_remaining(item, now) <= 0:
+                    print(f"[CRON] Skipping item {item['id']} - daily quota used")
+                    skipped_count += 1
+                    continue
+
+                # Fetch from the item's high-water mark (minus overlap), or the
+                # initial lookback window if it has never been synced
+                sync_job = await simplefin_sync_service.enqueue_sync_job(
+                    db,
+                    item,
+                    default_lookback_days=settings.simplefin_initial_lookback_days,
+                    resume_backfill=True,
                 )
 
-                # Decrypt access URL
-                access_url = decrypt_token(item["access_url"])
+                print(f"[CRON] Queued sync {sync_job['id']} for item {item['id']}")
+                queued_count += 1
 
-                # Fetch accounts and transactions
-                # Get transactions from 30 days ago
-                from datetime import datetime
+            except (
+                CircuitOpenError,
+                simplefin_sync_service.SyncInProgressError,
+            ) as e:
+                print(f"[CRON] Skipping item {item['id']} - {str(e)}")
+                skipped_count += 1
 
-                start_date = int((datetime.now() - timedelta(days=30)).timestamp())
+            except Exception as e:
+                print(f"[CRON] Error queueing sync for item {item['id']}: {str(e)}")
+                error_count += 1
 
-                accounts_data = fetch_accounts(access_url, start_date=start_date)
+        print(
+            f"[CRON] SimpleFin sync dispatch complete: {queued_count} queued, {skipped_count} skipped, {error_count} errors"
+        )
 
-                # Parse and upsert accounts
-                accounts = parse_simplefin_accounts(
-                    accounts_data,
-                    item["id"],
-                    item["user_id"],
-                )
+    except Exception as e:
+        print(f"[CRON] Fatal error in SimpleFin sync: {str(e)}")
 
-                upserted_accounts = []
-                if accounts:
-                    upserted_accounts = db.upsert_simplefin_accounts(accounts)
 
-                # Build account ID map
-                account_id_map = {
-                    acc["simplefin_account_id"]: acc["id"] for acc in upserted_accounts
-                }
+# Wait one interval before the first run: the startup sync already refreshes balances
+@repeat_every(
+    seconds=60 * 60 * settings.simplefin_balance_refresh_hours,
+    wait_first=60 * 60 * settings.simplefin_balance_refresh_hours,
+)
+async def refresh_simplefin_balances():
+    """
+    Queue SimpleFin balance refreshes for all active items.
 
-                # Parse and upsert transactions
-                transactions = parse_simplefin_transactions(
-                    accounts_data,
-                    account_id_map,
-                    item["user_id"],
-                )
+    Runs every few hours and queues a 'balance_refresh' job per item (once
+    per item per interval), which uses SimpleFin's balances-only mode, so
+    net worth and goal progress stay current between daily transaction
+    syncs. The worker pool runs the refreshes and retries failures.
+    """
+    print("[CRON] Queueing SimpleFin balance refreshes...")
 
-                if transactions:
-                    db.upsert_simplefin_transactions(transactions)
-
-                # Update sync job
-                db.update_simplefin_sync_job(
-                    sync_job["id"],
-                    {
-                        "status": "completed",
-                        "completed_at": "now()",
-                        "accounts_synced": len(accounts),
-                        "transactions_added": len(transactions),
-                    },
-                )
+    try:
+        client = get_supabase_client()
+        db = Database(client)
 
-                # Update item's last_synced_at
-                db.update_simplefin_item(
-                    item["id"],
-                    {
-                        "last_synced_at": "now()",
-                    },
-                )
+        active_items = [
+            item
+            for item in await asyncio.to_thread(db.get_active_simplefin_items)
+            if leadership.owns_item(item["id"])
+        ]
 
-                print(
-                    f"[CRON] Synced item {item['id']}: {len(accounts)} accounts, {len(transactions)} transactions"
+        if not active_items:
+            print("[CRON] No active SimpleFin items to refresh on this worker")
+            return
+
+        interval_seconds = 60 * 60 * settings.simplefin_balance_refresh_hours
+        interval = int(datetime.now(timezone.utc).timestamp() // interval_seconds)
+        queued_count = 0
+        error_count = 0
+
+        for item in active_items:
+            # Keep a reserve so balance refreshes never starve the daily sync
+            if (
+                sync_scheduler.quota_remaining(item)
+                <= settings.simplefin_balance_refresh_quota_reserve
+            ):
+                continue
+
+            try:
+                await asyncio.to_thread(
+                    job_queue.enqueue,
+                    "balance_refresh",
+                    {"item_id": item["id"]},
+                    user_id=item["user_id"],
+                    dedupe_key=f"balance_refresh:{item['id']}:{interval}",
                 )
-                synced_count += 1
+                queued_count += 1
 
             except Exception as e:
-                print(f"[CRON] Error syncing item {item['id']}: {str(e)}")
+                print(
+                    f"[CRON] Error queueing balance refresh for item {item['id']}: {str(e)}"
+                )
                 error_count += 1
 
-                # Mark sync job as failed if it exists
-                if "sync_job" in locals():
-                    db.update_simplefin_sync_job(
-                        sync_job["id"],
-                        {
-                            "status": "failed",
-                            "completed_at": "now()",
-                            "error_message": str(e),
-                        },
-                    )
-
         print(
-            f"[CRON] SimpleFin sync complete: {synced_count} synced, {skipped_count} skipped, {error_count} errors"
+            f"[CRON] Balance refresh queued: {queued_count} item(s), {error_count} errors"
         )
 
     except Exception as e:
-        print(f"[CRON] Fatal error in SimpleFin sync: {str(e)}")
+        print(f"[CRON] Fatal error in balance refresh: {str(e)}")
 
 
-@repeat_every(seconds=60 * 60 * 24)  # Run every 24 hours
+# UTC day the snapshot gap fill last ran on this worker
+_snapshots_gap_filled_on: date | None = None
+
+
+@repeat_every(
+    seconds=settings.simplefin_scheduler_tick_seconds,
+    wait_first=settings.simplefin_scheduler_tick_seconds,
+)
 async def update_daily_snapshots():
     """
-    Store daily account balance snapshots for all users.
-
-    Snapshots current balances from simplefin_accounts table.
+    Fill in daily account balance snapshots for items that have none today.
+
+    Syncs and balance refreshes snapshot the accounts they upsert and stamp
+    simplefin_items.last_snapshot_date, so this only queues snapshot jobs for
+    the items that haven't (e.g. out of quota or behind an open circuit) to
+    keep the balance history continuous for charting. It runs once a day, at
+    the first tick after snapshot_gap_fill_hour_utc, when nearly every item
+    has had its scheduled sync; earlier in the day it would snapshot items
+    whose sync slot simply hasn't come yet.
     Net worth is calculated on-the-fly when requested.
     """
-    print("[CRON] Starting daily snapshots update...")
+    global _snapshots_gap_filled_on
+
+    now = datetime.now(timezone.utc)
+    if (
+        now.hour < settings.snapshot_gap_fill_hour_utc
+        or _snapshots_gap_filled_on == sync_scheduler.utc_today(now)
+    ):
+        return
+    _snapshots_gap_filled_on = sync_scheduler.utc_today(now)
+
+    print("[CRON] Starting daily snapshots gap fill...")
 
     try:
         # Get Supabase client with service role
         client = get_supabase_client()
         db = Database(client)
 
-        # Get all users who have SimpleFin items
-        result = (
-            client.table("simplefin_items")
-            .select("user_id")
-            .eq("status", "active")
-            .execute()
-        )
+        today = sync_scheduler.utc_today(now)
+        stale_items = [
+            item
+            for item in await asyncio.to_thread(db.get_active_simplefin_items)
+            if item.get("last_snapshot_date") != today.isoformat()
+            and leadership.owns_item(item["id"])
+        ]
 
-        if not result.data:
-            print("[CRON] No users with active SimpleFin items")
+        if not stale_items:
+            print("[CRON] All active SimpleFin items already snapshotted today")
             return
 
-        # Get unique user IDs
-        user_ids = list(set(item["user_id"] for item in result.data))
-        print(f"[CRON] Updating snapshots for {len(user_ids)} user(s)")
-
-        success_count = 0
+        queued_count = 0
         error_count = 0
 
-        for user_id in user_ids:
+        for item in stale_items:
             try:
-                snapshot_service = SnapshotService(db)
-
-                # Store account balance snapshots for today
-                await snapshot_service.store_daily_account_balances(
-                    user_id=user_id, snapshot_date=date.today()
+                await asyncio.to_thread(
+                    job_queue.enqueue,
+                    "snapshot",
+                    {"item_id": item["id"], "snapshot_date": today.isoformat()},
+                    user_id=item["user_id"],
+                    dedupe_key=f"snapshot:{item['id']}:{today.isoformat()}",
                 )
-
-                print(f"[CRON] Updated snapshots for user {user_id}")
-                success_count += 1
+                queued_count += 1
 
             except Exception as e:
-                print(f"[CRON] Error updating snapshots for user {user_id}: {str(e)}")
+                print(f"[CRON] Error queueing snapshots for item {item['id']}: {str(e)}")
                 error_count += 1
 
         print(
-            f"[CRON] Snapshots update complete: {success_count} succeeded, {error_count} errors"
+            f"[CRON] Snapshots gap fill queued: {queued_count} item(s), {error_count} errors"
         )
 
     except Exception as e:
         print(f"[CRON] Fatal error in snapshots update: {str(e)}")
+
+
+
+@repeat_every(seconds=60 * 60 * 24)  # Run every 24 hours
+async def prune_simplefin_archive():
+    """
+    Delete raw SimpleFin payloads older than simplefin_archive_retention_days.
+
+    The archive is on each worker's local disk, so every worker prunes its
+    own regardless of leadership.
+    """
+    try:
+        deleted = await asyncio.to_thread(
+            payload_archive.prune, settings.simplefin_archive_retention_days
+        )
+        print(f"[CRON] Pruned {deleted} archived SimpleFin payload(s)")
+
+    except Exception as e:
+        print(f"[CRON] Error pruning SimpleFin payload archive: {str(e)}")
@@ -1,11 +1,16 @@
 """Supabase client setup and database utilities."""
 
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from functools import lru_cache
 from supabase import create_client, Client
 from postgrest import SyncPostgrestClient
 
 from app.config import get_settings
 
+logger = logging.getLogger("cashstate.database")
+
 
 @lru_cache
 def get_supabase_client() -> Client:
@@ -46,6 +51,85 @@ class Database:
     def __init__(self, client: Client | SyncPostgrestClient):
         self.client = client
 
+    # --- Bulk Writes ---
+
+    def bulk_upsert(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: str,
+        chunk_size: int | None = None,
+        max_concurrency: int | None = None,
+    ) -> dict:
+        """Upsert rows in fixed-size chunks with bounded concurrency.
+
+        Each chunk is its own PostgREST request, so request size and statement
+        time stay bounded and one bad row only fails its own chunk.
+
+        Args:
+            table: Table to upsert into.
+            rows: Rows to write.
+            on_conflict: Comma-separated conflict target columns.
+            chunk_size: Rows per request (defaults to settings.bulk_upsert_chunk_size).
+            max_concurrency: Max requests in flight (defaults to
+                settings.bulk_upsert_concurrency).
+
+        Returns:
+            {
+                "rows": [...],           # written rows, in input chunk order
+                "failed_chunks": [       # one entry per chunk that errored
+                    {"chunk": int, "rows": int, "error": str}
+                ],
+            }
+        """
+        if not rows:
+            return {"rows": [], "failed_chunks": []}
+
+        settings = get_settings()
+        chunk_size = max(1, chunk_size or settings.bulk_upsert_chunk_size)
+        max_concurrency = max(1, max_concurrency or settings.bulk_upsert_concurrency)
+
+        chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+        def write_chunk(chunk: list[dict]) -> list[dict]:
+            result = (
+                self.client.table(table)
+                .upsert(chunk, on_conflict=on_conflict)
+                .execute()
+            )
+            return result.data
+
+        written: dict[int, list[dict]] = {}
+        failed_chunks = []
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrency, len(chunks))
+        ) as pool:
+            futures = {
+                pool.submit(write_chunk, chunk): index
+                for index, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    written[index] = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"[DB] Upsert into {table} failed for chunk {index} "
+                        f"({len(chunks[index])} rows): {e}"
+                    )
+                    failed_chunks.append(
+                        {"chunk": index, "rows": len(chunks[index]), "error": str(e)}
+                    )
+
+        logger.info(
+            f"[DB] Upserted {len(rows)} rows into {table} in {len(chunks)} chunk(s), "
+            f"{len(failed_chunks)} failed"
+        )
+        return {
+            "rows": [row for index in sorted(written) for row in written[index]],
+            "failed_chunks": sorted(failed_chunks, key=lambda c: c["chunk"]),
+        }
+
     # --- Users ---
 
     def get_user_by_id(self, user_id: str) -> dict | None:
@@ -66,44 +150,63 @@ class Database:
 
     # --- SimpleFin Items ---
 
+    # Items come with their quota state from simplefin_item_sync_state
+    _SIMPLEFIN_ITEM_COLUMNS = "*, simplefin_item_sync_state(quota_date, quota_used)"
+
+    @staticmethod
+    def _with_sync_state(item: dict) -> dict:
+        """Flatten the embedded sync state (quota_date, quota_used) into the item."""
+        state = item.pop("simplefin_item_sync_state", None)
+        if isinstance(state, list):
+            state = state[0] if state else None
+        item.update(state or {})
+        return item
+
     def create_simplefin_item(self, item_data: dict) -> dict:
         result = self.client.table("simplefin_items").insert(item_data).execute()
         return result.data[0]
 
-    def get_simplefin_item_by_id(self, item_id: str) -> dict | None:
-        result = (
-            self.client.table("simplefin_items").select("*").eq("id", item_id).execute()
+    def get_simplefin_item_by_id(
+        self, item_id: str, user_id: str | None = None
+    ) -> dict | None:
+        query = (
+            self.client.table("simplefin_items")
+            .select(self._SIMPLEFIN_ITEM_COLUMNS)
+            .eq("id", item_id)
         )
-        return result.data[0] if result.data else None
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = query.execute()
+        return self._with_sync_state(result.data[0]) if result.data else None
 
     def get_user_simplefin_items(self, user_id: str) -> list[dict]:
         result = (
             self.client.table("simplefin_items")
-            .select("*")
+            .select(self._SIMPLEFIN_ITEM_COLUMNS)
             .eq("user_id", user_id)
             .order("created_at", desc=True)
             .execute()
         )
-        return result.data
+        return [self._with_sync_state(item) for item in result.data]
 
     def get_active_simplefin_items(self) -> list[dict]:
         result = (
             self.client.table("simplefin_items")
-            .select("*")
+            .select(self._SIMPLEFIN_ITEM_COLUMNS)
             .eq("status", "active")
             .execute()
         )
-        return result.data
+        return [self._with_sync_state(item) for item in result.data]
 
     def get_user_active_simplefin_items(self, user_id: str) -> list[dict]:
         result = (
             self.client.table("simplefin_items")
-            .select("*")
+            .select(self._SIMPLEFIN_ITEM_COLUMNS)
             .eq("user_id", user_id)
             .eq("status", "active")
             .execute()
         )
-        return result.data
+        return [self._with_sync_state(item) for item in result.data]
 
     def update_simplefin_item(self, item_id: str, data: dict) -> dict:
         result = (
@@ -114,23 +217,76 @@ class Database:
         )
         return result.data[0] if result.data else None
 
-    def delete_simplefin_item(self, item_id: str) -> None:
-        self.client.table("simplefin_items").delete().eq("id", item_id).execute()
+    # --- SimpleFin Item Sync State ---
+    # simplefin_item_sync_state is written only by these RPCs, which users
+    # can't execute, so they always run with the service-role client.
 
-    # --- SimpleFin Accounts ---
+    def reserve_simplefin_request(self, item_id: str, quota: int) -> bool:
+        """Take one SimpleFin request from the item's daily quota.
 
-    def upsert_simplefin_accounts(self, accounts: list[dict]) -> list[dict]:
-        """Upsert SimpleFin accounts (updates balance and org info on each sync)."""
-        if not accounts:
-            return []
+        False (nothing counted) if quota requests were already made today.
+        """
+        result = get_supabase_client().rpc(
+            "reserve_simplefin_request",
+            {"p_item_id": item_id, "p_quota": quota},
+        ).execute()
+        return bool(result.data)
+
+    def acquire_simplefin_sync_lease(
+        self, item_id: str, job_id: str, ttl_seconds: int
+    ) -> str | None:
+        """Take (or extend) the item's sync lease for job_id if it is free.
+
+        Returns the job ID holding the lease afterwards; equal to job_id when
+        acquired, otherwise the in-flight job to attach to.
+        """
+        result = get_supabase_client().rpc(
+            "acquire_simplefin_sync_lease",
+            {"p_item_id": item_id, "p_job_id": job_id, "p_ttl_seconds": ttl_seconds},
+        ).execute()
+        return result.data
+
+    def release_simplefin_sync_lease(self, item_id: str, job_id: str) -> None:
+        """Release the item's sync lease if job_id still holds it."""
+        get_supabase_client().rpc(
+            "release_simplefin_sync_lease",
+            {"p_item_id": item_id, "p_job_id": job_id},
+        ).execute()
+
+    def delete_simplefin_item(self, item_id: str, user_id: str) -> dict | None:
+        """Delete a user's SimpleFin item. Returns the deleted row, or None if not owned."""
         result = (
-            self.client.table("simplefin_accounts")
-            .upsert(
-                accounts, on_conflict="user_id,simplefin_item_id,simplefin_account_id"
-            )
+            self.client.table("simplefin_items")
+            .delete()
+            .eq("id", item_id)
+            .eq("user_id", user_id)
             .execute()
         )
-        return result.data
+        return result.data[0] if result.data else None
+
+    # --- SimpleFin Accounts ---
+
+    def upsert_simplefin_accounts(self, accounts: list[dict]) -> dict:
+        """Upsert SimpleFin accounts (updates balance and org info on each sync).
+
+        Returns the bulk_upsert() result: {"rows": [...], "failed_chunks": [...]}.
+        """
+        return self.bulk_upsert(
+            "simplefin_accounts",
+            accounts,
+            on_conflict="user_id,simplefin_item_id,simplefin_account_id",
+        )
+
+    def upsert_account_balance_history(self, snapshots: list[dict]) -> dict:
+        """Upsert daily balance snapshots (one row per account per day).
+
+        Returns the bulk_upsert() result: {"rows": [...], "failed_chunks": [...]}.
+        """
+        return self.bulk_upsert(
+            "account_balance_history",
+            snapshots,
+            on_conflict="user_id,simplefin_account_id,snapshot_date",
+        )
 
     def get_simplefin_accounts_by_item(self, item_id: str) -> list[dict]:
         """Get all accounts for a SimpleFin item."""
@@ -142,6 +298,16 @@ class Database:
         )
         return result.data
 
+    def get_simplefin_accounts_by_user(self, user_id: str) -> list[dict]:
+        """Get all SimpleFin accounts for a user."""
+        result = (
+            self.client.table("simplefin_accounts")
+            .select("*")
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data
+
     def get_simplefin_account_by_simplefin_id(
         self, item_id: str, simplefin_account_id: str
     ) -> dict | None:
@@ -157,16 +323,38 @@ class Database:
 
     # --- SimpleFin Transactions ---
 
-    def upsert_simplefin_transactions(self, transactions: list[dict]) -> list[dict]:
-        """Upsert SimpleFin transactions."""
-        if not transactions:
-            return []
+    def upsert_simplefin_transactions(self, transactions: list[dict]) -> dict:
+        """Upsert SimpleFin transactions in chunks.
+
+        Returns the bulk_upsert() result: {"rows": [...], "failed_chunks": [...]}.
+        """
+        return self.bulk_upsert(
+            "simplefin_transactions",
+            transactions,
+            on_conflict="simplefin_transaction_id",
+        )
+
+    def get_simplefin_transaction_hashes(
+        self, user_id: str, transaction_ids: list[str]
+    ) -> dict[str, str | None]:
+        """Get stored content hashes for a batch of SimpleFin transaction IDs.
+
+        Returns:
+            {simplefin_transaction_id: content_hash} for IDs already stored.
+        """
+        if not transaction_ids:
+            return {}
+
         result = (
             self.client.table("simplefin_transactions")
-            .upsert(transactions, on_conflict="simplefin_transaction_id")
+            .select("simplefin_transaction_id, content_hash")
+            .eq("user_id", user_id)
+            .in_("simplefin_transaction_id", transaction_ids)
             .execute()
         )
-        return result.data
+        return {
+            row["simplefin_transaction_id"]: row["content_hash"] for row in result.data
+        }
 
     def get_simplefin_transaction_by_id(self, transaction_id: str) -> dict | None:
         result = (
@@ -244,6 +432,60 @@ class Database:
 
         return updated_count
 
+    def batch_update_merchant_keys(self, updates: list[dict]) -> int:
+        """Set merchant_key on multiple transactions in one query (RPC).
+
+        Args:
+            updates: List of dicts with 'id' and 'merchant_key'
+
+        Returns:
+            Number of transactions whose key changed
+        """
+        if not updates:
+            return 0
+
+        result = self.client.rpc(
+            "batch_update_merchant_keys",
+            {
+                "transaction_ids": [u["id"] for u in updates],
+                "merchant_keys": [u["merchant_key"] for u in updates],
+            },
+        ).execute()
+        return result.data if isinstance(result.data, int) else 0
+
+    @staticmethod
+    def _filter_transactions(
+        query,
+        account_column: str,
+        account_id: str | None = None,
+        category_id: str | None = None,
+        subcategory_id: str | None = None,
+        categorization_source: str | None = None,
+        uncategorized: bool = False,
+        min_amount: float | None = None,
+        max_amount: float | None = None,
+    ):
+        """Apply optional transaction listing filters to a query.
+
+        Each equality filter has a (user_id, column, posted_date DESC) index,
+        so a filtered page is one indexed range scan.
+        """
+        if account_id:
+            query = query.eq(account_column, account_id)
+        if category_id:
+            query = query.eq("category_id", category_id)
+        if subcategory_id:
+            query = query.eq("subcategory_id", subcategory_id)
+        if categorization_source:
+            query = query.eq("categorization_source", categorization_source)
+        if uncategorized:
+            query = query.is_("category_id", "null")
+        if min_amount is not None:
+            query = query.gte("amount", min_amount)
+        if max_amount is not None:
+            query = query.lte("amount", max_amount)
+        return query
+
     def get_user_simplefin_transactions(
         self,
         user_id: str,
@@ -251,10 +493,16 @@ class Database:
         date_to: int | None = None,
         limit: int = 50,
         offset: int = 0,
+        **filters,
     ) -> list[dict]:
-        """Get user's SimpleFin transactions."""
+        """Get user's SimpleFin transactions.
+
+        filters: optional account_id, category_id, subcategory_id,
+        categorization_source, uncategorized, min_amount, max_amount.
+        """
         query = self.client.table("simplefin_transactions").select("*")
         query = query.eq("user_id", user_id)
+        query = self._filter_transactions(query, "simplefin_account_id", **filters)
 
         if date_from is not None:
             query = query.gte("posted_date", date_from)
@@ -272,10 +520,12 @@ class Database:
         user_id: str,
         date_from: int | None = None,
         date_to: int | None = None,
+        **filters,
     ) -> int:
-        """Count user's SimpleFin transactions."""
+        """Count user's SimpleFin transactions (same filters as the listing)."""
         query = self.client.table("simplefin_transactions").select("id", count="exact")
         query = query.eq("user_id", user_id)
+        query = self._filter_transactions(query, "simplefin_account_id", **filters)
 
         if date_from:
             query = query.gte("posted_date", date_from)
@@ -291,18 +541,27 @@ class Database:
         date_to: str | None = None,
         limit: int = 50,
         offset: int = 0,
+        **filters,
     ) -> list[dict]:
-        """Get user's transactions with joined account information from transactions_view."""
+        """Get user's transactions with joined account information from transactions_view.
+
+        filters: see get_user_simplefin_transactions.
+        """
         query = self.client.table("transactions_view").select("*")
         query = query.eq("user_id", user_id)
+        query = self._filter_transactions(query, "account_id", **filters)
 
         if date_from:
             query = query.gte("date", date_from)
         if date_to:
             query = query.lte("date", date_to)
 
+        # Sort on the raw column (not `posted`) so the (user_id, ..., posted_date DESC)
+        # indexes serve the order
         result = (
-            query.order("posted", desc=True).range(offset, offset + limit - 1).execute()
+            query.order("posted_date", desc=True)
+            .range(offset, offset + limit - 1)
+            .execute()
         )
         return result.data
 
@@ -311,10 +570,12 @@ class Database:
         user_id: str,
         date_from: str | None = None,
         date_to: str | None = None,
+        **filters,
     ) -> int:
         """Count user's transactions from the transactions_view."""
         query = self.client.table("transactions_view").select("id", count="exact")
         query = query.eq("user_id", user_id)
+        query = self._filter_transactions(query, "account_id", **filters)
 
         if date_from:
             query = query.gte("date", date_from)
@@ -324,6 +585,49 @@ class Database:
         result = query.execute()
         return result.count if result.count is not None else 0
 
+    def search_transactions(
+        self,
+        user_id: str,
+        query: str,
+        min_amount: float | None = None,
+        max_amount: float | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        after: tuple[float, int, str] | None = None,
+        limit: int = 50,
+    ) -> list[dict]:
+        """Search a user's transactions by description/payee (search_transactions RPC).
+
+        Args:
+            user_id: Owner of the transactions.
+            query: Free text, matched as a substring or fuzzily.
+            min_amount, max_amount: Signed amount range (negative = expense).
+            date_from, date_to: Inclusive transaction date range (YYYY-MM-DD).
+            after: (search_rank, posted_date, id) of the previous page's last row.
+            limit: Max rows to return.
+
+        Returns:
+            Rows shaped like transactions_view plus posted_date and search_rank,
+            best match first.
+        """
+        after_rank, after_posted_date, after_id = after or (None, None, None)
+        result = self.client.rpc(
+            "search_transactions",
+            {
+                "p_user_id": user_id,
+                "p_query": query,
+                "p_min_amount": min_amount,
+                "p_max_amount": max_amount,
+                "p_date_from": date_from,
+                "p_date_to": date_to,
+                "p_after_rank": after_rank,
+                "p_after_posted_date": after_posted_date,
+                "p_after_id": after_id,
+                "p_limit": limit,
+            },
+        ).execute()
+        return result.data
+
     # --- SimpleFin Sync Jobs ---
 
     def create_simplefin_sync_job(self, job_data: dict) -> dict:
@@ -354,6 +658,20 @@ class Database:
         )
         return result.data
 
+    def get_incomplete_simplefin_backfill_job(self, item_id: str) -> dict | None:
+        """Get the item's latest backfill job that has not completed."""
+        result = (
+            self.client.table("simplefin_sync_jobs")
+            .select("*")
+            .eq("simplefin_item_id", item_id)
+            .eq("job_type", "backfill")
+            .neq("status", "completed")
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return result.data[0] if result.data else None
+
     def update_simplefin_sync_job(self, job_id: str, data: dict) -> dict:
         result = (
             self.client.table("simplefin_sync_jobs")
@@ -363,6 +681,176 @@ class Database:
         )
         return result.data[0] if result.data else None
 
+    # --- Institution Circuits ---
+
+    def admit_institution_circuit(self, key: str, cooldown_seconds: int) -> bool:
+        """Check a circuit, moving it to half-open for one probe once cooled down."""
+        result = self.client.rpc(
+            "admit_institution_circuit",
+            {"p_key": key, "p_cooldown_seconds": cooldown_seconds},
+        ).execute()
+        return bool(result.data)
+
+    def record_institution_circuit_failure(self, key: str, threshold: int) -> None:
+        """Count a failure, opening the circuit at the threshold."""
+        self.client.rpc(
+            "record_institution_circuit_failure",
+            {"p_key": key, "p_threshold": threshold},
+        ).execute()
+
+    def close_institution_circuit(self, key: str) -> None:
+        """Close a circuit (forget its failures)."""
+        self.client.table("institution_circuits").delete().eq("key", key).execute()
+
+    def get_institution_circuits(self, keys: list[str]) -> list[dict]:
+        """Get the stored circuits among keys (closed ones have no row)."""
+        if not keys:
+            return []
+        result = (
+            self.client.table("institution_circuits")
+            .select("*")
+            .in_("key", keys)
+            .execute()
+        )
+        return result.data
+
+    # --- Worker Leases ---
+
+    def acquire_worker_lease(
+        self, name: str, holder: str, ttl_seconds: int
+    ) -> str | None:
+        """Take (or renew) a worker lease if it is free, expired or already ours.
+
+        Returns the holder afterwards; equal to holder when acquired.
+        """
+        result = self.client.rpc(
+            "acquire_worker_lease",
+            {"p_name": name, "p_holder": holder, "p_ttl_seconds": ttl_seconds},
+        ).execute()
+        return result.data
+
+    def release_worker_lease(self, name: str, holder: str) -> None:
+        """Release a worker lease if holder still holds it."""
+        (
+            self.client.table("worker_leases")
+            .delete()
+            .eq("name", name)
+            .eq("holder", holder)
+            .execute()
+        )
+
+    def get_live_worker_lease_holders(self, name_prefix: str) -> list[str]:
+        """Get holders of unexpired leases whose name starts with name_prefix."""
+        result = (
+            self.client.table("worker_leases")
+            .select("holder")
+            .like("name", f"{name_prefix}%")
+            .gt("expires_at", datetime.now(timezone.utc).isoformat())
+            .execute()
+        )
+        return [row["holder"] for row in result.data]
+
+    # --- Jobs ---
+
+    def enqueue_job(
+        self,
+        job_type: str,
+        payload: dict,
+        user_id: str | None = None,
+        dedupe_key: str | None = None,
+        priority: int = 0,
+        delay_seconds: int = 0,
+        max_attempts: int = 3,
+    ) -> str:
+        """Add a job to the durable queue.
+
+        Returns the job ID; with a dedupe_key, the ID of the job already
+        queued or running for that key, if any.
+        """
+        result = self.client.rpc(
+            "enqueue_job",
+            {
+                "p_job_type": job_type,
+                "p_payload": payload,
+                "p_user_id": user_id,
+                "p_dedupe_key": dedupe_key,
+                "p_priority": priority,
+                "p_delay_seconds": delay_seconds,
+                "p_max_attempts": max_attempts,
+            },
+        ).execute()
+        return result.data
+
+    def claim_jobs(
+        self, worker_id: str, job_types: list[str], limit: int, lease_seconds: int
+    ) -> list[dict]:
+        """Claim up to limit runnable jobs (FOR UPDATE SKIP LOCKED)."""
+        result = self.client.rpc(
+            "claim_jobs",
+            {
+                "p_worker": worker_id,
+                "p_job_types": job_types,
+                "p_limit": limit,
+                "p_lease_seconds": lease_seconds,
+            },
+        ).execute()
+        return result.data
+
+    def heartbeat_job(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a claimed job's lease. False if the worker lost it."""
+        result = self.client.rpc(
+            "heartbeat_job",
+            {"p_job_id": job_id, "p_worker": worker_id, "p_lease_seconds": lease_seconds},
+        ).execute()
+        return bool(result.data)
+
+    def complete_job(
+        self, job_id: str, worker_id: str, result_data: dict | None = None
+    ) -> bool:
+        """Mark a claimed job completed. False if the worker lost it."""
+        result = self.client.rpc(
+            "complete_job",
+            {"p_job_id": job_id, "p_worker": worker_id, "p_result": result_data},
+        ).execute()
+        return bool(result.data)
+
+    def fail_job(
+        self,
+        job_id: str,
+        worker_id: str,
+        error: str,
+        retry_delay_seconds: int | None = None,
+    ) -> str | None:
+        """Record a failed attempt; requeue after the delay if attempts remain.
+
+        Returns the job's new status ('queued' or 'failed'), or None if the
+        worker lost the job.
+        """
+        result = self.client.rpc(
+            "fail_job",
+            {
+                "p_job_id": job_id,
+                "p_worker": worker_id,
+                "p_error": error,
+                "p_retry_delay_seconds": retry_delay_seconds,
+            },
+        ).execute()
+        return result.data
+
+    def release_job(self, job_id: str, worker_id: str) -> bool:
+        """Requeue a claimed job without counting the attempt (shutdown).
+
+        False if the worker lost the job.
+        """
+        result = self.client.rpc(
+            "release_job", {"p_job_id": job_id, "p_worker": worker_id}
+        ).execute()
+        return bool(result.data)
+
+    def get_job_by_id(self, job_id: str) -> dict | None:
+        result = self.client.table("jobs").select("*").eq("id", job_id).execute()
+        return result.data[0] if result.data else None
+
     # --- Categories ---
 
     def get_categories(self, user_id: str) -> list[dict]:
@@ -399,16 +887,27 @@ class Database:
         result = self.client.table("categories").insert(category_data).execute()
         return result.data[0]
 
-    def update_category(self, category_id: str, data: dict) -> dict | None:
-        """Update a category."""
+    def update_category(self, category_id: str, user_id: str, data: dict) -> dict | None:
+        """Update a user's category. Returns None if not found or not owned."""
         result = (
-            self.client.table("categories").update(data).eq("id", category_id).execute()
+            self.client.table("categories")
+            .update(data)
+            .eq("id", category_id)
+            .eq("user_id", user_id)
+            .execute()
         )
         return result.data[0] if result.data else None
 
-    def delete_category(self, category_id: str) -> None:
-        """Delete a category."""
-        self.client.table("categories").delete().eq("id", category_id).execute()
+    def delete_category(self, category_id: str, user_id: str) -> dict | None:
+        """Delete a user's category. Returns the deleted row, or None if not owned."""
+        result = (
+            self.client.table("categories")
+            .delete()
+            .eq("id", category_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     def reassign_transactions_category(
         self, user_id: str, from_category_id: str, to_category_id: str
@@ -446,27 +945,32 @@ class Database:
         result = self.client.table("subcategories").insert(subcategory_data).execute()
         return result.data[0]
 
-    def update_subcategory(self, subcategory_id: str, data: dict) -> dict | None:
-        """Update a subcategory."""
+    def update_subcategory(
+        self, subcategory_id: str, user_id: str, data: dict
+    ) -> dict | None:
+        """Update a user's subcategory. Returns None if not found or not owned."""
         result = (
             self.client.table("subcategories")
             .update(data)
             .eq("id", subcategory_id)
+            .eq("user_id", user_id)
             .execute()
         )
         return result.data[0] if result.data else None
 
-    def delete_subcategory(self, subcategory_id: str) -> None:
-        """Delete a subcategory."""
-        self.client.table("subcategories").delete().eq("id", subcategory_id).execute()
+    def delete_subcategory(self, subcategory_id: str, user_id: str) -> dict | None:
+        """Delete a user's subcategory. Returns the deleted row, or None if not owned.
 
-    def clear_transaction_subcategory(self, user_id: str, subcategory_id: str) -> None:
-        """Null out subcategory_id on all transactions with the given subcategory."""
-        self.client.table("simplefin_transactions").update(
-            {
-                "subcategory_id": None,
-            }
-        ).eq("user_id", user_id).eq("subcategory_id", subcategory_id).execute()
+        Transactions referencing it are nulled by the ON DELETE SET NULL foreign key.
+        """
+        result = (
+            self.client.table("subcategories")
+            .delete()
+            .eq("id", subcategory_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     # ========================================================================
     # Categorization Rules
@@ -483,24 +987,60 @@ class Database:
         )
         return result.data
 
-    def get_categorization_rule_by_id(self, rule_id: str) -> dict | None:
-        """Get a single categorization rule by ID."""
+    def create_categorization_rule(self, rule_data: dict) -> dict:
+        """Create a new categorization rule."""
+        result = self.client.table("categorization_rules").insert(rule_data).execute()
+        return result.data[0]
+
+    def delete_categorization_rule(self, rule_id: str, user_id: str) -> dict | None:
+        """Delete a user's categorization rule. Returns None if not owned."""
         result = (
             self.client.table("categorization_rules")
-            .select("*")
+            .delete()
             .eq("id", rule_id)
+            .eq("user_id", user_id)
             .execute()
         )
         return result.data[0] if result.data else None
 
-    def create_categorization_rule(self, rule_data: dict) -> dict:
-        """Create a new categorization rule."""
-        result = self.client.table("categorization_rules").insert(rule_data).execute()
+    # ========================================================================
+    # Categorization Runs
+    # ========================================================================
+
+    def create_categorization_run(self, run_data: dict) -> dict:
+        """Create a categorization run record."""
+        result = self.client.table("categorization_runs").insert(run_data).execute()
         return result.data[0]
 
-    def delete_categorization_rule(self, rule_id: str) -> None:
-        """Delete a categorization rule."""
-        self.client.table("categorization_rules").delete().eq("id", rule_id).execute()
+    def update_categorization_run(self, run_id: str, data: dict) -> dict | None:
+        """Update a categorization run record."""
+        result = (
+            self.client.table("categorization_runs")
+            .update(data)
+            .eq("id", run_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
+
+    def get_categorization_runs(self, user_id: str, limit: int = 50) -> list[dict]:
+        """Get a user's categorization runs, newest first."""
+        result = (
+            self.client.table("categorization_runs")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return result.data
+
+    def get_categorization_metrics(self, user_id: str, since: str) -> list[dict]:
+        """Sum a user's categorization runs since a time, per provider/model."""
+        result = self.client.rpc(
+            "get_categorization_metrics",
+            {"p_user_id": user_id, "p_since": since},
+        ).execute()
+        return result.data
 
     # ========================================================================
     # Budgets
@@ -528,9 +1068,12 @@ class Database:
         )
         return result.data
 
-    def get_budget(self, budget_id: str) -> dict | None:
-        """Get a single budget by ID."""
-        result = self.client.table("budgets").select("*").eq("id", budget_id).execute()
+    def get_budget(self, budget_id: str, user_id: str | None = None) -> dict | None:
+        """Get a single budget by ID, optionally scoped to its owner."""
+        query = self.client.table("budgets").select("*").eq("id", budget_id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = query.execute()
         return result.data[0] if result.data else None
 
     def get_default_budget(self, user_id: str) -> dict | None:
@@ -544,27 +1087,50 @@ class Database:
         )
         return result.data[0] if result.data else None
 
-    def update_budget(self, budget_id: str, update_data: dict) -> dict | None:
-        """Update a budget."""
-        # If setting as default, unset other defaults first
+    def update_budget(
+        self, budget_id: str, user_id: str, update_data: dict
+    ) -> dict | None:
+        """Update a user's budget. Returns None if not found or not owned.
+
+        Setting is_default goes through the set_default_budget RPC, which
+        unsets the previous default and sets this one in a single call.
+        """
+        update_data = dict(update_data)
+        budget = None
         if update_data.get("is_default"):
-            budget = self.get_budget(budget_id)
-            if budget:
-                self.client.table("budgets").update({"is_default": False}).eq(
-                    "user_id", budget["user_id"]
-                ).execute()
+            update_data.pop("is_default")
+            result = self.client.rpc(
+                "set_default_budget",
+                {"p_budget_id": budget_id, "p_user_id": user_id},
+            ).execute()
+            if not result.data:
+                return None
+            budget = result.data[0]
+            if not update_data:
+                return budget
 
         result = (
             self.client.table("budgets")
             .update(update_data)
             .eq("id", budget_id)
+            .eq("user_id", user_id)
             .execute()
         )
-        return result.data[0] if result.data else None
+        return result.data[0] if result.data else budget
 
-    def delete_budget(self, budget_id: str) -> None:
-        """Delete a budget (cascades to line_items, accounts, months)."""
-        self.client.table("budgets").delete().eq("id", budget_id).execute()
+    def delete_budget(self, budget_id: str, user_id: str) -> dict | None:
+        """Delete a user's budget (cascades to line_items, accounts, months).
+
+        Returns the deleted row, or None if not found or not owned.
+        """
+        result = (
+            self.client.table("budgets")
+            .delete()
+            .eq("id", budget_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     # ========================================================================
     # Budget Accounts
@@ -640,34 +1206,34 @@ class Database:
         )
         return result.data
 
-    def get_budget_line_item(self, item_id: str) -> dict | None:
-        """Get a single line item by ID."""
-        result = (
-            self.client.table("budget_line_items")
-            .select("*")
-            .eq("id", item_id)
-            .execute()
-        )
-        return result.data[0] if result.data else None
-
     def create_budget_line_item(self, item_data: dict) -> dict:
         """Create a new line item in a budget."""
         result = self.client.table("budget_line_items").insert(item_data).execute()
         return result.data[0]
 
-    def update_budget_line_item(self, item_id: str, update_data: dict) -> dict | None:
-        """Update a budget line item."""
+    def update_budget_line_item(
+        self, item_id: str, budget_id: str, update_data: dict
+    ) -> dict | None:
+        """Update a line item within a budget. Returns None if not in that budget."""
         result = (
             self.client.table("budget_line_items")
             .update(update_data)
             .eq("id", item_id)
+            .eq("budget_id", budget_id)
             .execute()
         )
         return result.data[0] if result.data else None
 
-    def delete_budget_line_item(self, item_id: str) -> None:
-        """Delete a budget line item."""
-        self.client.table("budget_line_items").delete().eq("id", item_id).execute()
+    def delete_budget_line_item(self, item_id: str, budget_id: str) -> dict | None:
+        """Delete a line item within a budget. Returns None if not in that budget."""
+        result = (
+            self.client.table("budget_line_items")
+            .delete()
+            .eq("id", item_id)
+            .eq("budget_id", budget_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     # ========================================================================
     # Budget Months
@@ -695,21 +1261,21 @@ class Database:
         )
         return result.data[0] if result.data else None
 
-    def get_budget_month_by_id(self, month_id: str) -> dict | None:
-        """Get budget month by ID."""
-        result = (
-            self.client.table("budget_months").select("*").eq("id", month_id).execute()
-        )
-        return result.data[0] if result.data else None
-
     def create_budget_month(self, month_data: dict) -> dict:
         """Assign a budget to a specific month."""
         result = self.client.table("budget_months").insert(month_data).execute()
         return result.data[0]
 
-    def delete_budget_month(self, month_id: str) -> None:
-        """Delete a budget month override."""
-        self.client.table("budget_months").delete().eq("id", month_id).execute()
+    def delete_budget_month(self, month_id: str, user_id: str) -> dict | None:
+        """Delete a user's budget month override. Returns None if not owned."""
+        result = (
+            self.client.table("budget_months")
+            .delete()
+            .eq("id", month_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     # ========================================================================
     # Budget Summary
@@ -807,19 +1373,38 @@ class Database:
         )
         return result.data
 
-    def get_goal(self, goal_id: str) -> dict | None:
-        """Get a goal by ID."""
-        result = self.client.table("goals").select("*").eq("id", goal_id).execute()
+    def get_goal(self, goal_id: str, user_id: str | None = None) -> dict | None:
+        """Get a goal by ID, optionally scoped to its owner."""
+        query = self.client.table("goals").select("*").eq("id", goal_id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = query.execute()
         return result.data[0] if result.data else None
 
-    def update_goal(self, goal_id: str, data: dict) -> dict | None:
-        """Update a goal."""
-        result = self.client.table("goals").update(data).eq("id", goal_id).execute()
+    def update_goal(self, goal_id: str, user_id: str, data: dict) -> dict | None:
+        """Update a user's goal. Returns None if not found or not owned."""
+        result = (
+            self.client.table("goals")
+            .update(data)
+            .eq("id", goal_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
         return result.data[0] if result.data else None
 
-    def delete_goal(self, goal_id: str) -> None:
-        """Delete a goal (cascades to goal_accounts)."""
-        self.client.table("goals").delete().eq("id", goal_id).execute()
+    def delete_goal(self, goal_id: str, user_id: str) -> dict | None:
+        """Delete a user's goal (cascades to goal_accounts).
+
+        Returns the deleted row, or None if not found or not owned.
+        """
+        result = (
+            self.client.table("goals")
+            .delete()
+            .eq("id", goal_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return result.data[0] if result.data else None
 
     # ========================================================================
     # Goal Accounts
@@ -953,8 +1538,9 @@ class Database:
         category_id: str | None,
         subcategory_id: str | None,
         categorization_source: str = "manual",
+        user_id: str | None = None,
     ) -> dict | None:
-        """Update transaction categorization."""
+        """Update transaction categorization, optionally scoped to its owner."""
         import logging
 
         logger = logging.getLogger("cashstate.database")
@@ -965,7 +1551,7 @@ class Database:
             f"source={categorization_source}"
         )
 
-        result = (
+        query = (
             self.client.table("simplefin_transactions")
             .update(
                 {
@@ -975,8 +1561,10 @@ class Database:
                 }
             )
             .eq("id", transaction_id)
-            .execute()
         )
+        if user_id:
+            query = query.eq("user_id", user_id)
+        result = query.execute()
 
         if result.data:
             logger.debug(f"[DB] ✓ Successfully updated transaction {transaction_id}")
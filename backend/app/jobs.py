@@ -0,0 +1,190 @@
+"""Handlers for the durable job queue.
+
+Run by the worker pool in python -m app.worker (see
+app/services/job_queue.py). Each handler takes the service-role Database and
+the claimed job row and returns a JSON result stored on the job. Raise
+NonRetryableJobError to fail a job without retrying; any other exception is
+retried with backoff.
+
+The service role bypasses RLS, so handlers act only for job["user_id"] and
+check that it owns every item or sync job the payload references.
+"""
+
+import asyncio
+from datetime import date
+
+from app.config import get_settings
+from app.database import Database
+from app.logging_config import get_logger
+from app.services import simplefin_sync_service
+from app.services.categorization_service import get_categorization_service
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.job_queue import NonRetryableJobError, job_handler
+from app.services.snapshot_service import SnapshotService
+from app.services.sync_scheduler import (
+    QuotaExhaustedError,
+    quota_remaining,
+    utc_today,
+)
+
+logger = get_logger("jobs")
+
+
+def _require_owner(job: dict, row: dict | None, label: str) -> dict:
+    """Return row if the job's user owns it, else fail the job for good."""
+    if not row or not job.get("user_id") or row.get("user_id") != job["user_id"]:
+        raise NonRetryableJobError(f"{label} not found for job {job['id']}")
+    return row
+
+
+@job_handler("simplefin_sync")
+async def run_simplefin_sync(db: Database, job: dict) -> dict | None:
+    """
+    Run a queued SimpleFin sync or backfill.
+
+    Enqueued by simplefin_sync_service.enqueue_sync_job or
+    enqueue_backfill_job. Payload: sync_job_id, default_lookback_days, and
+    resume_backfill to also queue the item's interrupted historical backfill
+    afterwards.
+    """
+    payload = job["payload"]
+    sync_job = _require_owner(
+        job,
+        await asyncio.to_thread(
+            db.get_simplefin_sync_job_by_id, payload["sync_job_id"]
+        ),
+        "Sync job",
+    )
+    item_id = sync_job["simplefin_item_id"]
+    item = _require_owner(
+        job,
+        await asyncio.to_thread(db.get_simplefin_item_by_id, item_id),
+        "SimpleFin item",
+    )
+
+    try:
+        result = await simplefin_sync_service.run_queued_sync_job(
+            db,
+            payload["sync_job_id"],
+            default_lookback_days=payload.get("default_lookback_days"),
+        )
+    except simplefin_sync_service.SyncInProgressError as e:
+        # Another sync took the item over; it covers this one
+        return {"superseded_by": e.sync_job_id}
+    except CircuitOpenError as e:
+        # The scheduler will dispatch the item again once the circuit closes
+        raise NonRetryableJobError(str(e)) from e
+    except QuotaExhaustedError as e:
+        # Nothing to do until the quota resets; the scheduler will dispatch it
+        raise NonRetryableJobError(str(e)) from e
+
+    if result is None:
+        return None
+    summary = {
+        key: result[key]
+        for key in (
+            "sync_job_id",
+            "accounts_synced",
+            "transactions_added",
+            "transactions_updated",
+            "transactions_unchanged",
+            "windows_total",
+            "windows_completed",
+        )
+        if key in result
+    }
+
+    if payload.get("resume_backfill"):
+        if await asyncio.to_thread(db.get_incomplete_simplefin_backfill_job, item_id):
+            try:
+                backfill = await simplefin_sync_service.enqueue_backfill_job(db, item)
+                summary["backfill_sync_job_id"] = backfill["id"]
+            except simplefin_sync_service.SyncInProgressError:
+                pass  # Already queued or running
+
+    return summary
+
+
+@job_handler("balance_refresh")
+async def refresh_item_balances(db: Database, job: dict) -> dict:
+    """
+    Refresh an item's account balances with SimpleFin's balances-only mode.
+
+    Payload: item_id. Skipped if the item is down to the requests reserved
+    for its daily sync.
+    """
+    item_id = job["payload"]["item_id"]
+    item = _require_owner(
+        job,
+        await asyncio.to_thread(db.get_simplefin_item_by_id, item_id),
+        "SimpleFin item",
+    )
+    if quota_remaining(item) <= get_settings().simplefin_balance_refresh_quota_reserve:
+        return {"accounts_updated": 0, "skipped": True}
+
+    try:
+        return await simplefin_sync_service.refresh_balances(db, item)
+    except (CircuitOpenError, QuotaExhaustedError) as e:
+        # Retrying before the next refresh interval won't help
+        raise NonRetryableJobError(str(e)) from e
+
+
+@job_handler("snapshot")
+async def snapshot_item_balances(db: Database, job: dict) -> dict:
+    """
+    Store a day's balance snapshots for an item's accounts.
+
+    Payload: item_id, snapshot_date (ISO date, defaults to today in UTC).
+    """
+    payload = job["payload"]
+    item_id = payload["item_id"]
+    snapshot_date = date.fromisoformat(
+        payload.get("snapshot_date") or utc_today().isoformat()
+    )
+
+    item = _require_owner(
+        job,
+        await asyncio.to_thread(db.get_simplefin_item_by_id, item_id),
+        "SimpleFin item",
+    )
+    if item.get("last_snapshot_date") == snapshot_date.isoformat():
+        # A sync or balance refresh snapshotted it after this was queued
+        return {"accounts": 0, "skipped": True}
+
+    accounts = await asyncio.to_thread(db.get_simplefin_accounts_by_item, item_id)
+    result = await SnapshotService(db).store_account_snapshots(accounts, snapshot_date)
+    if result["failed_chunks"]:
+        raise RuntimeError(f"{len(result['failed_chunks'])} snapshot chunk(s) failed")
+    await asyncio.to_thread(
+        db.update_simplefin_item,
+        item_id,
+        {"last_snapshot_date": snapshot_date.isoformat()},
+    )
+
+    return {"accounts": len(result["rows"])}
+
+
+@job_handler("categorization")
+async def categorize_transactions(db: Database, job: dict) -> dict:
+    """
+    Categorize the job user's transactions with rules, then AI.
+
+    Payload: transaction_ids (None for all uncategorized), force.
+    """
+    payload = job["payload"]
+    if not job.get("user_id"):
+        raise NonRetryableJobError(f"Categorization job {job['id']} has no user")
+
+    try:
+        service = get_categorization_service(db)
+    except ValueError as e:
+        # Not configured (e.g. no API key); retrying won't help
+        raise NonRetryableJobError(str(e)) from e
+
+    # The categorization service is synchronous; keep it off the event loop
+    return await asyncio.to_thread(
+        service.categorize_transactions,
+        user_id=job["user_id"],
+        transaction_ids=payload.get("transaction_ids"),
+        force=payload.get("force", False),
+    )
@@ -1,50 +1,79 @@
 """CashState Backend API - Main entry point."""
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.config import get_settings
+from app.database import get_supabase_client
+from app.dependencies import get_jwks_client
 from app.logging_config import setup_logging
 from app.routers import (
     auth_router,
     budgets_router,
     categories_router,
     goals_router,
+    jobs_router,
     plaid_router,
     simplefin_router,
     snapshots_router,
     sync_router,
     transactions_router,
 )
-from app.cron import sync_simplefin_transactions, update_daily_snapshots
+from app.services import simplefin_service
 
 # Setup logging
 logger = setup_logging()
 
 settings = get_settings()
 
+# Warm cache name -> "pending", "loaded" or "failed: <error>" (see /ready)
+warm_caches: dict[str, str] = {}
+
+
+async def warm_up_caches() -> None:
+    """
+    Load the caches the first requests would otherwise build inline.
+
+    Runs in the background after startup so the API serves traffic at once.
+    A failed cache is reported on /ready and built lazily on first use.
+    """
+    loaders = {
+        "supabase_client": get_supabase_client,
+        # First authenticated request would otherwise fetch the JWKS
+        "jwks": lambda: get_jwks_client(settings).get_signing_keys(),
+    }
+    warm_caches.update({name: "pending" for name in loaders})
+
+    for name, load in loaders.items():
+        try:
+            # Both block on network I/O; keep them off the event loop
+            await asyncio.to_thread(load)
+            warm_caches[name] = "loaded"
+        except Exception as e:
+            logger.warning(f"Failed to warm {name}: {str(e)}")
+            warm_caches[name] = f"failed: {str(e)}"
+
+    logger.info(f"Cache warm-up finished: {warm_caches}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
-    # Startup
+    # Startup: nothing here may block serving. Scheduled and queued
+    # background work runs in the worker process (python -m app.worker),
+    # and caches are warmed in the background (readiness: GET /ready)
     logger.info(f"Starting {settings.app_name} API...")
-
-    # Start cron jobs
-    if settings.enable_cron_jobs:
-        logger.info("[CRON] Starting scheduled tasks...")
-        await sync_simplefin_transactions()  # Run immediately on startup
-        await update_daily_snapshots()  # Run immediately on startup
-        logger.info("[CRON] Scheduled tasks initialized")
-    else:
-        logger.info("[CRON] Cron jobs disabled")
+    warm_up = asyncio.create_task(warm_up_caches())
 
     yield
 
     # Shutdown
     logger.info(f"Shutting down {settings.app_name} API...")
+    warm_up.cancel()
+    await simplefin_service.close_http_client()
 
 
 app = FastAPI(
@@ -99,6 +128,26 @@ async def health_check():
     }
 
 
+# Readiness endpoint
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint for load balancers and rollouts.
+
+    Returns 503 until startup has finished warming caches, then 200. The API
+    already serves requests while warming (/health is always 200); caches
+    that failed to load are listed and built lazily on first use.
+    """
+    ready = bool(warm_caches) and "pending" not in warm_caches.values()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "warming",
+            "caches": warm_caches,
+        },
+    )
+
+
 # Include routers with API prefix
 api_prefix = settings.api_v1_prefix
 
@@ -106,6 +155,7 @@ app.include_router(auth_router, prefix=api_prefix)
 app.include_router(budgets_router, prefix=api_prefix)
 app.include_router(categories_router, prefix=api_prefix)
 app.include_router(goals_router, prefix=api_prefix)
+app.include_router(jobs_router, prefix=api_prefix)
 app.include_router(plaid_router, prefix=api_prefix)
 app.include_router(simplefin_router, prefix=api_prefix)
 app.include_router(snapshots_router, prefix=api_prefix)
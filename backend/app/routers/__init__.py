@@ -4,6 +4,7 @@ from app.routers.auth import router as auth_router
 from app.routers.budgets import router as budgets_router
 from app.routers.categories import router as categories_router
 from app.routers.goals import router as goals_router
+from app.routers.jobs import router as jobs_router
 from app.routers.plaid import router as plaid_router
 from app.routers.simplefin import router as simplefin_router
 from app.routers.snapshots import router as snapshots_router
@@ -15,6 +16,7 @@ __all__ = [
     "budgets_router",
     "categories_router",
     "goals_router",
+    "jobs_router",
     "plaid_router",
     "simplefin_router",
     "snapshots_router",
@@ -103,11 +103,9 @@ async def assign_budget_month(
 ):
     """Assign a budget to a specific month (override default)."""
     # Verify budget ownership
-    budget = db.get_budget(request.budget_id)
+    budget = db.get_budget(request.budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     # Parse and convert month to YYYY-MM-01
     try:
@@ -145,13 +143,8 @@ async def delete_budget_month(
     db: Database = Depends(get_database),
 ):
     """Remove a budget month override (falls back to default budget)."""
-    month = db.get_budget_month_by_id(month_id)
-    if not month:
+    if not db.delete_budget_month(month_id, user["id"]):
         raise HTTPException(status_code=404, detail="Budget month not found")
-    if month["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    db.delete_budget_month(month_id)
     return SuccessResponse(message="Budget month removed (reverted to default budget)")
 
 
@@ -207,11 +200,9 @@ async def get_budget(
     db: Database = Depends(get_database),
 ):
     """Get a budget by ID."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
     return BudgetResponse(**budget)
 
 
@@ -223,16 +214,16 @@ async def update_budget(
     db: Database = Depends(get_database),
 ):
     """Update a budget's name or default status."""
-    existing = db.get_budget(budget_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
     update_data = budget.model_dump(exclude_unset=True)
-    updated = db.update_budget(budget_id, update_data)
+    if not update_data:
+        existing = db.get_budget(budget_id, user["id"])
+        if not existing:
+            raise HTTPException(status_code=404, detail="Budget not found")
+        return BudgetResponse(**existing)
+
+    updated = db.update_budget(budget_id, user["id"], update_data)
     if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update budget")
+        raise HTTPException(status_code=404, detail="Budget not found")
     return BudgetResponse(**updated)
 
 
@@ -243,13 +234,8 @@ async def delete_budget(
     db: Database = Depends(get_database),
 ):
     """Delete a budget (cascades to line items, accounts, months)."""
-    existing = db.get_budget(budget_id)
-    if not existing:
+    if not db.delete_budget(budget_id, user["id"]):
         raise HTTPException(status_code=404, detail="Budget not found")
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    db.delete_budget(budget_id)
     return SuccessResponse(message="Budget deleted successfully")
 
 
@@ -260,13 +246,9 @@ async def set_default_budget(
     db: Database = Depends(get_database),
 ):
     """Set a budget as the default."""
-    existing = db.get_budget(budget_id)
-    if not existing:
+    updated = db.update_budget(budget_id, user["id"], {"is_default": True})
+    if not updated:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    updated = db.update_budget(budget_id, {"is_default": True})
     return BudgetResponse(**updated)
 
 
@@ -282,11 +264,9 @@ async def list_budget_accounts(
     db: Database = Depends(get_database),
 ):
     """List accounts linked to a budget."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     accounts = db.get_budget_accounts(budget_id)
     return BudgetAccountListResponse(
@@ -308,11 +288,9 @@ async def add_budget_account(
 
     Returns 409 if account is already linked to another budget.
     """
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     # Check if account already belongs to another budget
     existing = db.get_account_budget(request.account_id)
@@ -349,11 +327,9 @@ async def remove_budget_account(
     db: Database = Depends(get_database),
 ):
     """Remove an account from a budget."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     db.remove_budget_account(budget_id, account_id)
     return SuccessResponse(message="Account removed from budget")
@@ -371,11 +347,9 @@ async def list_line_items(
     db: Database = Depends(get_database),
 ):
     """List all line items for a budget."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     items = db.get_budget_line_items(budget_id)
     return BudgetLineItemListResponse(
@@ -394,11 +368,9 @@ async def create_line_item(
     db: Database = Depends(get_database),
 ):
     """Add a line item to a budget."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     try:
         created = db.create_budget_line_item(
@@ -430,19 +402,13 @@ async def update_line_item(
     db: Database = Depends(get_database),
 ):
     """Update a budget line item amount."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    existing_item = db.get_budget_line_item(item_id)
-    if not existing_item or existing_item["budget_id"] != budget_id:
-        raise HTTPException(status_code=404, detail="Line item not found")
 
-    updated = db.update_budget_line_item(item_id, {"amount": item.amount})
+    updated = db.update_budget_line_item(item_id, budget_id, {"amount": item.amount})
     if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update line item")
+        raise HTTPException(status_code=404, detail="Line item not found")
     return BudgetLineItemResponse(**updated)
 
 
@@ -454,15 +420,10 @@ async def delete_line_item(
     db: Database = Depends(get_database),
 ):
     """Remove a line item from a budget."""
-    budget = db.get_budget(budget_id)
+    budget = db.get_budget(budget_id, user["id"])
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    if budget["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
-    existing_item = db.get_budget_line_item(item_id)
-    if not existing_item or existing_item["budget_id"] != budget_id:
+    if not db.delete_budget_line_item(item_id, budget_id):
         raise HTTPException(status_code=404, detail="Line item not found")
-
-    db.delete_budget_line_item(item_id)
     return SuccessResponse(message="Line item removed from budget")
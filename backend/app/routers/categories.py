@@ -1,6 +1,10 @@
 """Categories and subcategories router."""
 
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 
 from app.database import Database
 from app.dependencies import get_current_user, get_database
@@ -21,13 +25,21 @@ from app.schemas.category import (
     CategorizationRuleCreate,
     CategorizationRuleResponse,
     CategorizationRuleListResponse,
+    CategorizationRunResponse,
+    CategorizationRunListResponse,
+    CategorizationModelMetrics,
+    CategorizationMetricsResponse,
     ManualCategorizationRequest,
     SeedDefaultsRequest,
     SeedDefaultsResponse,
 )
 from app.schemas.common import SuccessResponse
+from app.schemas.job import JobAcceptedResponse
+from app.services import job_queue
 from app.services.categorization_service import get_categorization_service
+from app.services.llm_clients import LLMBusyError
 from app.services.onboarding_service import get_onboarding_service
+from app.utils.merchant import normalize_merchant
 
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
@@ -163,20 +175,12 @@ async def update_category(
     db: Database = Depends(get_database),
 ):
     """Update a user category (cannot update system categories)."""
-    existing = db.get_category_by_id(category_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Category not found")
-
-    # Only user's own categories can be updated
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Cannot update this category")
-
-    # Update only provided fields
+    # Update only provided fields; only user's own categories match
     update_data = category.model_dump(exclude_unset=True)
-    updated = db.update_category(category_id, update_data)
+    updated = db.update_category(category_id, user["id"], update_data)
 
     if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update category")
+        raise HTTPException(status_code=404, detail="Category not found")
 
     return CategoryResponse(**updated)
 
@@ -196,7 +200,9 @@ async def delete_category(
     if existing["user_id"] != user["id"]:
         raise HTTPException(status_code=403, detail="Cannot delete this category")
 
-    # Reassign transactions using this category to "Uncategorized"
+    # Reassign transactions using this category to "Uncategorized".
+    # Ownership must be known before this point: reassigning would otherwise
+    # rewrite the user's transactions that point at a system category.
     uncategorized = db.get_user_category_by_name(user["id"], "Uncategorized")
     if uncategorized and uncategorized["id"] != category_id:
         db.reassign_transactions_category(
@@ -205,7 +211,7 @@ async def delete_category(
             to_category_id=uncategorized["id"],
         )
 
-    db.delete_category(category_id)
+    db.delete_category(category_id, user["id"])
     return SuccessResponse(message="Category deleted successfully")
 
 
@@ -298,20 +304,12 @@ async def update_subcategory(
     db: Database = Depends(get_database),
 ):
     """Update a subcategory (cannot update system subcategories)."""
-    existing = db.get_subcategory_by_id(subcategory_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Subcategory not found")
-
-    # Only user's own subcategories can be updated
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Cannot update this subcategory")
-
-    # Update only provided fields
+    # Update only provided fields; only user's own subcategories match
     update_data = subcategory.model_dump(exclude_unset=True)
-    updated = db.update_subcategory(subcategory_id, update_data)
+    updated = db.update_subcategory(subcategory_id, user["id"], update_data)
 
     if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update subcategory")
+        raise HTTPException(status_code=404, detail="Subcategory not found")
 
     return SubcategoryResponse(**updated)
 
@@ -323,18 +321,11 @@ async def delete_subcategory(
     db: Database = Depends(get_database),
 ):
     """Delete a subcategory. Nulls out subcategory_id on existing transactions."""
-    existing = db.get_subcategory_by_id(subcategory_id)
-    if not existing:
+    # Only user's own subcategories match; the ON DELETE SET NULL foreign key
+    # clears subcategory_id on transactions that use it.
+    if not db.delete_subcategory(subcategory_id, user["id"]):
         raise HTTPException(status_code=404, detail="Subcategory not found")
 
-    # Only user's own subcategories can be deleted
-    if existing["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Cannot delete this subcategory")
-
-    # Null out subcategory_id on transactions that use this subcategory
-    db.clear_transaction_subcategory(user_id=user["id"], subcategory_id=subcategory_id)
-
-    db.delete_subcategory(subcategory_id)
     return SuccessResponse(message="Subcategory deleted successfully")
 
 
@@ -363,22 +354,28 @@ async def create_rule(
     db: Database = Depends(get_database),
 ):
     """Create a new categorization rule."""
-    valid_fields = {"payee", "description", "memo"}
+    valid_fields = {"payee", "description", "memo", "merchant_key"}
     if rule.match_field not in valid_fields:
         raise HTTPException(
             status_code=400,
             detail=f"match_field must be one of: {', '.join(valid_fields)}",
         )
 
+    rule_data = rule.model_dump()
+    if rule.match_field == "merchant_key":
+        # Stored normalized so it matches transactions' merchant_key exactly
+        rule_data["match_value"] = normalize_merchant(rule.match_value)
+        if not rule_data["match_value"]:
+            raise HTTPException(
+                status_code=400, detail="match_value has no merchant name in it"
+            )
+
     # Verify category belongs to user
     category = db.get_category_by_id(rule.category_id)
     if not category or category["user_id"] != user["id"]:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    rule_data = {
-        **rule.model_dump(),
-        "user_id": user["id"],
-    }
+    rule_data["user_id"] = user["id"]
     created = db.create_categorization_rule(rule_data)
     return CategorizationRuleResponse(**created)
 
@@ -390,14 +387,9 @@ async def delete_rule(
     db: Database = Depends(get_database),
 ):
     """Delete a categorization rule."""
-    rule = db.get_categorization_rule_by_id(rule_id)
-    if not rule:
+    if not db.delete_categorization_rule(rule_id, user["id"]):
         raise HTTPException(status_code=404, detail="Rule not found")
 
-    if rule["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    db.delete_categorization_rule(rule_id)
     return SuccessResponse(message="Rule deleted successfully")
 
 
@@ -416,35 +408,34 @@ async def manual_categorize_transaction(
     db: Database = Depends(get_database),
 ):
     """Manually categorize a transaction. Optionally creates a rule for future transactions."""
-    # Verify transaction ownership
-    txn = db.get_simplefin_transaction_by_id(transaction_id)
-    if not txn:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    if txn["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Update the transaction
-    updated = db.update_transaction_category(
+    # Update the transaction (scoped to the user, so this is the ownership check)
+    txn = db.update_transaction_category(
         transaction_id=transaction_id,
         category_id=request.category_id,
         subcategory_id=request.subcategory_id,
         categorization_source="manual",
+        user_id=user["id"],
     )
 
-    if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update transaction")
-
-    # Optionally create a rule based on the transaction's payee
-    if request.create_rule and request.category_id and txn.get("payee"):
-        db.create_categorization_rule(
-            {
-                "user_id": user["id"],
-                "match_field": "payee",
-                "match_value": txn["payee"],
-                "category_id": request.category_id,
-                "subcategory_id": request.subcategory_id,
-            }
-        )
+    if not txn:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+
+    # Optionally create a rule for the transaction's merchant (or payee)
+    if request.create_rule and request.category_id:
+        if txn.get("merchant_key"):
+            match_field, match_value = "merchant_key", txn["merchant_key"]
+        else:
+            match_field, match_value = "payee", txn.get("payee")
+        if match_value:
+            db.create_categorization_rule(
+                {
+                    "user_id": user["id"],
+                    "match_field": match_field,
+                    "match_value": match_value,
+                    "category_id": request.category_id,
+                    "subcategory_id": request.subcategory_id,
+                }
+            )
 
     return SuccessResponse(message="Transaction categorized successfully")
 
@@ -454,7 +445,11 @@ async def manual_categorize_transaction(
 # ============================================================================
 
 
-@router.post("/ai/categorize", response_model=CategorizationResponse)
+@router.post(
+    "/ai/categorize",
+    response_model=CategorizationResponse,
+    responses={202: {"model": JobAcceptedResponse}},
+)
 async def categorize_with_ai(
     request: CategorizationRequest,
     user: dict = Depends(get_current_user),
@@ -463,15 +458,39 @@ async def categorize_with_ai(
     """Categorize transactions using rules first, then Claude AI.
 
     Applies user-defined categorization rules before sending remaining
-    transactions to Claude AI for categorization.
+    transactions to Claude AI for categorization. With background=True the
+    work is queued for the worker and a 202 with the job_id is returned.
     """
     logger.info(
-        f"[POST /categories/ai/categorize] User: {user['id']}, Transaction IDs: {request.transaction_ids}, Force: {request.force}"
+        f"[POST /categories/ai/categorize] User: {user['id']}, Transaction IDs: {request.transaction_ids}, Force: {request.force}, Background: {request.background}"
     )
 
+    if request.background:
+        try:
+            job_id = job_queue.enqueue(
+                "categorization",
+                {
+                    "transaction_ids": request.transaction_ids,
+                    "force": request.force,
+                },
+                user_id=user["id"],
+            )
+        except Exception as e:
+            logger.error(f"[POST /categories/ai/categorize] Enqueue failed: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Failed to queue categorization: {str(e)}"
+            )
+        return JSONResponse(
+            status_code=202,
+            content=JobAcceptedResponse(success=True, job_id=job_id).model_dump(),
+        )
+
     try:
         categorization_service = get_categorization_service(db)
-        result = categorization_service.categorize_transactions(
+        # Blocking (DB + model calls); run it off the event loop so concurrent
+        # requests share the LLM client pool instead of queueing on the loop
+        result = await asyncio.to_thread(
+            categorization_service.categorize_transactions,
             user_id=user["id"],
             transaction_ids=request.transaction_ids,
             force=request.force,
@@ -480,6 +499,13 @@ async def categorize_with_ai(
             f"[POST /categories/ai/categorize] Success: {result['categorized_count']} categorized, {result['failed_count']} failed"
         )
         return CategorizationResponse(**result)
+    except LLMBusyError as e:
+        logger.warning(f"[POST /categories/ai/categorize] Busy: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="AI categorization is busy, try again shortly or use background=true",
+            headers={"Retry-After": "30"},
+        )
     except ValueError as e:
         logger.error(f"[POST /categories/ai/categorize] ValueError: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -489,3 +515,70 @@ async def categorize_with_ai(
 
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Categorization failed: {str(e)}")
+
+
+@router.get("/ai/runs", response_model=CategorizationRunListResponse)
+async def list_categorization_runs(
+    limit: int = Query(default=50, ge=1, le=500),
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """List recent AI categorization runs with their token usage, latency and cost."""
+    runs = db.get_categorization_runs(user["id"], limit=limit)
+    return CategorizationRunListResponse(
+        items=[CategorizationRunResponse(**r) for r in runs],
+        total=len(runs),
+    )
+
+
+@router.get("/ai/metrics", response_model=CategorizationMetricsResponse)
+async def get_categorization_metrics(
+    days: int = Query(default=30, ge=1, le=365),
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """Aggregate AI categorization usage and estimated cost over the last N days.
+
+    Use this to compare models/providers and track spend per categorized
+    transaction.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    # Summed in SQL: fetched rows would be capped by PostgREST's max-rows
+    rows = db.get_categorization_metrics(user["id"], since)
+
+    def total(key: str) -> int:
+        return sum(row[key] for row in rows)
+
+    llm_calls = total("llm_calls")
+    categorized = total("categorized_count")
+    cost = sum(float(row["estimated_cost_usd"]) for row in rows)
+
+    return CategorizationMetricsResponse(
+        days=days,
+        runs=total("runs"),
+        failed_runs=total("failed_runs"),
+        llm_calls=llm_calls,
+        prompt_tokens=total("prompt_tokens"),
+        completion_tokens=total("completion_tokens"),
+        llm_retries=total("llm_retries"),
+        avg_latency_ms=(
+            round(total("llm_latency_ms") / llm_calls, 1) if llm_calls else 0.0
+        ),
+        transactions_categorized=categorized,
+        estimated_cost_usd=round(cost, 6),
+        cost_per_categorized_transaction_usd=(
+            round(cost / categorized, 6) if categorized else None
+        ),
+        by_model=[
+            CategorizationModelMetrics(
+                provider=row["provider"],
+                model=row["model"],
+                runs=row["runs"],
+                llm_calls=row["llm_calls"],
+                prompt_tokens=row["prompt_tokens"],
+                completion_tokens=row["completion_tokens"],
+                estimated_cost_usd=round(float(row["estimated_cost_usd"]), 6),
+            )
+            for row in rows
+        ],
+    )
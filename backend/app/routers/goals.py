@@ -278,7 +278,7 @@ async def create_goal(
         )
     except HTTPException:
         # Roll back the goal if account validation fails
-        db.delete_goal(goal["id"])
+        db.delete_goal(goal["id"], user["id"])
         raise
 
     goal_accounts = db.get_goal_accounts(goal["id"])
@@ -314,11 +314,9 @@ async def get_goal(
     """Get goal detail with progress chart data."""
     logger.info(f"[GET /goals/{goal_id}] User: {user['id']}")
 
-    goal = db.get_goal(goal_id)
+    goal = db.get_goal(goal_id, user["id"])
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
-    if goal["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
 
     goal_accounts = db.get_goal_accounts(goal_id)
 
@@ -370,12 +368,6 @@ async def update_goal(
     """Update a goal's metadata and optionally replace its account allocations."""
     logger.info(f"[PUT /goals/{goal_id}] User: {user['id']}")
 
-    goal = db.get_goal(goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    if goal["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
     # Build update dict for scalar fields
     update_data: dict = {}
     if payload.name is not None:
@@ -389,8 +381,14 @@ async def update_goal(
     if payload.is_completed is not None:
         update_data["is_completed"] = payload.is_completed
 
+    # Scoped write doubles as the ownership check; fall back to a scoped
+    # read only when there are no scalar fields to update.
     if update_data:
-        goal = db.update_goal(goal_id, update_data) or goal
+        goal = db.update_goal(goal_id, user["id"], update_data)
+    else:
+        goal = db.get_goal(goal_id, user["id"])
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found")
 
     # Replace account associations if provided
     if payload.accounts is not None:
@@ -417,11 +415,6 @@ async def delete_goal(
     """Delete a goal and all its account associations."""
     logger.info(f"[DELETE /goals/{goal_id}] User: {user['id']}")
 
-    goal = db.get_goal(goal_id)
-    if not goal:
+    if not db.delete_goal(goal_id, user["id"]):
         raise HTTPException(status_code=404, detail="Goal not found")
-    if goal["user_id"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    db.delete_goal(goal_id)
     return SuccessResponse(message="Goal deleted successfully")
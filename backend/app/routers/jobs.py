@@ -0,0 +1,33 @@
+"""Jobs router - status of queued background jobs."""
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.database import Database
+from app.dependencies import get_current_user, get_database
+from app.schemas.job import JobResponse
+
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """
+    Get the status of a background job (e.g. queued AI categorization).
+
+    Failed attempts are retried with backoff; last_error holds the most
+    recent failure and result the handler's output once completed.
+
+    Args:
+        job_id: Job ID (from a 202 response).
+        user: Current authenticated user (injected).
+        db: Database instance (injected).
+    """
+    job = db.get_job_by_id(job_id)
+    if not job or job["user_id"] != user["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,6 +1,9 @@
 """SimpleFin integration router."""
 
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
 
 from app.config import get_settings
 from app.database import Database
@@ -13,9 +16,19 @@ from app.schemas.simplefin import (
     SimplefinAccountResponse,
     SimplefinTransactionListResponse,
     SyncResponse,
+    SyncJobAcceptedResponse,
+    SimplefinSyncJobResponse,
+    BalanceRefreshResponse,
+    InstitutionCircuitResponse,
     FetchAccountsResponse,
 )
-from app.services import simplefin_service
+from app.schemas.transaction import TransactionFilters
+from app.services import simplefin_service, simplefin_sync_service, sync_scheduler
+from app.services.circuit_breaker import (
+    CircuitOpenError,
+    institution_breaker,
+    institution_key,
+)
 from app.utils.encryption import encrypt_token, decrypt_token
 
 
@@ -56,7 +69,7 @@ async def exchange_setup_token(
             access_url = settings.simplefin_access_url
         else:
             # Claim the access URL from SimpleFin
-            access_url = simplefin_service.claim_access_url(request.setup_token)
+            access_url = await simplefin_service.claim_access_url(request.setup_token)
 
         # Validate the access URL
         if not simplefin_service.validate_access_url(access_url):
@@ -103,6 +116,7 @@ async def list_items(
             institution_name=item.get("institution_name"),
             status=item["status"],
             last_synced_at=item.get("last_synced_at"),
+            quota_remaining=sync_scheduler.quota_remaining(item),
             created_at=item["created_at"],
             updated_at=item["updated_at"],
         )
@@ -117,20 +131,10 @@ async def delete_item(
     db: Database = Depends(get_database),
 ):
     """Delete a SimpleFin item and all associated transactions."""
-    # Verify the item belongs to the user
-    item = db.get_simplefin_item_by_id(item_id)
-    if not item:
+    # Delete the item scoped to the user (cascades to transactions due to FK constraint)
+    if not db.delete_simplefin_item(item_id, user["id"]):
         raise HTTPException(status_code=404, detail="SimpleFin item not found")
 
-    if item["user_id"] != user["id"]:
-        raise HTTPException(
-            status_code=403,
-            detail="Not authorized to delete this item",
-        )
-
-    # Delete the item (cascades to transactions due to FK constraint)
-    db.delete_simplefin_item(item_id)
-
     return {"success": True, "message": "SimpleFin item deleted"}
 
 
@@ -142,16 +146,10 @@ async def list_accounts(
 ):
     """List all accounts for a SimpleFin item."""
     # Verify the item belongs to the user
-    item = db.get_simplefin_item_by_id(item_id)
+    item = db.get_simplefin_item_by_id(item_id, user["id"])
     if not item:
         raise HTTPException(status_code=404, detail="SimpleFin item not found")
 
-    if item["user_id"] != user["id"]:
-        raise HTTPException(
-            status_code=403,
-            detail="Not authorized to access this item",
-        )
-
     accounts = db.get_simplefin_accounts_by_item(item_id)
     return accounts
 
@@ -164,11 +162,15 @@ async def list_transactions(
     date_to: int | None = None,
     limit: int = 50,
     offset: int = 0,
+    filters: TransactionFilters = Depends(),
 ):
     """List all SimpleFin transactions for the current user.
 
     Returns transaction list with navigation metadata (has_previous_month, has_next_month)
     indicating if there are transactions before/after the current date range.
+    Optional account, category, subcategory, categorization source,
+    uncategorized-only and amount filters are applied in the query (and to
+    the navigation checks).
     """
     from datetime import datetime
 
@@ -187,6 +189,9 @@ async def list_transactions(
     logger.info(
         f"[GET /simplefin/transactions] Pagination: limit={limit}, offset={offset}"
     )
+    filter_params = filters.model_dump(exclude_defaults=True)
+    if filter_params:
+        logger.info(f"[GET /simplefin/transactions] Filters: {filter_params}")
 
     transactions = db.get_user_simplefin_transactions(
         user_id=user["id"],
@@ -194,6 +199,7 @@ async def list_transactions(
         date_to=date_to,
         limit=limit,
         offset=offset,
+        **filter_params,
     )
 
     # Count categorized vs uncategorized
@@ -229,6 +235,7 @@ async def list_transactions(
             date_to=date_from - 1,  # Before the start of current range
             limit=1,
             offset=0,
+            **filter_params,
         )
         has_previous = len(earlier_transactions) > 0
 
@@ -244,6 +251,7 @@ async def list_transactions(
                 date_to=search_end,
                 limit=1,
                 offset=0,
+                **filter_params,
             )
             has_next = len(later_transactions) > 0
 
@@ -259,11 +267,16 @@ async def list_transactions(
     )
 
 
-@router.post("/sync/{item_id}", response_model=SyncResponse)
+@router.post(
+    "/sync/{item_id}",
+    response_model=SyncResponse,
+    responses={202: {"model": SyncJobAcceptedResponse}},
+)
 async def sync_item(
     item_id: str,
     start_date: int | None = None,
     force_sync: bool = False,
+    background: bool = False,
     user: dict = Depends(get_current_user),
     db: Database = Depends(get_database),
 ):
@@ -277,22 +290,22 @@ async def sync_item(
         item_id: SimpleFin item ID.
         start_date: Optional start date (Unix timestamp in seconds since epoch).
                    Example: 1704067200 for 2024-01-01.
-                   If not provided, SimpleFin returns recent transactions only.
+                   If not provided, fetches incrementally from the item's latest
+                   posted transaction (minus a small overlap); the first sync
+                   falls back to SimpleFin's recent-transactions default.
         force_sync: If True, bypass the 24-hour rate limit. Use for new accounts
                    or testing. Default: False.
+        background: If True, queue the sync for the worker and return 202
+                   with its sync_job_id right away instead of waiting for it.
+                   Poll GET /simplefin/sync-jobs/{sync_job_id} for progress.
         user: Current authenticated user (injected).
         db: Database instance (injected).
     """
     # Verify the item belongs to the user
-    item = db.get_simplefin_item_by_id(item_id)
+    item = db.get_simplefin_item_by_id(item_id, user["id"])
     if not item:
         raise HTTPException(status_code=404, detail="SimpleFin item not found")
-
-    if item["user_id"] != user["id"]:
-        raise HTTPException(
-            status_code=403,
-            detail="Not authorized to sync this item",
-        )
+    _require_quota(item)
 
     # Rate limiting: Check last sync time (24 hour cooldown)
     # Skip if force_sync is True (for new accounts or testing)
@@ -319,92 +332,236 @@ async def sync_item(
             )
 
     try:
-        # Create SimpleFin sync job
-        sync_job = db.create_simplefin_sync_job(
-            {
-                "user_id": user["id"],
-                "simplefin_item_id": item_id,
-                "status": "running",
-            }
+        if background:
+            sync_job = await simplefin_sync_service.enqueue_sync_job(
+                db, item, start_date=start_date
+            )
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "success": True,
+                    "sync_job_id": sync_job["id"],
+                    "status": sync_job["status"],
+                    "detail": "Sync queued",
+                },
+            )
+        result = await simplefin_sync_service.sync_item(db, item, start_date=start_date)
+    except simplefin_sync_service.SyncInProgressError as e:
+        return _sync_in_progress_response(e)
+    except sync_scheduler.QuotaExhaustedError as e:
+        raise _quota_exhausted_exception(e)
+    except CircuitOpenError as e:
+        raise _circuit_open_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to sync SimpleFin data: {str(e)}",
         )
 
-        # Decrypt the access URL
-        access_url = decrypt_token(item["access_url"])
+    return {"success": True, **result}
+
+
+@router.get("/sync-jobs/{job_id}", response_model=SimplefinSyncJobResponse)
+async def get_sync_job(
+    job_id: str,
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """
+    Get the status and progress of a SimpleFin sync job.
+
+    While the job is running, accounts_processed, rows_written and
+    bytes_fetched are updated as batches are written.
+
+    Args:
+        job_id: Sync job ID (from a sync or backfill response).
+        user: Current authenticated user (injected).
+        db: Database instance (injected).
+    """
+    job = db.get_simplefin_sync_job_by_id(job_id)
+    if not job or job["user_id"] != user["id"]:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
 
-        # Fetch accounts and transactions from SimpleFin
-        accounts_data = simplefin_service.fetch_accounts(
-            access_url,
-            start_date=start_date,
-        )
 
-        # Parse and upsert accounts (with balance info)
-        accounts = simplefin_service.parse_simplefin_accounts(
-            accounts_data,
-            item_id,
-            user["id"],
+@router.post(
+    "/backfill/{item_id}",
+    status_code=202,
+    response_model=SyncJobAcceptedResponse,
+)
+async def backfill_item(
+    item_id: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    window_days: int | None = None,
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """
+    Queue a load of historical transactions for a SimpleFin item.
+
+    The worker fetches history window by window (one SimpleFin request each)
+    and checkpoints each window on the sync job. Returns 202 with the
+    sync_job_id right away; poll GET /simplefin/sync-jobs/{sync_job_id} for
+    progress. Call again without start_date to resume the item's latest
+    unfinished backfill from its last completed window.
+
+    Args:
+        item_id: SimpleFin item ID.
+        start_date: Start of history (Unix timestamp). Omit to resume.
+        end_date: End of history (Unix timestamp). Defaults to now.
+        window_days: Days per SimpleFin request (default from settings).
+        user: Current authenticated user (injected).
+        db: Database instance (injected).
+    """
+    item = db.get_simplefin_item_by_id(item_id, user["id"])
+    if not item:
+        raise HTTPException(status_code=404, detail="SimpleFin item not found")
+    _require_quota(item)
+
+    try:
+        sync_job = await simplefin_sync_service.enqueue_backfill_job(
+            db,
+            item,
+            start_date=start_date,
+            end_date=end_date,
+            window_days=window_days,
         )
-        upserted_accounts = []
-        if accounts:
-            upserted_accounts = db.upsert_simplefin_accounts(accounts)
-
-        # Build mapping of SimpleFin account IDs to our UUIDs
-        account_id_map = {
-            acc["simplefin_account_id"]: acc["id"] for acc in upserted_accounts
-        }
-
-        # Parse and upsert transactions using the account ID map
-        transactions = simplefin_service.parse_simplefin_transactions(
-            accounts_data,
-            account_id_map,
-            user["id"],
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except simplefin_sync_service.SyncInProgressError as e:
+        return _sync_in_progress_response(e)
+    except CircuitOpenError as e:
+        raise _circuit_open_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to queue SimpleFin backfill: {str(e)}",
         )
-        if transactions:
-            db.upsert_simplefin_transactions(transactions)
 
-        # Update sync job
-        db.update_simplefin_sync_job(
-            sync_job["id"],
-            {
-                "status": "completed",
-                "completed_at": "now()",
-                "accounts_synced": len(accounts),
-                "transactions_added": len(transactions),
-                "transactions_updated": 0,
-            },
+    return {
+        "success": True,
+        "sync_job_id": sync_job["id"],
+        "status": sync_job["status"],
+        "detail": "Backfill queued",
+    }
+
+
+@router.post("/sync/{item_id}/balances", response_model=BalanceRefreshResponse)
+async def refresh_item_balances(
+    item_id: str,
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """
+    Refresh account balances for a SimpleFin item without syncing transactions.
+
+    Uses SimpleFin's balances-only mode and updates today's balance snapshot,
+    so dashboards (net worth, goal progress) can refresh intraday at a
+    fraction of the cost of a full sync. Does not count against the 24-hour
+    full-sync cooldown.
+
+    Args:
+        item_id: SimpleFin item ID.
+        user: Current authenticated user (injected).
+        db: Database instance (injected).
+    """
+    item = db.get_simplefin_item_by_id(item_id, user["id"])
+    if not item:
+        raise HTTPException(status_code=404, detail="SimpleFin item not found")
+    _require_quota(item)
+
+    try:
+        result = await simplefin_sync_service.refresh_balances(db, item)
+    except sync_scheduler.QuotaExhaustedError as e:
+        raise _quota_exhausted_exception(e)
+    except CircuitOpenError as e:
+        raise _circuit_open_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to refresh SimpleFin balances: {str(e)}",
         )
 
-        # Update item's last_synced_at
-        db.update_simplefin_item(
-            item_id,
-            {
-                "last_synced_at": "now()",
-            },
+    return {"success": True, **result}
+
+
+def _require_quota(item: dict) -> None:
+    """Reject the request if the item has no SimpleFin requests left today."""
+    if sync_scheduler.quota_remaining(item) <= 0:
+        raise _quota_exhausted_exception(
+            sync_scheduler.QuotaExhaustedError(item["id"])
         )
 
-        return {
+
+def _quota_exhausted_exception(
+    error: sync_scheduler.QuotaExhaustedError,
+) -> HTTPException:
+    """Map a used-up daily quota to a 429 response."""
+    return HTTPException(status_code=429, detail=str(error))
+
+
+def _sync_in_progress_response(
+    error: "simplefin_sync_service.SyncInProgressError",
+) -> JSONResponse:
+    """Build a 202 pointing at the sync job already running for the item."""
+    return JSONResponse(
+        status_code=202,
+        content={
             "success": True,
-            "sync_job_id": sync_job["id"],
-            "accounts_synced": len(accounts),
-            "transactions_added": len(transactions),
-            "transactions_updated": 0,
-            "errors": accounts_data.get("errors", []),
-        }
+            "sync_job_id": error.sync_job_id,
+            "status": "running",
+            "detail": str(error),
+        },
+    )
 
-    except Exception as e:
-        # Mark sync job as failed
-        if "sync_job" in locals():
-            db.update_simplefin_sync_job(
-                sync_job["id"],
-                {
-                    "status": "failed",
-                    "completed_at": "now()",
-                    "error_message": str(e),
-                },
+
+def _circuit_open_exception(error: CircuitOpenError) -> HTTPException:
+    """Build a 503 for an item whose institutions are all failing."""
+    retry_after = max(0, int(error.retry_at - datetime.now(timezone.utc).timestamp()))
+    return HTTPException(
+        status_code=503,
+        detail=f"Institution temporarily unavailable: {str(error)}",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@router.get("/institutions/status", response_model=list[InstitutionCircuitResponse])
+async def list_institution_status(
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """
+    Get circuit breaker state for each institution behind the user's accounts.
+
+    An open circuit means recent fetches for that institution failed and
+    syncs fail fast (503) until the cooldown ends and a probe succeeds.
+    """
+    names = {}
+    for account in db.get_simplefin_accounts_by_user(user["id"]):
+        key = institution_key(account)
+        if key:
+            names.setdefault(key, account.get("organization_name"))
+
+    def to_datetime(timestamp: float | None) -> datetime | None:
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    states = institution_breaker.states(sorted(names))
+    response = []
+    for key, state in states.items():
+        response.append(
+            InstitutionCircuitResponse(
+                institution=key,
+                organization_name=names[key],
+                state=state["state"],
+                consecutive_failures=state["consecutive_failures"],
+                opened_at=to_datetime(state["opened_at"]),
+                retry_at=to_datetime(state["retry_at"]),
             )
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to sync SimpleFin data: {str(e)}",
         )
+    return response
 
 
 @router.get("/raw-accounts/{item_id}", response_model=FetchAccountsResponse)
@@ -427,22 +584,18 @@ async def fetch_raw_accounts(
         db: Database instance (injected).
     """
     # Verify the item belongs to the user
-    item = db.get_simplefin_item_by_id(item_id)
+    item = db.get_simplefin_item_by_id(item_id, user["id"])
     if not item:
         raise HTTPException(status_code=404, detail="SimpleFin item not found")
-
-    if item["user_id"] != user["id"]:
-        raise HTTPException(
-            status_code=403,
-            detail="Not authorized to access this item",
-        )
+    _require_quota(item)
 
     try:
         # Decrypt the access URL
         access_url = decrypt_token(item["access_url"])
 
         # Fetch accounts from SimpleFin
-        data = simplefin_service.fetch_accounts(
+        sync_scheduler.reserve_request(db, item)
+        data = await simplefin_service.fetch_accounts(
             access_url,
             start_date=start_date,
         )
@@ -452,6 +605,8 @@ async def fetch_raw_accounts(
             errors=data.get("errors", []),
         )
 
+    except sync_scheduler.QuotaExhaustedError as e:
+        raise _quota_exhausted_exception(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from pydantic import BaseModel, Field
 from app.dependencies import get_current_user_with_token, get_database
 from app.services.snapshot_service import SnapshotService, InsufficientDataError
+from app.services.sync_scheduler import utc_today
 
 router = APIRouter(prefix="/snapshots", tags=["snapshots"])
 
@@ -88,9 +89,9 @@ async def get_snapshots(
         actual_start = (
             start_date.isoformat()
             if start_date
-            else (snapshots[0]["date"] if snapshots else date.today().isoformat())
+            else (snapshots[0]["date"] if snapshots else utc_today().isoformat())
         )
-        actual_end = end_date.isoformat() if end_date else date.today().isoformat()
+        actual_end = end_date.isoformat() if end_date else utc_today().isoformat()
 
         return SnapshotsResponse(
             start_date=actual_start,
@@ -156,9 +157,9 @@ async def get_account_snapshots(
         actual_start = (
             start_date.isoformat()
             if start_date
-            else (snapshots[0]["date"] if snapshots else date.today().isoformat())
+            else (snapshots[0]["date"] if snapshots else utc_today().isoformat())
         )
-        actual_end = end_date.isoformat() if end_date else date.today().isoformat()
+        actual_end = end_date.isoformat() if end_date else utc_today().isoformat()
 
         return SnapshotsResponse(
             start_date=actual_start,
@@ -202,5 +203,5 @@ async def store_daily_snapshots(
 
     return {
         "success": True,
-        "message": f"Account balances snapshotted for {snapshot_date or date.today()}",
+        "message": f"Account balances snapshotted for {snapshot_date or utc_today()}",
     }
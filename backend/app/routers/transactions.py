@@ -1,16 +1,23 @@
 """Transactions router - SimpleFin only."""
 
+import base64
+import json
+from datetime import date
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.database import Database
 from app.dependencies import get_current_user, get_database
 from app.logging_config import get_logger
 from app.schemas.transaction import (
+    TransactionFilters,
     TransactionResponse,
     TransactionListResponse,
     TransactionUpdate,
     TransactionBatchUpdate,
     TransactionBatchUpdateResponse,
+    TransactionSearchResult,
+    TransactionSearchResponse,
 )
 
 
@@ -24,21 +31,28 @@ async def list_transactions(
     date_to: str | None = Query(None, description="End date (YYYY-MM-DD)"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    filters: TransactionFilters = Depends(),
     user: dict = Depends(get_current_user),
     db: Database = Depends(get_database),
 ):
-    """List SimpleFin transactions with account info using joined view."""
+    """List SimpleFin transactions with account info using joined view.
+
+    Optional account, category, subcategory, categorization source,
+    uncategorized-only and amount filters are applied in the query.
+    """
     transactions = db.get_user_transactions_with_account_info(
         user_id=user["id"],
         date_from=date_from,
         date_to=date_to,
         limit=limit,
         offset=offset,
+        **filters.model_dump(),
     )
     total = db.count_user_transactions_with_account_info(
         user_id=user["id"],
         date_from=date_from,
         date_to=date_to,
+        **filters.model_dump(),
     )
 
     return TransactionListResponse(
@@ -49,6 +63,61 @@ async def list_transactions(
     )
 
 
+def _encode_cursor(row: dict) -> str:
+    payload = json.dumps([row["search_rank"], row["posted_date"], row["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[float, int, str]:
+    try:
+        rank, posted_date, transaction_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        return float(rank), int(posted_date), str(transaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/search", response_model=TransactionSearchResponse)
+async def search_transactions(
+    q: str = Query(
+        ..., min_length=2, max_length=100, description="Text in description or payee"
+    ),
+    min_amount: float | None = Query(
+        None, description="Minimum signed amount (negative = expense)"
+    ),
+    max_amount: float | None = Query(None, description="Maximum signed amount"),
+    date_from: date | None = Query(None, description="Start date (YYYY-MM-DD)"),
+    date_to: date | None = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+):
+    """Search transactions by description/payee, best match first.
+
+    Matches substrings ("amazon") and near misses ("amazn") using the trigram
+    index, ranked by similarity and then recency. Page with next_cursor.
+    """
+    rows = db.search_transactions(
+        user_id=user["id"],
+        query=q.strip(),
+        min_amount=min_amount,
+        max_amount=max_amount,
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None,
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,  # One extra row tells us whether there is a next page
+    )
+
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return TransactionSearchResponse(
+        items=[TransactionSearchResult(**row) for row in rows[:limit]],
+        limit=limit,
+        next_cursor=next_cursor,
+    )
+
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(
     transaction_id: str,
@@ -128,10 +128,12 @@ class CategorizationRuleCreate(BaseModel):
 
     match_field: str = Field(
         ...,
-        description="Field to match against: 'payee', 'description', or 'memo'",
+        description="Field to match against: 'payee', 'description', 'memo', or 'merchant_key'",
     )
     match_value: str = Field(
-        ..., min_length=1, description="Case-insensitive substring to match"
+        ...,
+        min_length=1,
+        description="Case-insensitive substring to match (for merchant_key: a merchant name, normalized and matched exactly)",
     )
     category_id: str = Field(..., description="Category to assign when rule matches")
     subcategory_id: str | None = Field(
@@ -174,7 +176,7 @@ class ManualCategorizationRequest(BaseModel):
     )
     create_rule: bool = Field(
         default=False,
-        description="Create a rule based on this transaction's payee for future auto-categorization",
+        description="Create a rule based on this transaction's merchant (or payee) for future auto-categorization",
     )
 
 
@@ -194,6 +196,10 @@ class CategorizationRequest(BaseModel):
         default=False,
         description="If True, re-categorize even if already categorized",
     )
+    background: bool = Field(
+        default=False,
+        description="If True, queue the categorization for the background worker and return 202 with a job_id (poll GET /jobs/{job_id})",
+    )
 
 
 class TransactionCategorization(BaseModel):
@@ -212,6 +218,79 @@ class CategorizationResponse(BaseModel):
     categorized_count: int
     failed_count: int
     results: list[TransactionCategorization]
+    run_id: str | None = Field(
+        None, description="categorization_runs record with this run's LLM usage"
+    )
+
+
+# ============================================================================
+# Categorization Runs / Metrics
+# ============================================================================
+
+
+class CategorizationRunResponse(BaseModel):
+    """One categorization run with its LLM usage."""
+
+    id: str
+    status: str
+    provider: str
+    model: str
+    transactions_requested: int
+    rule_matched_count: int
+    ai_transactions_count: int
+    categorized_count: int
+    failed_count: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    llm_latency_ms: int
+    llm_retries: int
+    estimated_cost_usd: float
+    calls: list[dict] = Field(
+        default_factory=list,
+        description="Per-call model, transactions, tokens, latency_ms, retries and cost_usd",
+    )
+    error_message: str | None = None
+    created_at: datetime
+    completed_at: datetime | None = None
+
+
+class CategorizationRunListResponse(BaseModel):
+    """List of categorization runs, newest first."""
+
+    items: list[CategorizationRunResponse]
+    total: int
+
+
+class CategorizationModelMetrics(BaseModel):
+    """LLM usage totals for one provider/model."""
+
+    provider: str
+    model: str
+    runs: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    estimated_cost_usd: float
+
+
+class CategorizationMetricsResponse(BaseModel):
+    """AI categorization usage and cost over a time window."""
+
+    days: int
+    runs: int
+    failed_runs: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    llm_retries: int
+    avg_latency_ms: float = Field(..., description="Average latency per LLM call")
+    transactions_categorized: int
+    estimated_cost_usd: float
+    cost_per_categorized_transaction_usd: float | None = Field(
+        None, description="Estimated cost / transactions categorized (None if none)"
+    )
+    by_model: list[CategorizationModelMetrics]
 
 
 # ============================================================================
@@ -0,0 +1,28 @@
+"""Background job queue schemas."""
+
+from datetime import datetime
+from typing import Any
+from pydantic import BaseModel
+
+
+class JobAcceptedResponse(BaseModel):
+    """Response (202) when work is queued for the background worker."""
+
+    success: bool
+    job_id: str  # Poll GET /jobs/{job_id}
+    status: str = "queued"
+
+
+class JobResponse(BaseModel):
+    """Background job status."""
+
+    id: str
+    job_type: str  # simplefin_sync, snapshot or categorization
+    status: str  # queued, running, completed or failed
+    attempts: int
+    max_attempts: int
+    run_after: datetime  # Next attempt not before this (retry backoff)
+    last_error: str | None
+    result: dict[str, Any] | None
+    created_at: datetime
+    completed_at: datetime | None
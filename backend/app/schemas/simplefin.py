@@ -30,6 +30,7 @@ class SimplefinItemResponse(BaseModel):
     institution_name: str | None
     status: str
     last_synced_at: datetime | None
+    quota_remaining: int | None = None  # SimpleFin requests left today (UTC)
     created_at: datetime
     updated_at: datetime
 
@@ -86,6 +87,7 @@ class SimplefinTransactionResponse(BaseModel):
     description: str  # Raw merchant description
     payee: str | None  # Cleaned-up merchant name
     memo: str | None  # Additional notes
+    merchant_key: str | None = None  # Normalized merchant (e.g. "blue bottle")
 
     pending: bool
 
@@ -119,18 +121,54 @@ class SyncResponse(BaseModel):
     accounts_synced: int
     transactions_added: int
     transactions_updated: int
+    transactions_unchanged: int = 0
     errors: list[str] = []
 
 
+class SyncJobAcceptedResponse(BaseModel):
+    """Response (202) when a sync runs in the background or is already running."""
+
+    success: bool
+    sync_job_id: str  # Poll GET /simplefin/sync-jobs/{sync_job_id}
+    status: str
+    detail: str | None = None
+
+
+class BalanceRefreshResponse(BaseModel):
+    """Response from a balances-only SimpleFin refresh."""
+
+    success: bool
+    accounts_updated: int
+    snapshots_written: int
+    errors: list[str] = []
+
+
+class InstitutionCircuitResponse(BaseModel):
+    """Circuit breaker state for an institution behind the SimpleFin bridge."""
+
+    institution: str  # organization_domain, or organization_sfin_url if no domain
+    organization_name: str | None = None
+    state: str  # closed, open, half_open
+    consecutive_failures: int
+    opened_at: datetime | None = None
+    retry_at: datetime | None = None  # When an open circuit admits its next probe
+
+
 class SimplefinSyncJobResponse(BaseModel):
     """SimpleFin sync job status."""
 
     id: str
     simplefin_item_id: str
     status: str
+    job_type: str = "sync"  # sync, backfill or replay
     accounts_synced: int
     transactions_added: int
     transactions_updated: int
+    transactions_unchanged: int = 0
+    accounts_processed: int = 0  # Progress while running
+    rows_written: int = 0
+    bytes_fetched: int = 0
+    progress_updated_at: datetime | None = None
     error_message: str | None
     created_at: datetime
     completed_at: datetime | None
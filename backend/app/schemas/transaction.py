@@ -1,7 +1,24 @@
 """Transaction schemas - SimpleFin only."""
 
 from datetime import datetime
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
+
+
+class TransactionFilters(BaseModel):
+    """Optional server-side filters for transaction listings (query parameters)."""
+
+    account_id: str | None = Field(None, description="Only this account")
+    category_id: str | None = Field(None, description="Only this category")
+    subcategory_id: str | None = Field(None, description="Only this subcategory")
+    categorization_source: Literal["ai", "rule", "manual", "uncategorized"] | None = (
+        Field(None, description="How the transaction was categorized")
+    )
+    uncategorized: bool = Field(False, description="Only transactions with no category")
+    min_amount: float | None = Field(
+        None, description="Minimum signed amount (negative = expense)"
+    )
+    max_amount: float | None = Field(None, description="Maximum signed amount")
 
 
 class TransactionResponse(BaseModel):
@@ -18,6 +35,7 @@ class TransactionResponse(BaseModel):
     posted: datetime | None
     description: str
     payee: str | None
+    merchant_key: str | None = None
     pending: bool
     category_id: str | None = None
     subcategory_id: str | None = None
@@ -34,6 +52,20 @@ class TransactionListResponse(BaseModel):
     offset: int
 
 
+class TransactionSearchResult(TransactionResponse):
+    """Transaction matching a search, with its relevance."""
+
+    search_rank: float  # Word similarity to the query (0-1)
+
+
+class TransactionSearchResponse(BaseModel):
+    """One page of search results, best match first."""
+
+    items: list[TransactionSearchResult]
+    limit: int
+    next_cursor: str | None = None  # Pass as `cursor` for the next page; None on the last
+
+
 class TransactionUpdate(BaseModel):
     """Update transaction categorization."""
 
@@ -1,21 +1,146 @@
-"""AI-powered transaction categorization with rules-first pipeline."""
-
-import json
+"""AI-powered transaction categorization with rules-first pipeline.
+
+Provider clients are process-wide and every model call goes through
+llm_clients.stream_llm() (shared connection pool, concurrency cap, retries).
+Model responses are streamed: each categorization is parsed as soon as its
+JSON object is complete and written in micro-batches while the model is
+still generating the rest.
+Provider SDKs (anthropic, openrouter) are imported when a client is first
+created, not at module load: they are slow to import and most processes
+that import this module (API routes, worker) never categorize.
+"""
+
+import time
 from abc import ABC, abstractmethod
-from anthropic import Anthropic
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
 from app.config import get_settings
 from app.database import Database
+from app.services.llm_clients import (
+    LLMBusyError,
+    LLMCall,
+    get_anthropic_client,
+    get_openrouter_client,
+    stream_llm,
+)
+from app.utils.json_stream import JSONArrayStream
+
+
+class CategorizationWriter:
+    """Writes AI categorizations in micro-batches on a background thread.
+
+    A batch is written once it holds batch_size results, or as soon as a
+    result arrives flush_seconds after the previous write. The first result
+    is written right away. Batches use the batch_update_transaction_categories
+    RPC; a batch that fails or updates fewer rows is retried row by row.
+    """
+
+    def __init__(self, db: Database, batch_size: int, flush_seconds: float):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._batch: list[dict] = []
+        self._futures: list[Future] = []
+        self._last_flush = float("-inf")
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="categorization-writer"
+        )
+
+    def add(self, categorization: dict) -> None:
+        self._batch.append(categorization)
+        if (
+            len(self._batch) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch:
+            self._futures.append(self._executor.submit(self._write, self._batch))
+            self._batch = []
+        self._last_flush = time.monotonic()
+
+    def close(self) -> tuple[list[dict], int]:
+        """Write what is left, wait for all batches and return (results, failed_count)."""
+        self.flush()
+        results = []
+        failed_count = 0
+        for future in self._futures:
+            batch_results, batch_failed = future.result()
+            results.extend(batch_results)
+            failed_count += batch_failed
+        self._executor.shutdown()
+        return results, failed_count
+
+    def _write(self, batch: list[dict]) -> tuple[list[dict], int]:
+        try:
+            updated = self.db.batch_update_simplefin_transactions(
+                [
+                    {
+                        "id": cat["transaction_id"],
+                        "category_id": cat.get("category_id"),
+                        "subcategory_id": cat.get("subcategory_id"),
+                        "categorization_source": "ai",
+                    }
+                    for cat in batch
+                ]
+            )
+            if updated == len(batch):
+                return [self._result(cat) for cat in batch], 0
+            print(
+                f"[Categorization] Batch updated {updated}/{len(batch)}, retrying row by row"
+            )
+        except Exception as e:
+            print(f"[Categorization] Batch write failed, retrying row by row: {e}")
+
+        results = []
+        failed_count = 0
+        for cat in batch:
+            try:
+                updated = self.db.update_transaction_category(
+                    transaction_id=cat["transaction_id"],
+                    category_id=cat.get("category_id"),
+                    subcategory_id=cat.get("subcategory_id"),
+                    categorization_source="ai",
+                )
+            except Exception as e:
+                updated = None
+                print(
+                    f"[Categorization] AI apply failed for {cat['transaction_id']}: {e}"
+                )
+            if updated:
+                results.append(self._result(cat))
+            else:
+                failed_count += 1
+        return results, failed_count
+
+    @staticmethod
+    def _result(cat: dict) -> dict:
+        return {
+            "transaction_id": cat["transaction_id"],
+            "category_id": cat.get("category_id"),
+            "subcategory_id": cat.get("subcategory_id"),
+            "confidence": cat.get("confidence", 0.0),
+            "reasoning": cat.get("reasoning"),
+        }
 
 
 class BaseCategorizationService(ABC):
     """Abstract base class for categorization services."""
 
+    provider: str  # Name recorded on categorization runs (and used for pricing)
+    model: str
+
     def __init__(self, db: Database):
         self.db = db
 
     @abstractmethod
-    def _call_ai_model(self, prompt: str) -> str:
-        """Call the AI model with the given prompt and return response text."""
+    def _stream_ai_model(self, prompt: str, call: LLMCall) -> Iterator[str]:
+        """Call the AI model with the given prompt and yield response text as it arrives.
+
+        Implementations stream through stream_llm(..., record=call) and set
+        the call's token counts from the provider's usage report.
+        """
         pass
 
     def _build_categories_context(self, user_id: str) -> str:
@@ -88,19 +213,32 @@ Only respond with the JSON array, no other text."""
     ) -> tuple[list[dict], list[dict]]:
         """Apply categorization rules to transactions.
 
+        merchant_key rules match the transaction's normalized merchant key
+        exactly (a dict lookup) and take precedence; the other rules are
+        case-insensitive substring matches, checked in order.
+
         Returns:
             (rule_matched, remaining): transactions matched by rules, and those not matched
         """
         rule_matched = []
         remaining = []
 
+        merchant_rules = {}
+        substring_rules = []
+        for rule in rules:
+            if rule["match_field"] == "merchant_key":
+                merchant_rules.setdefault(rule["match_value"], rule)
+            else:
+                substring_rules.append(rule)
+
         for txn in transactions:
-            matched_rule = None
-            for rule in rules:
-                field_value = txn.get(rule["match_field"], "") or ""
-                if rule["match_value"].lower() in field_value.lower():
-                    matched_rule = rule
-                    break
+            matched_rule = merchant_rules.get(txn.get("merchant_key"))
+            if not matched_rule:
+                for rule in substring_rules:
+                    field_value = txn.get(rule["match_field"], "") or ""
+                    if rule["match_value"].lower() in field_value.lower():
+                        matched_rule = rule
+                        break
 
             if matched_rule:
                 rule_matched.append(
@@ -129,6 +267,9 @@ Only respond with the JSON array, no other text."""
         4. Send remaining to Claude AI
         5. Mark AI-categorized as categorization_source='ai'
         6. Remaining stay as categorization_source='uncategorized'
+
+        Each run is recorded in categorization_runs with its counts and the
+        model calls' tokens, latency, retries and estimated cost.
         """
         print(f"[Categorization] Starting for user {user_id}")
         print(f"[Categorization] Transaction IDs: {transaction_ids}, Force: {force}")
@@ -141,21 +282,37 @@ Only respond with the JSON array, no other text."""
                 if txn and txn["user_id"] == user_id:
                     transactions.append(txn)
         else:
-            all_txns = self.db.get_user_simplefin_transactions(
-                user_id=user_id, limit=200
+            # Without force, only uncategorized transactions (filtered in the query)
+            transactions = self.db.get_user_simplefin_transactions(
+                user_id=user_id, limit=200, uncategorized=not force
             )
-            if force:
-                transactions = all_txns
-            else:
-                transactions = [
-                    txn for txn in all_txns if txn.get("category_id") is None
-                ]
 
         print(f"[Categorization] Found {len(transactions)} transactions to categorize")
 
         if not transactions:
             return {"categorized_count": 0, "failed_count": 0, "results": []}
 
+        run = self._start_run(user_id, len(transactions))
+        calls: list[LLMCall] = []
+        try:
+            result = self._categorize(user_id, transactions, run, calls)
+        except Exception as e:
+            self._finish_run(
+                run, calls, status="failed", error_message=str(e), **run["counts"]
+            )
+            raise
+        self._finish_run(run, calls, status="completed", **run["counts"])
+
+        return {**result, "run_id": run["id"]}
+
+    def _categorize(
+        self,
+        user_id: str,
+        transactions: list[dict],
+        run: dict,
+        calls: list,
+    ) -> dict:
+        """Apply rules, then AI, to the transactions (see categorize_transactions)."""
         # Step 1: Apply user rules
         rules = self.db.get_categorization_rules(user_id)
         print(f"[Categorization] Applying {len(rules)} user rules")
@@ -164,6 +321,10 @@ Only respond with the JSON array, no other text."""
         print(
             f"[Categorization] Rules matched: {len(rule_matched)}, remaining for AI: {len(remaining)}"
         )
+        run["counts"].update(
+            rule_matched_count=len(rule_matched),
+            ai_transactions_count=len(remaining),
+        )
 
         results = []
         categorized_count = 0
@@ -188,7 +349,11 @@ Only respond with the JSON array, no other text."""
                             "category_id": rule["category_id"],
                             "subcategory_id": rule.get("subcategory_id"),
                             "confidence": 1.0,
-                            "reasoning": f"Matched rule: {rule['match_field']} contains '{rule['match_value']}'",
+                            "reasoning": (
+                                f"Matched rule: merchant is '{rule['match_value']}'"
+                                if rule["match_field"] == "merchant_key"
+                                else f"Matched rule: {rule['match_field']} contains '{rule['match_value']}'"
+                            ),
                         }
                     )
                 else:
@@ -203,48 +368,39 @@ Only respond with the JSON array, no other text."""
             transactions_context = self._build_transactions_context(remaining)
             prompt = self._build_prompt(categories_context, transactions_context)
 
+            call = LLMCall(
+                provider=self.provider,
+                model=self.model,
+                transactions=len(remaining),
+            )
+            calls.append(call)
+            settings = get_settings()
+            writer = CategorizationWriter(
+                self.db,
+                batch_size=settings.categorization_write_batch_size,
+                flush_seconds=settings.categorization_write_flush_seconds,
+            )
+            parser = JSONArrayStream()
+            sent_ids = {txn["id"] for txn in remaining}
+            seen_ids = set()
+
             try:
-                print("[Categorization] Calling AI model...")
-                response_text = self._call_ai_model(prompt)
-                categorizations = json.loads(response_text)
-
-                for cat in categorizations:
-                    try:
-                        txn_id = cat["transaction_id"]
-                        category_id = cat.get("category_id")
-                        subcategory_id = cat.get("subcategory_id")
-
-                        updated = self.db.update_transaction_category(
-                            transaction_id=txn_id,
-                            category_id=category_id,
-                            subcategory_id=subcategory_id,
-                            categorization_source="ai",
+                print("[Categorization] Streaming AI model response...")
+                for text in self._stream_ai_model(prompt, call):
+                    for cat in parser.feed(text):
+                        txn_id = (
+                            cat.get("transaction_id") if isinstance(cat, dict) else None
                         )
-
-                        if updated:
-                            categorized_count += 1
-                            results.append(
-                                {
-                                    "transaction_id": txn_id,
-                                    "category_id": category_id,
-                                    "subcategory_id": subcategory_id,
-                                    "confidence": cat.get("confidence", 0.0),
-                                    "reasoning": cat.get("reasoning"),
-                                }
-                            )
-                        else:
+                        # Only apply results for transactions in this prompt, once
+                        if txn_id not in sent_ids or txn_id in seen_ids:
                             failed_count += 1
-                    except Exception as e:
-                        failed_count += 1
-                        print(
-                            f"[Categorization] AI apply failed for {cat.get('transaction_id')}: {e}"
-                        )
+                            print(f"[Categorization] Ignoring AI result: {cat}")
+                            continue
+                        seen_ids.add(txn_id)
+                        writer.add(cat)
 
-            except json.JSONDecodeError as e:
-                print(f"[Categorization] JSON parsing error: {e}")
-                raise Exception(
-                    "AI categorization failed: Invalid JSON response from model"
-                )
+            except LLMBusyError:
+                raise
             except Exception as e:
                 print(f"[Categorization] AI error: {e}")
                 import traceback
@@ -252,42 +408,131 @@ Only respond with the JSON array, no other text."""
                 traceback.print_exc()
                 raise Exception(f"AI categorization failed: {str(e)}")
 
+            finally:
+                # Keep every categorization that completed, even if the stream failed
+                ai_results, ai_failed = writer.close()
+                results.extend(ai_results)
+                categorized_count += len(ai_results)
+                failed_count += ai_failed
+                run["counts"].update(
+                    categorized_count=categorized_count, failed_count=failed_count
+                )
+                print(
+                    f"[Categorization] LLM call: {call.prompt_tokens} prompt / "
+                    f"{call.completion_tokens} completion tokens, "
+                    f"{call.first_chunk_ms}ms to first chunk, {call.latency_ms}ms total, "
+                    f"{call.retries} retries, ${call.cost_usd:.4f}"
+                )
+
+            if not parser.started:
+                print("[Categorization] JSON parsing error: no array in response")
+                raise Exception(
+                    "AI categorization failed: Invalid JSON response from model"
+                )
+            if not parser.complete:
+                print(
+                    f"[Categorization] Response truncated after {parser.count} results; "
+                    f"kept them, {len(sent_ids - seen_ids)} transactions left uncategorized"
+                )
+
         print(
             f"[Categorization] Complete: {categorized_count} succeeded, {failed_count} failed"
         )
+        run["counts"].update(
+            categorized_count=categorized_count, failed_count=failed_count
+        )
         return {
             "categorized_count": categorized_count,
             "failed_count": failed_count,
             "results": results,
         }
 
+    def _start_run(self, user_id: str, transactions_requested: int) -> dict:
+        """Create the categorization_runs record (best effort)."""
+        run = {"id": None, "counts": {}}
+        try:
+            created = self.db.create_categorization_run(
+                {
+                    "user_id": user_id,
+                    "provider": self.provider,
+                    "model": self.model,
+                    "transactions_requested": transactions_requested,
+                }
+            )
+            run["id"] = created["id"]
+        except Exception as e:
+            # Instrumentation must never block categorization
+            print(f"[Categorization] Failed to record run: {e}")
+        return run
+
+    def _finish_run(self, run: dict, calls: list, status: str, **fields) -> None:
+        """Store the run's outcome and LLM call totals (best effort)."""
+        if not run["id"]:
+            return
+        try:
+            self.db.update_categorization_run(
+                run["id"],
+                {
+                    **fields,
+                    "status": status,
+                    "llm_calls": len(calls),
+                    "prompt_tokens": sum(c.prompt_tokens for c in calls),
+                    "completion_tokens": sum(c.completion_tokens for c in calls),
+                    "llm_latency_ms": sum(c.latency_ms for c in calls),
+                    "llm_retries": sum(c.retries for c in calls),
+                    "estimated_cost_usd": round(sum(c.cost_usd for c in calls), 6),
+                    "calls": [c.to_dict() for c in calls],
+                    "completed_at": "now()",
+                },
+            )
+        except Exception as e:
+            print(f"[Categorization] Failed to update run {run['id']}: {e}")
+
 
 class ClaudeCategorizationService(BaseCategorizationService):
     """Categorization service using Claude (Anthropic)."""
 
+    provider = "claude"
+
     def __init__(
         self, db: Database, api_key: str, model: str = "claude-3-5-sonnet-20241022"
     ):
         super().__init__(db)
-        self.client = Anthropic(api_key=api_key)
+        self.client = get_anthropic_client(api_key)
         self.model = model
 
-    def _call_ai_model(self, prompt: str) -> str:
-        """Call Claude API and return response text."""
+    def _stream_ai_model(self, prompt: str, call: LLMCall) -> Iterator[str]:
+        """Stream the Claude API response text."""
         print(f"[Claude] Calling model {self.model}")
-        message = self.client.messages.create(
-            model=self.model,
-            max_tokens=4096,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        response = message.content[0].text
-        print(f"[Claude] Response received: {len(response)} characters")
-        return response
+
+        def open_stream() -> Iterator[str]:
+            with self.client.messages.create(
+                model=self.model,
+                max_tokens=4096,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            ) as stream:
+                for event in stream:
+                    if event.type == "message_start":
+                        call.prompt_tokens = event.message.usage.input_tokens
+                    elif (
+                        event.type == "content_block_delta"
+                        and event.delta.type == "text_delta"
+                    ):
+                        yield event.delta.text
+                    elif event.type == "message_delta":
+                        call.completion_tokens = event.usage.output_tokens
+                        if event.delta.stop_reason == "max_tokens":
+                            print("[Claude] Response stopped at max_tokens")
+
+        return stream_llm(open_stream, label="Claude", record=call)
 
 
 class OpenRouterCategorizationService(BaseCategorizationService):
     """Categorization service using OpenRouter."""
 
+    provider = "openrouter"
+
     def __init__(
         self,
         db: Database,
@@ -295,25 +540,32 @@ class OpenRouterCategorizationService(BaseCategorizationService):
         model: str = "meta-llama/llama-3.1-8b-instruct:free",
     ):
         super().__init__(db)
-        try:
-            from openrouter import OpenRouter
-        except ImportError:
-            raise ImportError(
-                "openrouter package not installed. Install with: uv add openrouter"
-            )
-        self.client = OpenRouter(api_key=api_key)
+        self.client = get_openrouter_client(api_key)
         self.model = model
 
-    def _call_ai_model(self, prompt: str) -> str:
-        """Call OpenRouter API and return response text."""
+    def _stream_ai_model(self, prompt: str, call: LLMCall) -> Iterator[str]:
+        """Stream the OpenRouter API response text."""
         print(f"[OpenRouter] Calling model {self.model}")
-        response = self.client.chat.send(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        content = response.choices[0].message.content
-        print(f"[OpenRouter] Response received: {len(content)} characters")
-        return content
+
+        def open_stream() -> Iterator[str]:
+            with self.client.chat.send(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            ) as stream:
+                for chunk in stream:
+                    if getattr(chunk, "error", None):
+                        raise Exception(
+                            f"OpenRouter stream error: {chunk.error.message}"
+                        )
+                    if getattr(chunk, "usage", None):
+                        call.prompt_tokens = chunk.usage.prompt_tokens or 0
+                        call.completion_tokens = chunk.usage.completion_tokens or 0
+                    for choice in chunk.choices:
+                        if choice.delta.content:
+                            yield choice.delta.content
+
+        return stream_llm(open_stream, label="OpenRouter", record=call)
 
 
 def get_categorization_service(db: Database) -> BaseCategorizationService:
@@ -0,0 +1,123 @@
+"""Per-institution circuit breaker for SimpleFin fetches.
+
+When a bank behind the SimpleFin bridge is down, every item for that
+institution would otherwise wait out its full timeout (plus retries) in turn.
+The breaker trips after N consecutive failures, fails fast for a cooldown,
+then lets a single half-open probe through to decide whether to close again.
+
+State lives in the institution_circuits table, so every API and worker
+process shares one view of an institution: failures seen by any worker trip
+it for all of them, and GET /simplefin/institutions/status reports it.
+Breaker calls always use the service-role client (the table is not exposed
+to users). If the database can't be reached the breaker fails open, so an
+outage of the breaker itself never blocks syncs.
+"""
+
+import time
+from datetime import datetime
+
+from app.config import get_settings
+from app.database import Database, get_supabase_client
+from app.logging_config import get_logger
+
+logger = get_logger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when every institution behind an item has an open circuit."""
+
+    def __init__(self, institutions: list[str], retry_at: float):
+        self.institutions = institutions
+        self.retry_at = retry_at
+        super().__init__(
+            f"Circuit open for {', '.join(institutions)}; "
+            f"retry after {time.strftime('%H:%M:%S', time.gmtime(retry_at))} UTC"
+        )
+
+
+def _timestamp(value: str | None) -> float | None:
+    if value is None:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class CircuitBreaker:
+    """Circuit breaker keyed by an arbitrary string, shared through Postgres."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+    @staticmethod
+    def _db() -> Database:
+        return Database(get_supabase_client())
+
+    def allow(self, key: str) -> bool:
+        """
+        Check whether a request for key may proceed.
+
+        An open circuit past its cooldown moves to half-open and admits exactly
+        one probe; further callers fail fast until that probe is recorded. A
+        probe that never reports back is replaced after another cooldown.
+        """
+        try:
+            return self._db().admit_institution_circuit(
+                key, int(self.cooldown_seconds)
+            )
+        except Exception as e:
+            logger.warning(f"Circuit check failed for {key}; allowing: {str(e)}")
+            return True
+
+    def record_success(self, key: str) -> None:
+        """Close the circuit for key."""
+        try:
+            self._db().close_institution_circuit(key)
+        except Exception as e:
+            logger.warning(f"Failed to close circuit for {key}: {str(e)}")
+
+    def record_failure(self, key: str) -> None:
+        """Count a failure for key, opening the circuit at the threshold."""
+        try:
+            self._db().record_institution_circuit_failure(key, self.failure_threshold)
+        except Exception as e:
+            logger.warning(f"Failed to record circuit failure for {key}: {str(e)}")
+
+    def state(self, key: str) -> dict:
+        """Get the current state of the circuit for key."""
+        return self.states([key])[key]
+
+    def states(self, keys: list[str]) -> dict[str, dict]:
+        """Get the current state of the circuits for keys, in one query."""
+        circuits = {row["key"]: row for row in self._db().get_institution_circuits(keys)}
+        return {key: self._describe(key, circuits.get(key)) for key in keys}
+
+    def _describe(self, key: str, circuit: dict | None) -> dict:
+        circuit = circuit or {}
+        state = circuit.get("state", CLOSED)
+        opened_at = _timestamp(circuit.get("opened_at"))
+        retry_at = opened_at + self.cooldown_seconds if opened_at is not None else None
+        if state == OPEN and retry_at is not None and time.time() >= retry_at:
+            state = HALF_OPEN
+        return {
+            "key": key,
+            "state": state,
+            "consecutive_failures": circuit.get("consecutive_failures", 0),
+            "opened_at": opened_at,
+            "retry_at": retry_at,
+        }
+
+
+def institution_key(account: dict) -> str | None:
+    """Get the breaker key for an account's institution (domain, else SFIN URL)."""
+    return account.get("organization_domain") or account.get("organization_sfin_url")
+
+
+_settings = get_settings()
+institution_breaker = CircuitBreaker(
+    failure_threshold=_settings.simplefin_breaker_failure_threshold,
+    cooldown_seconds=_settings.simplefin_breaker_cooldown_seconds,
+)
@@ -0,0 +1,188 @@
+"""Durable job queue backed by the Postgres jobs table.
+
+Producers (API routes, cron jobs) add work with enqueue(), which always uses
+the service-role client (users cannot insert jobs); the worker pool in each
+worker process claims it with the claim_jobs RPC (FOR UPDATE SKIP LOCKED), so
+throughput scales by adding workers. Claimed jobs hold a lease
+that is heartbeated while they run; a crashed worker's jobs are claimed again
+once the lease expires. Failures are retried with exponential backoff up to
+the job's max_attempts.
+
+Handlers are registered per job type with @job_handler (see app/jobs.py).
+They get the whole job row and must check that job["user_id"] owns whatever
+the payload references before acting on it.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+from app.config import get_settings
+from app.database import Database, get_supabase_client
+from app.logging_config import get_logger
+
+logger = get_logger("job_queue")
+
+JobHandler = Callable[[Database, dict], Awaitable[dict | None]]
+
+JOB_HANDLERS: dict[str, JobHandler] = {}
+
+
+class NonRetryableJobError(Exception):
+    """Raised by a handler when retrying the job cannot help."""
+
+
+def job_handler(job_type: str) -> Callable[[JobHandler], JobHandler]:
+    """Register an async handler(db, job) -> result for a job type."""
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = func
+        return func
+
+    return decorator
+
+
+def enqueue(
+    job_type: str,
+    payload: dict,
+    user_id: str | None = None,
+    dedupe_key: str | None = None,
+    priority: int = 0,
+    delay_seconds: int = 0,
+    max_attempts: int | None = None,
+) -> str:
+    """
+    Add a job to the queue, using the service-role client.
+
+    Args:
+        job_type: Registered job type (simplefin_sync, snapshot, ...).
+        payload: JSON arguments for the handler.
+        user_id: Owning user, so they can read the job's status. Handlers
+            only act on data this user owns.
+        dedupe_key: Optional key; while a job with this key is queued or
+            running, the existing job's ID is returned instead.
+        priority: Higher runs first.
+        delay_seconds: Don't run before this many seconds from now.
+        max_attempts: Attempts before giving up (defaults to settings).
+
+    Returns:
+        The job ID.
+    """
+    return Database(get_supabase_client()).enqueue_job(
+        job_type,
+        payload,
+        user_id=user_id,
+        dedupe_key=dedupe_key,
+        priority=priority,
+        delay_seconds=delay_seconds,
+        max_attempts=max_attempts or get_settings().job_max_attempts,
+    )
+
+
+class JobWorkerPool:
+    """
+    Claims jobs and runs up to `concurrency` of them at once.
+
+    Only claims as many jobs as it has free slots (backpressure), and polls
+    every poll_seconds while idle.
+    """
+
+    def __init__(self, db: Database, worker_id: str):
+        settings = get_settings()
+        self.db = db
+        self.worker_id = worker_id
+        self.concurrency = settings.worker_concurrency
+        self.lease_seconds = settings.job_lease_seconds
+        self.poll_seconds = settings.worker_poll_seconds
+        self.retry_backoff_seconds = settings.job_retry_backoff_seconds
+        self._running: set[asyncio.Task] = set()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Claim and run jobs until stop is set, then cancel in-flight jobs."""
+        stopping = asyncio.create_task(stop.wait())
+        try:
+            while not stop.is_set():
+                free = self.concurrency - len(self._running)
+                if free > 0:
+                    for job in await self._claim(free):
+                        task = asyncio.create_task(self._execute(job))
+                        self._running.add(task)
+                        task.add_done_callback(self._running.discard)
+
+                # Wake on shutdown, a finished job (free slot) or the poll interval
+                await asyncio.wait(
+                    {stopping, *self._running},
+                    timeout=self.poll_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+        finally:
+            stopping.cancel()
+            running = list(self._running)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _claim(self, limit: int) -> list[dict]:
+        try:
+            return await asyncio.to_thread(
+                self.db.claim_jobs,
+                self.worker_id,
+                list(JOB_HANDLERS),
+                limit,
+                self.lease_seconds,
+            )
+        except Exception as e:
+            logger.error(f"Failed to claim jobs: {str(e)}")
+            return []
+
+    async def _execute(self, job: dict) -> None:
+        """Run one claimed job and record its outcome."""
+        job_id = job["id"]
+        handler = JOB_HANDLERS[job["job_type"]]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, asyncio.current_task()))
+        try:
+            result = await handler(self.db, job)
+
+        except asyncio.CancelledError:
+            # Shutdown: requeue now, without waiting out the lease or using up
+            # an attempt (a no-op if the lease was lost to another worker)
+            await asyncio.to_thread(self.db.release_job, job_id, self.worker_id)
+            raise
+
+        except NonRetryableJobError as e:
+            await asyncio.to_thread(self.db.fail_job, job_id, self.worker_id, str(e))
+            logger.warning(f"Job {job_id} ({job['job_type']}) failed: {str(e)}")
+
+        except Exception as e:
+            delay = self.retry_backoff_seconds * 2 ** (job["attempts"] - 1)
+            status = await asyncio.to_thread(
+                self.db.fail_job, job_id, self.worker_id, str(e), delay
+            )
+            logger.warning(
+                f"Job {job_id} ({job['job_type']}) attempt {job['attempts']} "
+                f"failed ({status}): {str(e)}"
+            )
+
+        else:
+            await asyncio.to_thread(
+                self.db.complete_job, job_id, self.worker_id, result
+            )
+            logger.info(f"Job {job_id} ({job['job_type']}) completed")
+
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task) -> None:
+        """Renew the job's lease; cancel the job if another worker took it."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await asyncio.to_thread(
+                    self.db.heartbeat_job, job_id, self.worker_id, self.lease_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for job {job_id}: {str(e)}")
+                continue
+            if not held:
+                logger.warning(f"Lost lease on job {job_id}; cancelling it")
+                task.cancel()
+                return
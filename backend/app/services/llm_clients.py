@@ -0,0 +1,297 @@
+"""Process-wide LLM provider clients for AI categorization.
+
+Every categorization service (API requests and worker jobs alike) shares one
+client per provider and API key, so calls reuse a single pooled connection
+set instead of building a new SDK client per request. All provider calls go
+through call_llm() (or stream_llm() for streamed responses), which:
+
+- caps in-flight LLM calls per process with a semaphore; callers queue for a
+  slot and get LLMBusyError if none frees up in time
+- retries rate-limit (429) and overloaded (529) responses with full-jitter
+  exponential backoff, honouring Retry-After, without holding a slot while
+  backing off
+- relies on the clients' split connect/read timeouts
+- measures each call (latency, time to first chunk, retries) into an
+  optional LLMCall record
+
+Provider SDKs are imported when their client is first created.
+"""
+
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+import httpx
+
+from app.config import get_settings
+from app.logging_config import get_logger
+
+logger = get_logger("llm_clients")
+
+T = TypeVar("T")
+
+# Rate limited, or provider overloaded (Anthropic's 529)
+RETRYABLE_STATUS_CODES = {429, 529}
+
+# Longest Retry-After we honour; a provider asking for more fails the call
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+_clients: dict[tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+_call_slots = threading.BoundedSemaphore(get_settings().llm_max_concurrent_calls)
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM call slot frees up within llm_queue_timeout_seconds."""
+
+
+@dataclass
+class LLMCall:
+    """Measurements for one model call; call_llm fills latency and retries."""
+
+    provider: str
+    model: str
+    transactions: int = 0  # Transactions covered by the prompt
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0  # Wall time, including queueing for a slot and retries
+    first_chunk_ms: int = 0  # Streamed calls: wall time until the first chunk
+    retries: int = 0
+
+    @property
+    def cost_usd(self) -> float:
+        """Estimated cost from the provider's configured per-token prices."""
+        settings = get_settings()
+        input_price, output_price = {
+            "claude": (
+                settings.claude_input_cost_per_mtok,
+                settings.claude_output_cost_per_mtok,
+            ),
+            "openrouter": (
+                settings.openrouter_input_cost_per_mtok,
+                settings.openrouter_output_cost_per_mtok,
+            ),
+        }.get(self.provider, (0.0, 0.0))
+        return (
+            self.prompt_tokens * input_price + self.completion_tokens * output_price
+        ) / 1_000_000
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "cost_usd": round(self.cost_usd, 6)}
+
+
+def _http_client() -> httpx.Client:
+    """Create the pooled HTTP client for the OpenRouter SDK client."""
+    settings = get_settings()
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_concurrent_calls,
+            max_keepalive_connections=settings.llm_max_concurrent_calls,
+        ),
+        timeout=httpx.Timeout(
+            settings.llm_http_read_timeout,
+            connect=settings.llm_http_connect_timeout,
+        ),
+    )
+
+
+def _get_client(provider: str, api_key: str, create: Callable[[], T]) -> T:
+    key = (provider, api_key)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = create()
+        return _clients[key]
+
+
+def get_anthropic_client(api_key: str):
+    """Get the process-wide Anthropic client for an API key."""
+
+    def create():
+        from anthropic import Anthropic, Timeout
+
+        settings = get_settings()
+        # The SDK's own pooled HTTP client (it rejects foreign httpx clients);
+        # call_llm retries, so backoff never holds a call slot
+        return Anthropic(
+            api_key=api_key,
+            timeout=Timeout(
+                settings.llm_http_read_timeout,
+                connect=settings.llm_http_connect_timeout,
+            ),
+            max_retries=0,
+        )
+
+    return _get_client("anthropic", api_key, create)
+
+
+def get_openrouter_client(api_key: str):
+    """Get the process-wide OpenRouter client for an API key."""
+
+    def create():
+        try:
+            from openrouter import OpenRouter
+        except ImportError:
+            raise ImportError(
+                "openrouter package not installed. Install with: uv add openrouter"
+            )
+
+        return OpenRouter(
+            api_key=api_key,
+            client=_http_client(),
+            timeout_ms=int(get_settings().llm_http_read_timeout * 1000),
+        )
+
+    return _get_client("openrouter", api_key, create)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Get the Retry-After delay (seconds) from a provider error, if any."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers["retry-after"])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def call_llm(
+    call: Callable[[], T], label: str = "LLM", record: LLMCall | None = None
+) -> T:
+    """
+    Make a provider call under the process-wide concurrency limit, with retries.
+
+    Args:
+        call: Performs one provider request (e.g. client.messages.create(...)).
+        label: Name used in log messages.
+        record: Optional LLMCall to fill in with latency and retry count
+            (also on failure).
+
+    Returns:
+        The call's result.
+
+    Raises:
+        LLMBusyError: If no call slot frees up within llm_queue_timeout_seconds.
+        Exception: The provider error, once retries are exhausted or if it is
+            not a rate-limit/overloaded response.
+    """
+    started = time.monotonic()
+    try:
+        return _call_with_retries(call, label, record)
+    finally:
+        if record is not None:
+            record.latency_ms = int((time.monotonic() - started) * 1000)
+
+
+def stream_llm(
+    open_stream: Callable[[], Iterable[T]],
+    label: str = "LLM",
+    record: LLMCall | None = None,
+) -> Iterator[T]:
+    """
+    Stream a provider response under the process-wide concurrency limit.
+
+    The call slot is held until the stream is exhausted or closed. Failures
+    before the first chunk are retried like call_llm(); once chunks have been
+    yielded the error is raised, since the caller may already have used them.
+
+    Args:
+        open_stream: Starts one provider request and returns its chunks.
+        label: Name used in log messages.
+        record: Optional LLMCall to fill in with latency, time to first chunk
+            and retry count (also on failure).
+
+    Yields:
+        The stream's chunks.
+
+    Raises:
+        LLMBusyError: If no call slot frees up within llm_queue_timeout_seconds.
+        Exception: The provider error (see call_llm()).
+    """
+    settings = get_settings()
+    started = time.monotonic()
+    attempt = 0
+
+    try:
+        while True:
+            _acquire_slot(label)
+            streamed = False
+            try:
+                for chunk in open_stream():
+                    if not streamed and record is not None:
+                        record.first_chunk_ms = int((time.monotonic() - started) * 1000)
+                    streamed = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if streamed else _retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                status_code = getattr(e, "status_code", None)
+            finally:
+                _call_slots.release()
+
+            attempt += 1
+            if record is not None:
+                record.retries = attempt
+            logger.warning(
+                f"{label} returned {status_code}, retry "
+                f"{attempt}/{settings.llm_max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+    finally:
+        if record is not None:
+            record.latency_ms = int((time.monotonic() - started) * 1000)
+
+
+def _acquire_slot(label: str) -> None:
+    settings = get_settings()
+    if not _call_slots.acquire(timeout=settings.llm_queue_timeout_seconds):
+        raise LLMBusyError(
+            f"{label}: no LLM call slot free after "
+            f"{settings.llm_queue_timeout_seconds}s "
+            f"({settings.llm_max_concurrent_calls} calls in flight)"
+        )
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying a failed call, or None to give up."""
+    settings = get_settings()
+    if (
+        getattr(error, "status_code", None) not in RETRYABLE_STATUS_CODES
+        or attempt >= settings.llm_max_retries
+    ):
+        return None
+    retry_after = _retry_after(error)
+    if retry_after is not None and retry_after > MAX_RETRY_AFTER_SECONDS:
+        return None
+    backoff = random.uniform(0, settings.llm_retry_backoff_base * 2**attempt)
+    return max(retry_after or 0.0, backoff)
+
+
+def _call_with_retries(call: Callable[[], T], label: str, record: LLMCall | None) -> T:
+    settings = get_settings()
+    attempt = 0
+
+    while True:
+        _acquire_slot(label)
+        try:
+            return call()
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            status_code = getattr(e, "status_code", None)
+        finally:
+            _call_slots.release()
+
+        attempt += 1
+        if record is not None:
+            record.retries = attempt
+        logger.warning(
+            f"{label} returned {status_code}, retry {attempt}/"
+            f"{settings.llm_max_retries} in {delay:.1f}s"
+        )
+        time.sleep(delay)
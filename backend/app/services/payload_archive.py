@@ -0,0 +1,116 @@
+"""Content-addressed archive of raw SimpleFin payloads.
+
+Every GET /accounts body is gzip-compressed to local disk as it streams in,
+keyed by the SHA-256 of the raw bytes, and referenced from
+simplefin_sync_jobs.raw_payloads. Parser changes and bug fixes can then be
+replayed against history without spending a rate-limited SimpleFin fetch.
+
+Layout: <simplefin_archive_dir>/<digest[:2]>/<digest>.json.gz
+
+Payloads hold raw account and transaction data and are not encrypted (only
+owner-readable files), so the archive directory must be protected like the
+database. prune() deletes payloads older than simplefin_archive_retention_days;
+the worker runs it daily.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import get_settings
+
+
+def _archive_root() -> Path:
+    return Path(get_settings().simplefin_archive_dir)
+
+
+def payload_path(digest: str) -> Path:
+    """Get the archive path for a payload digest."""
+    return _archive_root() / digest[:2] / f"{digest}.json.gz"
+
+
+class PayloadArchiveWriter:
+    """
+    Compress and hash a payload chunk by chunk, then store it by digest.
+
+    Chunks go to a temp file in the archive directory; commit() renames it to
+    its content address (identical payloads are stored once) and abort()
+    discards it.
+    """
+
+    def __init__(self):
+        root = _archive_root()
+        root.mkdir(parents=True, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=root, suffix=".partial")
+        self._file = os.fdopen(fd, "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", mtime=0)
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._sha256.update(chunk)
+        self._gzip.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Finish the payload and move it to its content address.
+
+        Returns:
+            Hex SHA-256 digest of the raw (uncompressed) payload.
+        """
+        self._gzip.close()
+        self._file.close()
+        digest = self._sha256.hexdigest()
+        path = payload_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._temp_path, path)
+        return digest
+
+    def abort(self) -> None:
+        """Discard a partially written payload."""
+        self._gzip.close()
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+class PayloadArchiveReader:
+    """Async file-like reader over an archived payload (for ijson)."""
+
+    def __init__(self, digest: str):
+        path = payload_path(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Archived payload {digest} not found at {path}")
+        self._file = gzip.open(path, "rb")
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def prune(retention_days: int) -> int:
+    """
+    Delete archived payloads (and abandoned partial writes) older than the
+    retention period.
+
+    Returns:
+        Number of files deleted.
+    """
+    root = _archive_root()
+    if not root.exists():
+        return 0
+    cutoff = time.time() - retention_days * 86400
+    deleted = 0
+    for path in [*root.glob("*/*.json.gz"), *root.glob("*.partial")]:
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            continue
+    return deleted
@@ -1,21 +1,23 @@
-"""Plaid API service wrapper."""
-
-import plaid
-from plaid.api import plaid_api
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.item_public_token_exchange_request import (
-    ItemPublicTokenExchangeRequest,
-)
-from plaid.model.transactions_sync_request import TransactionsSyncRequest
-from plaid.model.country_code import CountryCode
-from plaid.model.products import Products
+"""Plaid API service wrapper.
+
+The plaid SDK is imported on first use rather than at module load, so
+processes that never call Plaid (the worker, most API requests) don't pay
+for it.
+"""
+
+from typing import TYPE_CHECKING
 
 from app.config import get_settings
 
+if TYPE_CHECKING:
+    from plaid.api import plaid_api
 
-def _get_plaid_client() -> plaid_api.PlaidApi:
+
+def _get_plaid_client() -> "plaid_api.PlaidApi":
     """Create a Plaid API client."""
+    import plaid
+    from plaid.api import plaid_api
+
     settings = get_settings()
 
     env_map = {
@@ -46,6 +48,11 @@ def create_link_token(user_id: str) -> dict:
     Returns:
         Dict with link_token and expiration.
     """
+    from plaid.model.country_code import CountryCode
+    from plaid.model.link_token_create_request import LinkTokenCreateRequest
+    from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
+    from plaid.model.products import Products
+
     client = _get_plaid_client()
 
     request = LinkTokenCreateRequest(
@@ -73,6 +80,10 @@ def exchange_public_token(public_token: str) -> dict:
     Returns:
         Dict with access_token and item_id.
     """
+    from plaid.model.item_public_token_exchange_request import (
+        ItemPublicTokenExchangeRequest,
+    )
+
     client = _get_plaid_client()
 
     request = ItemPublicTokenExchangeRequest(public_token=public_token)
@@ -95,6 +106,8 @@ def sync_transactions(access_token: str, cursor: str | None = None) -> dict:
     Returns:
         Dict with added, modified, removed transactions, new cursor, and has_more flag.
     """
+    from plaid.model.transactions_sync_request import TransactionsSyncRequest
+
     client = _get_plaid_client()
 
     request_kwargs = {"access_token": access_token}
@@ -6,12 +6,136 @@ It uses Basic Auth embedded in the access URL and has a single endpoint for all
 Documentation: https://beta-bridge.simplefin.org/info/developers
 """
 
+import asyncio
 import base64
-from typing import Any
+import hashlib
+import json
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 from urllib.parse import urlparse
 from decimal import Decimal
 
 import httpx
+import ijson
+
+from app.config import get_settings
+from app.logging_config import get_logger
+from app.utils.merchant import normalize_merchant
+
+logger = get_logger("simplefin_service")
+
+# Shared across requests and cron runs so syncs reuse pooled keep-alive
+# connections instead of paying a TLS handshake per call.
+_http_client: httpx.AsyncClient | None = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+# Statuses worth retrying on idempotent requests (bridge blips, throttling)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the process-wide SimpleFin HTTP client, creating it on first use.
+
+    Returns:
+        Pooled httpx.AsyncClient with split connect/read timeouts.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        settings = get_settings()
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.simplefin_http_max_connections,
+                max_keepalive_connections=settings.simplefin_http_max_connections,
+            ),
+            timeout=httpx.Timeout(
+                settings.simplefin_http_read_timeout,
+                connect=settings.simplefin_http_connect_timeout,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    """Get the semaphore capping concurrent requests to the URL's host."""
+    host = urlparse(url).hostname or ""
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(
+            get_settings().simplefin_http_max_connections_per_host
+        )
+    return _host_semaphores[host]
+
+
+@asynccontextmanager
+async def _stream_with_retries(
+    url: str, params: dict[str, Any] | None = None
+) -> AsyncIterator[httpx.Response]:
+    """
+    Open a streamed GET to SimpleFin, retrying transient failures.
+
+    Retries connection errors, timeouts and RETRYABLE_STATUS_CODES using
+    full-jitter exponential backoff, but only until response headers arrive;
+    a stream that breaks mid-body is not retried. Other HTTP errors fail
+    immediately. Holds the host's concurrency slot while the body is read.
+
+    Raises:
+        httpx.HTTPError: If the request still fails after all retries.
+    """
+    settings = get_settings()
+    client = get_http_client()
+    attempt = 0
+
+    while True:
+        async with _host_semaphore(url):
+            try:
+                response = await client.send(
+                    client.build_request("GET", url, params=params), stream=True
+                )
+            except httpx.TransportError as e:
+                error: httpx.HTTPError = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    try:
+                        response.raise_for_status()
+                        yield response
+                    finally:
+                        await response.aclose()
+                    return
+                await response.aclose()
+                error = httpx.HTTPStatusError(
+                    f"SimpleFin returned {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+
+        if attempt >= settings.simplefin_http_max_retries:
+            raise error
+
+        delay = random.uniform(0, settings.simplefin_http_backoff_base * 2**attempt)
+        attempt += 1
+        logger.warning(
+            f"SimpleFin GET failed ({error!r}), retry {attempt}/"
+            f"{settings.simplefin_http_max_retries} in {delay:.1f}s"
+        )
+        await asyncio.sleep(delay)
+
+
+async def _get_with_retries(
+    url: str, params: dict[str, Any] | None = None
+) -> httpx.Response:
+    """GET a SimpleFin URL with retries and read the whole body."""
+    async with _stream_with_retries(url, params) as response:
+        await response.aread()
+    return response
 
 
 def decode_setup_token(setup_token: str) -> str:
@@ -27,12 +151,13 @@ def decode_setup_token(setup_token: str) -> str:
     return base64.b64decode(setup_token).decode("utf-8")
 
 
-def claim_access_url(setup_token: str) -> str:
+async def claim_access_url(setup_token: str) -> str:
     """
     Exchange a SimpleFin setup token for an access URL.
 
     This can only be done once per setup token. The access URL contains
-    the credentials needed for all subsequent API calls.
+    the credentials needed for all subsequent API calls. Not retried, since
+    the claim POST is not idempotent.
 
     Args:
         setup_token: Base64-encoded setup token from SimpleFin.
@@ -47,19 +172,19 @@ def claim_access_url(setup_token: str) -> str:
 
     # POST to the claim URL to get the access URL
     # SimpleFin requires Content-Length: 0 for empty POST
-    with httpx.Client() as client:
-        response = client.post(claim_url, headers={"Content-Length": "0"}, timeout=30)
-        response.raise_for_status()
+    response = await get_http_client().post(claim_url, headers={"Content-Length": "0"})
+    response.raise_for_status()
 
     # The response body is the access URL
     access_url = response.text.strip()
     return access_url
 
 
-def fetch_accounts(
+async def fetch_accounts(
     access_url: str,
     start_date: int | None = None,
     end_date: int | None = None,
+    balances_only: bool = False,
 ) -> dict[str, Any]:
     """
     Fetch all accounts and transactions from SimpleFin.
@@ -71,6 +196,8 @@ def fetch_accounts(
                    Example: 1704067200 for 2024-01-01.
                    Default: SimpleFin returns recent transactions only.
         end_date: Optional end date for transactions (Unix timestamp in seconds since epoch).
+        balances_only: If True, SimpleFin omits transactions and returns only
+                      account balances (much smaller and faster).
 
     Returns:
         Dict containing:
@@ -78,22 +205,140 @@ def fetch_accounts(
             - errors: List of error messages (if any)
 
     Raises:
-        httpx.HTTPError: If the API request fails.
+        httpx.HTTPError: If the API request fails after retries.
     """
     # SimpleFin access URL has credentials embedded
     # Just append /accounts and httpx handles Basic Auth automatically
+    params = _accounts_params(start_date, end_date, balances_only)
+
+    response = await _get_with_retries(f"{access_url}/accounts", params=params)
+
+    data = response.json()
+    return data
+
+
+def _accounts_params(
+    start_date: int | None, end_date: int | None, balances_only: bool = False
+) -> dict[str, Any]:
+    """Build the query parameters for GET /accounts."""
     params = {}
     if start_date:
         params["start-date"] = start_date
     if end_date:
         params["end-date"] = end_date
+    if balances_only:
+        params["balances-only"] = 1
+    return params
 
-    with httpx.Client() as client:
-        response = client.get(f"{access_url}/accounts", params=params, timeout=30)
-        response.raise_for_status()
 
-    data = response.json()
-    return data
+class _ResponseReader:
+    """Async file-like adapter so ijson can pull from an httpx byte stream."""
+
+    def __init__(self, response: httpx.Response, archive: Any = None):
+        self._chunks = response.aiter_bytes()
+        self._archive = archive
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) to detect bytes vs str
+        if size == 0:
+            return b""
+        try:
+            chunk = await anext(self._chunks)
+        except StopAsyncIteration:
+            return b""
+        if self._archive is not None:
+            self._archive.write(chunk)
+        return chunk
+
+
+# Per-account subtrees the streaming parser never materializes on the account
+_STREAMED_ACCOUNT_KEYS = {"transactions", "holdings"}
+
+
+async def stream_accounts(
+    access_url: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    archive: Any = None,
+) -> AsyncIterator[tuple]:
+    """
+    Stream accounts and transactions from SimpleFin without loading the payload.
+
+    Args:
+        access_url: The SimpleFin access URL (contains embedded credentials).
+        start_date: Optional start date for transactions (Unix timestamp).
+        end_date: Optional end date for transactions (Unix timestamp).
+        archive: Optional writer (e.g. PayloadArchiveWriter) that receives
+                 every raw body chunk as it is read.
+
+    Yields:
+        Events from iter_account_events().
+
+    Raises:
+        httpx.HTTPError: If the API request fails after retries.
+    """
+    params = _accounts_params(start_date, end_date)
+
+    async with _stream_with_retries(f"{access_url}/accounts", params) as response:
+        async for event in iter_account_events(_ResponseReader(response, archive)):
+            yield event
+
+
+async def iter_account_events(reader: Any) -> AsyncIterator[tuple]:
+    """
+    Incrementally decode a SimpleFin /accounts payload into events.
+
+    Memory stays bounded by one transaction plus each account's scalar fields
+    rather than the whole payload. Events:
+
+    - ("error", message): an entry of the top-level errors list.
+    - ("transactions_start", account): an account's transactions array is
+      starting; account holds the raw fields seen so far (normally id, name,
+      currency, balance and org, which SimpleFin sends first).
+    - ("transaction", raw_transaction): one raw transaction of that account.
+    - ("account", account): the account's complete raw fields (without
+      transactions or holdings).
+
+    Args:
+        reader: Async file-like object with read(size) returning bytes (an
+                HTTP response stream or an archived payload).
+    """
+    account = None
+    transaction = None
+    skip_key = False
+
+    async for prefix, event, value in ijson.parse_async(reader, use_float=False):
+        if prefix == "errors.item":
+            yield ("error", value)
+
+        elif prefix.startswith("accounts.item.transactions"):
+            if prefix == "accounts.item.transactions":
+                if event == "start_array":
+                    yield ("transactions_start", dict(account.value))
+                continue
+            if prefix == "accounts.item.transactions.item" and event == "start_map":
+                transaction = ijson.ObjectBuilder()
+            transaction.event(event, value)
+            if prefix == "accounts.item.transactions.item" and event == "end_map":
+                yield ("transaction", transaction.value)
+                transaction = None
+
+        elif prefix == "accounts.item" and event in ("start_map", "end_map"):
+            if event == "start_map":
+                account = ijson.ObjectBuilder()
+                account.event(event, value)
+            else:
+                account.event(event, value)
+                yield ("account", account.value)
+                account = None
+
+        elif prefix == "accounts.item" and event == "map_key":
+            skip_key = value in _STREAMED_ACCOUNT_KEYS
+            if not skip_key:
+                account.event(event, value)
+
+        elif prefix.startswith("accounts.item.") and not skip_key:
+            account.event(event, value)
 
 
 def parse_simplefin_accounts(
@@ -135,6 +380,39 @@ def parse_simplefin_accounts(
     return accounts
 
 
+# Fields SimpleFin controls; categorization and our own columns are excluded so
+# user edits never make a transaction look "changed" upstream.
+TRANSACTION_HASH_FIELDS = (
+    "simplefin_account_id",
+    "amount",
+    "currency",
+    "posted_date",
+    "transaction_date",
+    "description",
+    "payee",
+    "memo",
+    "pending",
+)
+
+
+def compute_transaction_hash(transaction: dict[str, Any]) -> str:
+    """
+    Compute a stable content hash for a parsed transaction.
+
+    Args:
+        transaction: Transaction dict from parse_simplefin_transaction().
+
+    Returns:
+        Hex SHA-256 digest of the SimpleFin-sourced fields.
+    """
+    payload = json.dumps(
+        [transaction.get(field) for field in TRANSACTION_HASH_FIELDS],
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def parse_simplefin_transactions(
     accounts_data: dict[str, Any],
     account_id_map: dict[str, str],
@@ -165,26 +443,73 @@ def parse_simplefin_transactions(
         account_currency = account.get("currency", "USD")
 
         for txn in account.get("transactions", []):
-            # SimpleFin provides clean merchant names in 'payee' field
-            # Amount is already signed (negative = expense, positive = income)
-            transaction = {
-                "user_id": user_id,
-                "simplefin_account_id": our_account_id,
-                "simplefin_transaction_id": txn.get("id"),
-                "amount": float(Decimal(txn.get("amount", "0"))),
-                "currency": account_currency,
-                "posted_date": txn.get("posted"),
-                "transaction_date": txn.get("transacted_at"),
-                "description": txn.get("description", ""),
-                "payee": txn.get("payee") or None,  # Convert empty string to None
-                "memo": txn.get("memo") or None,  # Convert empty string to None
-                "pending": False,  # SimpleFin only returns posted transactions
-            }
-            transactions.append(transaction)
+            transactions.append(
+                parse_simplefin_transaction(
+                    txn, our_account_id, user_id, account_currency
+                )
+            )
 
     return transactions
 
 
+def parse_simplefin_transaction(
+    txn: dict[str, Any],
+    account_id: str,
+    user_id: str,
+    currency: str = "USD",
+) -> dict[str, Any]:
+    """
+    Parse a single raw SimpleFin transaction into our transaction format.
+
+    Args:
+        txn: Raw transaction object from SimpleFin.
+        account_id: Our internal account UUID.
+        user_id: User UUID who owns the transaction.
+        currency: The account's currency.
+
+    Returns:
+        Transaction dict (with content_hash) ready for database insertion.
+    """
+    # SimpleFin provides clean merchant names in 'payee' field
+    # Amount is already signed (negative = expense, positive = income)
+    transaction = {
+        "user_id": user_id,
+        "simplefin_account_id": account_id,
+        "simplefin_transaction_id": txn.get("id"),
+        "amount": float(Decimal(txn.get("amount", "0"))),
+        "currency": currency,
+        "posted_date": txn.get("posted"),
+        "transaction_date": txn.get("transacted_at"),
+        "description": txn.get("description", ""),
+        "payee": txn.get("payee") or None,  # Convert empty string to None
+        "memo": txn.get("memo") or None,  # Convert empty string to None
+        "pending": False,  # SimpleFin only returns posted transactions
+    }
+    # Derived from payee/description, so it is not part of the content hash
+    transaction["merchant_key"] = normalize_merchant(
+        transaction["payee"], transaction["description"]
+    )
+    transaction["content_hash"] = compute_transaction_hash(transaction)
+    return transaction
+
+
+def describe_failed_chunks(label: str, failed_chunks: list[dict]) -> list[str]:
+    """
+    Turn bulk upsert chunk failures into human-readable sync error messages.
+
+    Args:
+        label: What was being written (e.g. "transactions").
+        failed_chunks: The "failed_chunks" list from Database.bulk_upsert().
+
+    Returns:
+        One message per failed chunk.
+    """
+    return [
+        f"Failed to write {chunk['rows']} {label} (chunk {chunk['chunk']}): {chunk['error']}"
+        for chunk in failed_chunks
+    ]
+
+
 def validate_access_url(access_url: str) -> bool:
     """
     Validate that an access URL is properly formatted.
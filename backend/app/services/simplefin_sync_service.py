@@ -0,0 +1,1387 @@
+"""SimpleFin sync service - orchestrates fetching and storing SimpleFin data.
+
+Shared by the on-demand sync endpoint and the scheduled cron job.
+"""
+
+import asyncio
+import time
+import uuid
+from contextlib import aclosing
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+import httpx
+
+from app.config import get_settings
+from app.database import Database
+from app.logging_config import get_logger
+from app.services import job_queue, simplefin_service, sync_scheduler
+from app.services.circuit_breaker import (
+    CircuitOpenError,
+    institution_breaker,
+    institution_key,
+)
+from app.services.payload_archive import PayloadArchiveReader, PayloadArchiveWriter
+from app.services.snapshot_service import SnapshotService
+from app.utils.encryption import decrypt_token
+
+logger = get_logger("simplefin_sync")
+
+
+def incremental_start_date(
+    item: dict, default_lookback_days: int | None = None
+) -> int | None:
+    """
+    Compute the SimpleFin start-date for an incremental sync of an item.
+
+    Uses the item's high-water mark (latest posted date seen) minus the
+    configured overlap, so late-posting transactions are still picked up.
+
+    Args:
+        item: The simplefin_items row.
+        default_lookback_days: Window to use when the item has no high-water
+            mark yet. None lets SimpleFin apply its own default.
+
+    Returns:
+        Unix timestamp, or None to use SimpleFin's default window.
+    """
+    settings = get_settings()
+    last_posted = item.get("last_posted_date")
+    if last_posted:
+        overlap = settings.simplefin_sync_overlap_days * 86400
+        return max(0, int(last_posted) - overlap)
+    if default_lookback_days:
+        return int((datetime.now() - timedelta(days=default_lookback_days)).timestamp())
+    return None
+
+
+def _admit_institutions(db: Database, item: dict) -> list[str]:
+    """
+    Check the circuit breaker for every institution behind an item.
+
+    Items with no stored accounts yet (first sync) are always admitted.
+
+    Returns:
+        Institution keys whose circuits admit this fetch.
+
+    Raises:
+        CircuitOpenError: If every institution behind the item is open.
+    """
+    institutions = sorted(
+        {
+            key
+            for key in map(
+                institution_key, db.get_simplefin_accounts_by_item(item["id"])
+            )
+            if key
+        }
+    )
+    admitted = [key for key in institutions if institution_breaker.allow(key)]
+    if institutions and not admitted:
+        states = institution_breaker.states(institutions)
+        retry_at = min(state["retry_at"] or 0 for state in states.values())
+        raise CircuitOpenError(institutions, retry_at)
+    return admitted
+
+
+def _record_fetch_failure(institutions: list[str], error: httpx.HTTPError) -> None:
+    """Count transport errors and 5xx responses against every institution."""
+    is_outage = isinstance(error, httpx.TransportError) or (
+        isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+    )
+    if is_outage:
+        for key in institutions:
+            institution_breaker.record_failure(key)
+
+
+def _record_fetch_outcome(
+    institutions: list[str], accounts: list[dict], errors: list[str]
+) -> None:
+    """
+    Record a successful fetch per institution.
+
+    An institution missing from the payload while SimpleFin reports errors
+    counts as a failure; the rest close.
+    """
+    returned = {
+        institution_key(
+            {
+                "organization_domain": account.get("org", {}).get("domain"),
+                "organization_sfin_url": account.get("org", {}).get("sfin-url"),
+            }
+        )
+        for account in accounts
+    }
+    for key in institutions:
+        if key in returned or not errors:
+            institution_breaker.record_success(key)
+        else:
+            institution_breaker.record_failure(key)
+
+
+async def _fetch_accounts_with_breaker(
+    institutions: list[str], access_url: str, **kwargs
+) -> dict:
+    """Fetch accounts from SimpleFin and record the outcome per institution."""
+    try:
+        accounts_data = await simplefin_service.fetch_accounts(access_url, **kwargs)
+    except httpx.HTTPError as e:
+        await asyncio.to_thread(_record_fetch_failure, institutions, e)
+        raise
+
+    await asyncio.to_thread(
+        _record_fetch_outcome,
+        institutions,
+        accounts_data.get("accounts", []),
+        accounts_data.get("errors", []),
+    )
+    return accounts_data
+
+
+def _classify_transactions(
+    transactions: list[dict], existing_hashes: dict[str, str | None]
+) -> tuple[list[dict], list[dict], int]:
+    """
+    Split parsed transactions by comparing content hashes with stored rows.
+
+    Args:
+        transactions: Parsed transactions (each with a content_hash).
+        existing_hashes: {simplefin_transaction_id: content_hash} already stored.
+
+    Returns:
+        (new, changed, unchanged_count)
+    """
+    new = []
+    changed = []
+    unchanged = 0
+
+    for txn in transactions:
+        txn_id = txn["simplefin_transaction_id"]
+        if txn_id not in existing_hashes:
+            new.append(txn)
+        elif existing_hashes[txn_id] != txn["content_hash"]:
+            changed.append(txn)
+        else:
+            unchanged += 1
+
+    return new, changed, unchanged
+
+
+def _write_transaction_batch(
+    db: Database, user_id: str, batch: list[dict], skip_unchanged: bool = True
+) -> dict:
+    """
+    Upsert one batch of parsed transactions, skipping unchanged rows.
+
+    Looks up stored content hashes for just this batch's IDs and only sends
+    rows that are new or whose content changed. With skip_unchanged=False
+    every stored row is rewritten as well: the hash leaves out derived fields
+    (merchant_key), so a replay after a parser fix must not skip them.
+
+    Returns:
+        Dict with added, updated, unchanged and failed_chunks.
+    """
+    existing_hashes = db.get_simplefin_transaction_hashes(
+        user_id, [txn["simplefin_transaction_id"] for txn in batch]
+    )
+    new, changed, unchanged_count = _classify_transactions(batch, existing_hashes)
+    if not skip_unchanged:
+        changed = [
+            txn for txn in batch if txn["simplefin_transaction_id"] in existing_hashes
+        ]
+        unchanged_count = 0
+    result = db.upsert_simplefin_transactions(new + changed)
+
+    # Attribute failed chunks back to added/updated counts
+    written_ids = {txn["simplefin_transaction_id"] for txn in result["rows"]}
+    return {
+        "added": sum(
+            1 for txn in new if txn["simplefin_transaction_id"] in written_ids
+        ),
+        "updated": sum(
+            1 for txn in changed if txn["simplefin_transaction_id"] in written_ids
+        ),
+        "unchanged": unchanged_count,
+        "failed_chunks": result["failed_chunks"],
+    }
+
+
+class SyncProgress:
+    """
+    Live progress counters for a sync job, saved to its row as work lands.
+
+    Saves are throttled to one per second so progress reporting does not add
+    a round trip per batch on large syncs, and run in a thread so they never
+    block the event loop (which also heartbeats job and worker leases).
+    """
+
+    SAVE_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, db: Database, sync_job: dict):
+        self._db = db
+        self._job_id = sync_job["id"]
+        # Resumed backfills keep counting from their checkpoint
+        self.accounts_processed = sync_job.get("accounts_processed") or 0
+        self.rows_written = sync_job.get("rows_written") or 0
+        self.bytes_fetched = sync_job.get("bytes_fetched") or 0
+        self._last_saved = 0.0
+
+    def fields(self) -> dict:
+        """Get the progress columns for a simplefin_sync_jobs update."""
+        return {
+            "accounts_processed": self.accounts_processed,
+            "rows_written": self.rows_written,
+            "bytes_fetched": self.bytes_fetched,
+            "progress_updated_at": "now()",
+        }
+
+    async def maybe_save(self) -> None:
+        """Save the counters if the last save is older than the interval."""
+        now = time.monotonic()
+        if now - self._last_saved >= self.SAVE_INTERVAL_SECONDS:
+            self._last_saved = now
+            await asyncio.to_thread(
+                self._db.update_simplefin_sync_job, self._job_id, self.fields()
+            )
+
+    def chunk_writer(self, archive: PayloadArchiveWriter | None) -> "_ChunkCounter":
+        """Wrap the payload archive so fetched bytes are counted as they stream."""
+        return _ChunkCounter(self, archive)
+
+
+class _ChunkCounter:
+    """Stream chunk writer that counts bytes, then forwards to the archive."""
+
+    def __init__(self, progress: SyncProgress, archive: PayloadArchiveWriter | None):
+        self._progress = progress
+        self._archive = archive
+
+    def write(self, chunk: bytes) -> None:
+        self._progress.bytes_fetched += len(chunk)
+        if self._archive is not None:
+            self._archive.write(chunk)
+
+
+async def _store_account_events(
+    db: Database,
+    item: dict,
+    events: AsyncIterator[tuple],
+    progress: SyncProgress | None = None,
+    snapshot_balances: bool = True,
+    update_accounts: bool = True,
+    skip_unchanged: bool = True,
+) -> dict:
+    """
+    Write a stream of SimpleFin account events into batched upserts.
+
+    Transactions are parsed as they are decoded and written every
+    simplefin_stream_batch_size rows, so peak memory is bounded by the batch
+    size instead of the payload. An account is upserted when its transactions
+    start (to resolve its UUID) and again with its final fields at the end,
+    followed by today's balance snapshots from the upserted rows.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row.
+        events: Events from simplefin_service.iter_account_events().
+        progress: Optional job progress to advance as accounts and batches
+            are written.
+        snapshot_balances: Write today's account_balance_history rows. Off
+            when the balances are not current (backfill windows, replays).
+        update_accounts: Upsert the payload's accounts (balances included)
+            at the end. Off for replays, whose balances are out of date;
+            accounts missing from the database are still created.
+        skip_unchanged: Skip transactions whose content hash matches the
+            stored row. Off for replays, so derived fields are rewritten.
+
+    Returns:
+        Dict with accounts (raw fields), accounts_synced, snapshots_written,
+        transactions_added, transactions_updated, transactions_unchanged,
+        provider_errors,
+        write_errors and latest_posted_date (None if there were no
+        transactions or any transaction chunk failed).
+    """
+    batch_size = get_settings().simplefin_stream_batch_size
+    user_id = item["user_id"]
+
+    # Supabase calls are blocking; run them in threads so the worker's event
+    # loop keeps heartbeating job and worker leases during long syncs
+    account_id_map = {
+        acc["simplefin_account_id"]: acc["id"]
+        for acc in await asyncio.to_thread(
+            db.get_simplefin_accounts_by_item, item["id"]
+        )
+    }
+    accounts = []
+    provider_errors = []
+    totals = {"added": 0, "updated": 0, "unchanged": 0}
+    failed_chunks = []
+    latest_posted_date = None
+
+    batch = []
+    # Raw transactions of an account whose id arrives after its transactions
+    unmapped = []
+    current_account_id = None
+    current_currency = "USD"
+
+    async def resolve_account_id(account: dict) -> str | None:
+        simplefin_account_id = account.get("id")
+        if simplefin_account_id and simplefin_account_id not in account_id_map:
+            result = await asyncio.to_thread(
+                db.upsert_simplefin_accounts,
+                simplefin_service.parse_simplefin_accounts(
+                    {"accounts": [account]}, item["id"], user_id
+                ),
+            )
+            for row in result["rows"]:
+                account_id_map[row["simplefin_account_id"]] = row["id"]
+        return account_id_map.get(simplefin_account_id)
+
+    async def flush() -> None:
+        nonlocal batch
+        if not batch:
+            return
+        written, batch = batch, []
+        result = await asyncio.to_thread(
+            _write_transaction_batch, db, user_id, written, skip_unchanged
+        )
+        for key in totals:
+            totals[key] += result[key]
+        failed_chunks.extend(result["failed_chunks"])
+        if progress:
+            progress.rows_written += result["added"] + result["updated"]
+            await progress.maybe_save()
+
+    def add_transaction(raw: dict) -> None:
+        nonlocal latest_posted_date
+        transaction = simplefin_service.parse_simplefin_transaction(
+            raw, current_account_id, user_id, current_currency
+        )
+        batch.append(transaction)
+        if transaction["posted_date"]:
+            latest_posted_date = max(
+                latest_posted_date or 0, transaction["posted_date"]
+            )
+
+    async for event, payload in events:
+        if event == "error":
+            provider_errors.append(payload)
+
+        elif event == "transactions_start":
+            current_account_id = await resolve_account_id(payload)
+            current_currency = payload.get("currency", "USD")
+
+        elif event == "transaction":
+            if current_account_id:
+                add_transaction(payload)
+                if len(batch) >= batch_size:
+                    await flush()
+            else:
+                unmapped.append(payload)
+
+        elif event == "account":
+            accounts.append(payload)
+            if progress:
+                progress.accounts_processed += 1
+                await progress.maybe_save()
+            if unmapped:
+                current_account_id = await resolve_account_id(payload)
+                current_currency = payload.get("currency", "USD")
+                if current_account_id:
+                    for raw in unmapped:
+                        add_transaction(raw)
+                        if len(batch) >= batch_size:
+                            await flush()
+                unmapped = []
+            current_account_id = None
+
+    await flush()
+
+    # Final account upsert with complete fields (balances and org info)
+    account_result = {"rows": [], "failed_chunks": []}
+    if update_accounts:
+        account_result = await asyncio.to_thread(
+            db.upsert_simplefin_accounts,
+            simplefin_service.parse_simplefin_accounts(
+                {"accounts": accounts}, item["id"], user_id
+            ),
+        )
+    snapshot_result = {"rows": [], "failed_chunks": []}
+    if snapshot_balances:
+        snapshot_result = await SnapshotService(db).store_account_snapshots(
+            account_result["rows"]
+        )
+
+    return {
+        "accounts": accounts,
+        "accounts_synced": (
+            len(account_result["rows"])
+            if update_accounts
+            else sum(1 for acc in accounts if acc.get("id") in account_id_map)
+        ),
+        "snapshots_written": len(snapshot_result["rows"]),
+        "transactions_added": totals["added"],
+        "transactions_updated": totals["updated"],
+        "transactions_unchanged": totals["unchanged"],
+        "provider_errors": provider_errors,
+        "write_errors": simplefin_service.describe_failed_chunks(
+            "accounts", account_result["failed_chunks"]
+        )
+        + simplefin_service.describe_failed_chunks(
+            "balance snapshots", snapshot_result["failed_chunks"]
+        )
+        + simplefin_service.describe_failed_chunks("transactions", failed_chunks),
+        # Only report a high-water mark when every transaction was written,
+        # otherwise the failed rows would fall outside the next window.
+        "latest_posted_date": None if failed_chunks else latest_posted_date,
+    }
+
+
+async def _stream_and_store(
+    db: Database,
+    item: dict,
+    institutions: list[str],
+    access_url: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    progress: SyncProgress | None = None,
+    snapshot_balances: bool = True,
+) -> dict:
+    """
+    Stream one SimpleFin fetch straight into batched upserts.
+
+    Takes the request from the item's daily quota, archives the raw body
+    (when enabled) as it streams, advances the job's progress (when given)
+    and records the fetch outcome on the institution circuit breaker.
+
+    Returns:
+        _store_account_events() result plus raw_payload (archive digest, or
+        None when archiving is disabled).
+
+    Raises:
+        QuotaExhaustedError: If the item has no SimpleFin requests left today
+            (nothing is fetched).
+    """
+    await asyncio.to_thread(sync_scheduler.reserve_request, db, item)
+    archive = (
+        PayloadArchiveWriter() if get_settings().simplefin_archive_enabled else None
+    )
+    writer = progress.chunk_writer(archive) if progress else archive
+    try:
+        async with aclosing(
+            simplefin_service.stream_accounts(
+                access_url, start_date=start_date, end_date=end_date, archive=writer
+            )
+        ) as events:
+            stored = await _store_account_events(
+                db, item, events, progress, snapshot_balances
+            )
+    except Exception as e:
+        if archive:
+            archive.abort()
+        if isinstance(e, httpx.HTTPError):
+            await asyncio.to_thread(_record_fetch_failure, institutions, e)
+        raise
+
+    stored["raw_payload"] = archive.commit() if archive else None
+    await asyncio.to_thread(
+        _record_fetch_outcome,
+        institutions,
+        stored["accounts"],
+        stored["provider_errors"],
+    )
+    return stored
+
+
+def _mark_item_synced(
+    db: Database,
+    item: dict,
+    latest_posted_date: int | None,
+    snapshotted: bool = False,
+) -> None:
+    """
+    Stamp last_synced_at and advance (never rewind) the high-water mark.
+
+    When the sync wrote today's balance snapshots, also stamps
+    last_snapshot_date so the daily snapshot cron can skip the item.
+    """
+    item_update = {"last_synced_at": "now()"}
+    if snapshotted:
+        item_update["last_snapshot_date"] = sync_scheduler.utc_today().isoformat()
+    if latest_posted_date and latest_posted_date > (item.get("last_posted_date") or 0):
+        item_update["last_posted_date"] = latest_posted_date
+    db.update_simplefin_item(item["id"], item_update)
+
+
+class SyncInProgressError(Exception):
+    """Raised when another sync of the item is still running after waiting."""
+
+    def __init__(self, sync_job_id: str):
+        self.sync_job_id = sync_job_id
+        super().__init__(f"Sync job {sync_job_id} is still running for this item")
+
+
+# In-process single flight: concurrent calls for an item share one task
+_inflight_syncs: dict[str, asyncio.Task] = {}
+
+
+def _job_result(job: dict) -> dict:
+    """Build a sync_item() result from a finished simplefin_sync_jobs row."""
+    return {
+        "sync_job_id": job["id"],
+        "accounts_synced": job.get("accounts_synced") or 0,
+        "transactions_added": job.get("transactions_added") or 0,
+        "transactions_updated": job.get("transactions_updated") or 0,
+        "transactions_unchanged": job.get("transactions_unchanged") or 0,
+        "errors": [job["error_message"]] if job.get("error_message") else [],
+    }
+
+
+async def _await_sync_job(db: Database, job_id: str) -> dict:
+    """
+    Wait for a sync job held by another process and return its result.
+
+    Raises:
+        SyncInProgressError: If the job is still running after
+            simplefin_sync_attach_timeout_seconds.
+        RuntimeError: If the job failed.
+    """
+    settings = get_settings()
+    deadline = asyncio.get_running_loop().time() + (
+        settings.simplefin_sync_attach_timeout_seconds
+    )
+    while True:
+        job = await asyncio.to_thread(db.get_simplefin_sync_job_by_id, job_id)
+        if job and job["status"] == "completed":
+            return _job_result(job)
+        if job and job["status"] == "failed":
+            raise RuntimeError(f"Sync job {job_id} failed: {job.get('error_message')}")
+        if asyncio.get_running_loop().time() >= deadline:
+            raise SyncInProgressError(job_id)
+        await asyncio.sleep(1)
+
+
+async def sync_item(
+    db: Database,
+    item: dict,
+    start_date: int | None = None,
+    default_lookback_days: int | None = None,
+) -> dict:
+    """
+    Sync an item once, even if several callers ask at the same time.
+
+    Concurrent calls in this process share a single in-flight sync. Across
+    processes, a lease in simplefin_item_sync_state (expiring after
+    simplefin_sync_lease_seconds unless the running sync renews it) admits
+    one sync; other callers attach to the lease holder's job and return its
+    result instead of fetching and upserting again. Attached callers get the
+    in-flight sync's result even if they asked for a different start_date.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row (with encrypted access_url).
+        start_date: Optional explicit start date (Unix timestamp).
+        default_lookback_days: Window for items without a high-water mark.
+
+    Returns:
+        Dict with sync_job_id, accounts_synced, transactions_added,
+        transactions_updated, transactions_unchanged and errors.
+
+    Raises:
+        CircuitOpenError: If every institution behind the item is failing.
+        QuotaExhaustedError: If the item has no SimpleFin requests left today.
+        SyncInProgressError: If another process's sync is still running
+            after the attach timeout.
+    """
+    item_id = item["id"]
+    task = _inflight_syncs.get(item_id)
+    if task is None:
+        task = asyncio.ensure_future(
+            _sync_item_with_lease(db, item, start_date, default_lookback_days)
+        )
+        _inflight_syncs[item_id] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if _inflight_syncs.get(item_id) is done:
+                del _inflight_syncs[item_id]
+
+        task.add_done_callback(forget)
+    return await asyncio.shield(task)
+
+
+async def _sync_item_with_lease(
+    db: Database,
+    item: dict,
+    start_date: int | None,
+    default_lookback_days: int | None,
+) -> dict:
+    """Take the item's sync lease and run the sync, or attach to the holder."""
+    institutions = await asyncio.to_thread(_admit_institutions, db, item)
+
+    job_id = str(uuid.uuid4())
+    holder = await asyncio.to_thread(
+        db.acquire_simplefin_sync_lease,
+        item["id"],
+        job_id,
+        get_settings().simplefin_sync_lease_seconds,
+    )
+    if holder != job_id:
+        return await _await_sync_job(db, holder)
+
+    try:
+        sync_job = await asyncio.to_thread(_create_sync_job, db, item, job_id)
+        return await _run_sync(
+            db, item, institutions, sync_job, start_date, default_lookback_days
+        )
+    finally:
+        await asyncio.to_thread(db.release_simplefin_sync_lease, item["id"], job_id)
+
+
+async def enqueue_sync_job(
+    db: Database,
+    item: dict,
+    start_date: int | None = None,
+    default_lookback_days: int | None = None,
+    resume_backfill: bool = False,
+) -> dict:
+    """
+    Queue a sync for the background worker and return its job without waiting.
+
+    Takes the item's sync lease for the new job (so duplicate requests attach
+    to it), creates a 'pending' simplefin_sync_jobs row and adds a
+    'simplefin_sync' job to the durable job queue; a worker (python -m
+    app.worker) runs it with run_queued_sync_job(). The caller's latency does
+    not depend on the size of the sync. Poll the sync job row for progress
+    (accounts_processed, rows_written, bytes_fetched) and the final status.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row.
+        start_date: Optional explicit start date (Unix timestamp).
+        default_lookback_days: Lookback for an item that has never synced.
+        resume_backfill: Also continue the item's interrupted historical
+            backfill, if any, after the sync.
+
+    Returns:
+        The created simplefin_sync_jobs row (status 'pending').
+
+    Raises:
+        CircuitOpenError: If every institution behind the item is failing.
+        SyncInProgressError: If another sync or backfill holds the item.
+    """
+    await asyncio.to_thread(_admit_institutions, db, item)
+
+    return await asyncio.to_thread(
+        _queue_sync_job,
+        db,
+        item,
+        str(uuid.uuid4()),
+        {"start_date": start_date},
+        {
+            "default_lookback_days": default_lookback_days,
+            "resume_backfill": resume_backfill,
+        },
+    )
+
+
+def _queue_sync_job(
+    db: Database,
+    item: dict,
+    job_id: str,
+    new_job: dict | None,
+    payload: dict | None = None,
+) -> dict:
+    """
+    Take the item's lease for a sync job, mark the job 'pending' and queue it.
+
+    Blocking (several round trips); call through asyncio.to_thread.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row.
+        job_id: The simplefin_sync_jobs row to queue.
+        new_job: Columns for a new row, or None to reopen the existing row.
+        payload: Extra 'simplefin_sync' job arguments.
+
+    Returns:
+        The simplefin_sync_jobs row (status 'pending').
+
+    Raises:
+        SyncInProgressError: If another sync or backfill holds the item.
+    """
+    holder = db.acquire_simplefin_sync_lease(
+        item["id"], job_id, get_settings().simplefin_sync_lease_seconds
+    )
+    if holder != job_id:
+        raise SyncInProgressError(holder)
+
+    try:
+        if new_job is None:
+            sync_job = db.update_simplefin_sync_job(
+                job_id,
+                {"status": "pending", "error_message": None, "completed_at": None},
+            )
+        else:
+            sync_job = db.create_simplefin_sync_job(
+                {
+                    "id": job_id,
+                    "user_id": item["user_id"],
+                    "simplefin_item_id": item["id"],
+                    "status": "pending",
+                    **new_job,
+                }
+            )
+        job_queue.enqueue(
+            "simplefin_sync",
+            {"sync_job_id": job_id, **(payload or {})},
+            # No dedupe_key: the item lease taken above is the single-flight
+            # guard, and deduping could attach this sync job to an older queue
+            # job that never runs it, leaving it 'pending' under the lease
+            user_id=item["user_id"],
+        )
+        return sync_job
+    except Exception as e:
+        _fail_sync_job(db, job_id, str(e))
+        db.release_simplefin_sync_lease(item["id"], job_id)
+        raise
+
+
+async def run_queued_sync_job(
+    db: Database,
+    sync_job_id: str,
+    default_lookback_days: int | None = None,
+) -> dict | None:
+    """
+    Run a sync queued by enqueue_sync_job() or enqueue_backfill_job() (worker side).
+
+    Safe to run again for the same job: a retry or a job reclaimed from a
+    crashed worker restarts the sync (transactions are upserted) or resumes
+    the backfill from its checkpoint, and a job that already completed is
+    skipped.
+
+    Args:
+        db: Database instance (service role).
+        sync_job_id: The simplefin_sync_jobs row to run.
+        default_lookback_days: Lookback for an item that has never synced.
+
+    Returns:
+        The sync_item() result (for a backfill, the windowed backfill
+        result), or None if the job already completed.
+
+    Raises:
+        SyncInProgressError: If another sync took over the item's lease.
+        Whatever failed the sync; the sync job is already marked failed.
+    """
+    started = await asyncio.to_thread(_start_queued_sync_job, db, sync_job_id)
+    if started is None:
+        return None
+    sync_job, item, institutions = started
+
+    try:
+        if sync_job.get("job_type") == "backfill":
+            return await _run_backfill(db, item, institutions, sync_job)
+        return await _run_sync(
+            db,
+            item,
+            institutions,
+            sync_job,
+            start_date=sync_job.get("start_date"),
+            default_lookback_days=default_lookback_days,
+        )
+    except asyncio.CancelledError:
+        # Worker shutdown: the queue job is requeued, so show the sync as pending
+        await asyncio.to_thread(
+            db.update_simplefin_sync_job,
+            sync_job_id,
+            {"status": "pending", "error_message": "Interrupted; requeued"},
+        )
+        raise
+    finally:
+        await asyncio.to_thread(
+            db.release_simplefin_sync_lease, item["id"], sync_job_id
+        )
+
+
+def _start_queued_sync_job(
+    db: Database, sync_job_id: str
+) -> tuple[dict, dict, list[str]] | None:
+    """
+    Take the lease for a queued sync job and mark it running.
+
+    Blocking (several round trips); call through asyncio.to_thread.
+
+    Returns:
+        (sync_job, item, admitted institutions), or None if the job already
+        completed.
+
+    Raises:
+        SyncInProgressError: If another sync took over the item's lease.
+        Whatever failed the start; the sync job is already marked failed.
+    """
+    sync_job = db.get_simplefin_sync_job_by_id(sync_job_id)
+    if not sync_job:
+        raise ValueError(f"SimpleFin sync job {sync_job_id} not found")
+    if sync_job["status"] == "completed":
+        return None
+
+    item = db.get_simplefin_item_by_id(sync_job["simplefin_item_id"])
+    try:
+        if not item:
+            raise ValueError("SimpleFin item not found")
+        # Renew the lease taken at enqueue time (or retake it if it expired)
+        holder = db.acquire_simplefin_sync_lease(
+            item["id"], sync_job_id, get_settings().simplefin_sync_lease_seconds
+        )
+        if holder != sync_job_id:
+            raise SyncInProgressError(holder)
+        institutions = _admit_institutions(db, item)
+        sync_job = db.update_simplefin_sync_job(
+            sync_job_id,
+            {"status": "running", "error_message": None, "completed_at": None},
+        )
+    except Exception as e:
+        _fail_sync_job(db, sync_job_id, str(e))
+        if item:
+            db.release_simplefin_sync_lease(item["id"], sync_job_id)
+        raise
+    return sync_job, item, institutions
+
+
+def _fail_sync_job(db: Database, job_id: str, error_message: str) -> None:
+    db.update_simplefin_sync_job(
+        job_id,
+        {"status": "failed", "completed_at": "now()", "error_message": error_message},
+    )
+
+
+async def _renew_sync_lease(db: Database, item_id: str, job_id: str) -> None:
+    """
+    Renew the item's sync lease every third of its TTL while a sync runs.
+
+    Run as a task next to the sync and cancel it when the sync ends, so a
+    long sync never lets its lease expire and a second sync start.
+    """
+    lease_seconds = get_settings().simplefin_sync_lease_seconds
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            holder = await asyncio.to_thread(
+                db.acquire_simplefin_sync_lease, item_id, job_id, lease_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Sync lease renewal failed for item {item_id}: {str(e)}")
+            continue
+        if holder != job_id:
+            logger.warning(f"Lost sync lease on item {item_id} to job {holder}")
+            return
+
+
+def _create_sync_job(db: Database, item: dict, job_id: str) -> dict:
+    """Create the running simplefin_sync_jobs row for a sync."""
+    return db.create_simplefin_sync_job(
+        {
+            "id": job_id,
+            "user_id": item["user_id"],
+            "simplefin_item_id": item["id"],
+            "status": "running",
+        }
+    )
+
+
+async def _run_sync(
+    db: Database,
+    item: dict,
+    institutions: list[str],
+    sync_job: dict,
+    start_date: int | None = None,
+    default_lookback_days: int | None = None,
+) -> dict:
+    """
+    Sync accounts and transactions for a single SimpleFin item.
+
+    1. Tracks progress on the item's simplefin_sync_jobs record.
+    2. Streams accounts + transactions from SimpleFin, starting from the
+       explicit start_date or else the item's high-water mark.
+    3. Upserts transactions in fixed-size batches as they are decoded,
+       skipping rows whose content hash is unchanged.
+    4. Upserts accounts (balances and org info).
+    5. Marks the sync job completed (or failed) and stamps last_synced_at
+       and the advanced high-water mark.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row (with encrypted access_url).
+        institutions: Institution keys admitted by the circuit breaker.
+        sync_job: The running simplefin_sync_jobs row (the lease holder).
+        start_date: Optional explicit start date (Unix timestamp), e.g. for a
+            backfill. Overrides the incremental window.
+        default_lookback_days: Window for items without a high-water mark.
+
+    Returns:
+        Dict with sync_job_id, accounts_synced, transactions_added,
+        transactions_updated, transactions_unchanged and errors.
+    """
+    progress = SyncProgress(db, sync_job)
+    lease_renewal = asyncio.create_task(
+        _renew_sync_lease(db, item["id"], sync_job["id"])
+    )
+
+    if start_date is None:
+        start_date = incremental_start_date(item, default_lookback_days)
+
+    try:
+        access_url = decrypt_token(item["access_url"])
+        stored = await _stream_and_store(
+            db, item, institutions, access_url, start_date=start_date, progress=progress
+        )
+
+        await asyncio.to_thread(
+            db.update_simplefin_sync_job,
+            sync_job["id"],
+            {
+                "status": "completed",
+                "completed_at": "now()",
+                "accounts_synced": stored["accounts_synced"],
+                "transactions_added": stored["transactions_added"],
+                "transactions_updated": stored["transactions_updated"],
+                "transactions_unchanged": stored["transactions_unchanged"],
+                "raw_payloads": (
+                    [stored["raw_payload"]] if stored["raw_payload"] else []
+                ),
+                "error_message": "; ".join(stored["write_errors"]) or None,
+                **progress.fields(),
+            },
+        )
+
+        await asyncio.to_thread(
+            _mark_item_synced,
+            db,
+            item,
+            stored["latest_posted_date"],
+            snapshotted=stored["snapshots_written"] > 0,
+        )
+
+        return {
+            "sync_job_id": sync_job["id"],
+            "accounts_synced": stored["accounts_synced"],
+            "transactions_added": stored["transactions_added"],
+            "transactions_updated": stored["transactions_updated"],
+            "transactions_unchanged": stored["transactions_unchanged"],
+            "errors": stored["provider_errors"] + stored["write_errors"],
+        }
+
+    except Exception as e:
+        await asyncio.to_thread(
+            db.update_simplefin_sync_job,
+            sync_job["id"],
+            {
+                "status": "failed",
+                "completed_at": "now()",
+                "error_message": str(e),
+                **progress.fields(),
+            },
+        )
+        raise
+    finally:
+        lease_renewal.cancel()
+
+
+def _backfill_windows(
+    start_date: int, end_date: int, window_days: int
+) -> list[tuple[int, int]]:
+    """Split [start_date, end_date) into consecutive (start, end) windows."""
+    step = window_days * 86400
+    return [
+        (window_start, min(window_start + step, end_date))
+        for window_start in range(start_date, end_date, step)
+    ]
+
+
+async def enqueue_backfill_job(
+    db: Database,
+    item: dict,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    window_days: int | None = None,
+) -> dict:
+    """
+    Queue a windowed history backfill for the background worker.
+
+    Takes the item's sync lease for the backfill job, creates (or, without a
+    start_date, reopens) its simplefin_sync_jobs row as 'pending' and adds a
+    'simplefin_sync' job to the durable job queue; the worker runs it with
+    run_queued_sync_job(). Poll the sync job row for progress
+    (completed_windows, rows_written) and the final status.
+
+    The worker splits [start_date, end_date) into windows of window_days,
+    fetches them with bounded concurrency and writes each window as it
+    arrives. Every finished window is checkpointed on the row; if the job
+    fails or the worker dies, queueing it again without a start_date resumes
+    the item's latest unfinished backfill and skips finished windows. Each
+    window takes a request from the item's daily quota; once it is used up,
+    the remaining windows are left for a resume after the quota resets (the
+    scheduled sync resumes unfinished backfills).
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row.
+        start_date: Start of history to load (Unix timestamp). None resumes
+            the item's latest unfinished backfill job.
+        end_date: End of history (Unix timestamp). Defaults to now.
+        window_days: Days per SimpleFin request (defaults to settings).
+
+    Returns:
+        The backfill's simplefin_sync_jobs row (status 'pending').
+
+    Raises:
+        ValueError: If start_date is None and there is nothing to resume.
+        CircuitOpenError: If every institution behind the item is failing.
+        SyncInProgressError: If another sync or backfill holds the item, or
+            the backfill to resume is already queued or running.
+    """
+    settings = get_settings()
+    await asyncio.to_thread(_admit_institutions, db, item)
+
+    if start_date is None:
+        resume_job = await asyncio.to_thread(
+            db.get_incomplete_simplefin_backfill_job, item["id"]
+        )
+        if not resume_job:
+            raise ValueError("No unfinished backfill to resume for this item")
+        if resume_job["status"] in ("pending", "running"):
+            raise SyncInProgressError(resume_job["id"])
+        return await asyncio.to_thread(
+            _queue_sync_job, db, item, resume_job["id"], None
+        )
+
+    return await asyncio.to_thread(
+        _queue_sync_job,
+        db,
+        item,
+        str(uuid.uuid4()),
+        {
+            "job_type": "backfill",
+            "backfill_start_date": start_date,
+            "backfill_end_date": end_date or int(datetime.now().timestamp()),
+            "window_days": window_days or settings.simplefin_backfill_window_days,
+        },
+    )
+
+
+async def _run_backfill(
+    db: Database,
+    item: dict,
+    institutions: list[str],
+    sync_job: dict,
+    max_concurrency: int | None = None,
+) -> dict:
+    """
+    Run (or resume) a running backfill job while holding the item's sync lease.
+
+    Any error marks the job failed, so it can be resumed.
+
+    Returns:
+        Dict with sync_job_id, windows_total, windows_completed,
+        accounts_synced, transactions_added, transactions_updated,
+        transactions_unchanged and errors (windows_completed is short of
+        windows_total when the backfill paused on the quota).
+    """
+    lease_renewal = asyncio.create_task(
+        _renew_sync_lease(db, item["id"], sync_job["id"])
+    )
+    try:
+        settings = get_settings()
+
+        windows = _backfill_windows(
+            sync_job["backfill_start_date"],
+            sync_job["backfill_end_date"],
+            sync_job["window_days"],
+        )
+        completed_windows = set(sync_job.get("completed_windows") or [])
+        totals = {
+            key: sync_job.get(key) or 0
+            for key in (
+                "transactions_added",
+                "transactions_updated",
+                "transactions_unchanged",
+            )
+        }
+        accounts_synced = sync_job.get("accounts_synced") or 0
+        raw_payloads = list(sync_job.get("raw_payloads") or [])
+        latest_posted_dates = []
+        errors = []
+
+        access_url = decrypt_token(item["access_url"])
+        semaphore = asyncio.Semaphore(
+            max_concurrency or settings.simplefin_backfill_concurrency
+        )
+        checkpoint_lock = asyncio.Lock()
+        progress = SyncProgress(db, sync_job)
+        quota_exhausted = False
+
+        async def run_window(window_start: int, window_end: int) -> None:
+            nonlocal accounts_synced, quota_exhausted
+            async with semaphore:
+                if quota_exhausted:
+                    return
+                try:
+                    stored = await _stream_and_store(
+                        db,
+                        item,
+                        institutions,
+                        access_url,
+                        start_date=window_start,
+                        end_date=window_end,
+                        progress=progress,
+                        # History windows; the daily sync snapshots today's balances
+                        snapshot_balances=False,
+                    )
+                except sync_scheduler.QuotaExhaustedError:
+                    # Pause: unfinished windows stay unchecked for the resume
+                    quota_exhausted = True
+                    return
+
+            async with checkpoint_lock:
+                if stored["raw_payload"]:
+                    raw_payloads.append(stored["raw_payload"])
+                errors.extend(stored["write_errors"])
+                # Windows with failed chunks stay unchecked so a resume retries them
+                if stored["write_errors"]:
+                    return
+                completed_windows.add(window_start)
+                for key in totals:
+                    totals[key] += stored[key]
+                accounts_synced = max(accounts_synced, stored["accounts_synced"])
+                if stored["latest_posted_date"]:
+                    latest_posted_dates.append(stored["latest_posted_date"])
+                await asyncio.to_thread(
+                    db.update_simplefin_sync_job,
+                    sync_job["id"],
+                    {
+                        "completed_windows": sorted(completed_windows),
+                        "raw_payloads": raw_payloads,
+                        "accounts_synced": accounts_synced,
+                        **totals,
+                        **progress.fields(),
+                    },
+                )
+
+        results = await asyncio.gather(
+            *(
+                run_window(window_start, window_end)
+                for window_start, window_end in windows
+                if window_start not in completed_windows
+            ),
+            return_exceptions=True,
+        )
+        errors.extend(
+            str(result) for result in results if isinstance(result, Exception)
+        )
+        if quota_exhausted:
+            errors.append(
+                "Paused: daily SimpleFin request quota used up; "
+                "resumes after it resets at midnight UTC"
+            )
+
+        finished = len(completed_windows) == len(windows)
+        await asyncio.to_thread(
+            db.update_simplefin_sync_job,
+            sync_job["id"],
+            {
+                "status": "completed" if finished else "failed",
+                "completed_at": "now()",
+                "error_message": "; ".join(errors) or None,
+                **progress.fields(),
+            },
+        )
+        if finished:
+            await asyncio.to_thread(
+                _mark_item_synced, db, item, max(latest_posted_dates, default=None)
+            )
+
+        return {
+            "sync_job_id": sync_job["id"],
+            "windows_total": len(windows),
+            "windows_completed": len(completed_windows),
+            "accounts_synced": accounts_synced,
+            **totals,
+            "errors": errors,
+        }
+
+    except Exception as e:
+        # Never leave the job 'running': a resume picks up failed jobs
+        await asyncio.to_thread(_fail_sync_job, db, sync_job["id"], str(e))
+        raise
+    finally:
+        lease_renewal.cancel()
+
+
+async def refresh_balances(db: Database, item: dict) -> dict:
+    """
+    Refresh account balances for a SimpleFin item without touching transactions.
+
+    Uses SimpleFin's balances-only mode, upserts the accounts and writes
+    today's account_balance_history row for each of them. Does not create a
+    sync job or stamp last_synced_at, so it never blocks a full sync.
+
+    Args:
+        db: Database instance.
+        item: The simplefin_items row (with encrypted access_url).
+
+    Returns:
+        Dict with accounts_updated, snapshots_written and errors.
+
+    Raises:
+        CircuitOpenError: If every institution behind the item is failing.
+        QuotaExhaustedError: If the item has no SimpleFin requests left today.
+    """
+    institutions = await asyncio.to_thread(_admit_institutions, db, item)
+    access_url = decrypt_token(item["access_url"])
+    await asyncio.to_thread(sync_scheduler.reserve_request, db, item)
+    accounts_data = await _fetch_accounts_with_breaker(
+        institutions, access_url, balances_only=True
+    )
+
+    accounts = simplefin_service.parse_simplefin_accounts(
+        accounts_data,
+        item["id"],
+        item["user_id"],
+    )
+    account_result = await asyncio.to_thread(db.upsert_simplefin_accounts, accounts)
+    snapshot_result = await SnapshotService(db).store_account_snapshots(
+        account_result["rows"]
+    )
+    if snapshot_result["rows"]:
+        await asyncio.to_thread(
+            db.update_simplefin_item,
+            item["id"],
+            {"last_snapshot_date": sync_scheduler.utc_today().isoformat()},
+        )
+
+    write_errors = simplefin_service.describe_failed_chunks(
+        "accounts", account_result["failed_chunks"]
+    ) + simplefin_service.describe_failed_chunks(
+        "balance snapshots", snapshot_result["failed_chunks"]
+    )
+
+    return {
+        "accounts_updated": len(account_result["rows"]),
+        "snapshots_written": len(snapshot_result["rows"]),
+        "errors": accounts_data.get("errors", []) + write_errors,
+    }
+
+
+async def replay_sync_job(db: Database, job_id: str) -> dict:
+    """
+    Re-run parsing and upserts for a past sync job from its archived payloads.
+
+    Reads the gzip'd raw bodies referenced by the job's raw_payloads instead
+    of calling SimpleFin, so parser fixes can be applied to history locally.
+    Every transaction in the payloads is rewritten, including ones whose
+    content hash is unchanged, so derived fields pick up the fix. Account
+    balances, balance snapshots, last_synced_at and the high-water mark are
+    left untouched, since the archived values are out of date. Records the run
+    as a new simplefin_sync_jobs row with job_type 'replay'.
+
+    Args:
+        db: Database instance (service role; replays run outside a request).
+        job_id: The sync job to replay.
+
+    Returns:
+        Dict with sync_job_id, payloads_replayed, accounts_synced,
+        transactions_added, transactions_updated, transactions_unchanged
+        and errors.
+
+    Raises:
+        ValueError: If the job or its item does not exist, or the job has no
+            archived payloads.
+        FileNotFoundError: If an archived payload is missing on disk.
+    """
+    source_job, item, sync_job = await asyncio.to_thread(_start_replay, db, job_id)
+
+    totals = {
+        "accounts_synced": 0,
+        "transactions_added": 0,
+        "transactions_updated": 0,
+        "transactions_unchanged": 0,
+    }
+    errors = []
+
+    try:
+        for digest in source_job["raw_payloads"]:
+            reader = PayloadArchiveReader(digest)
+            try:
+                # Archived balances are not current: don't write them over the
+                # live ones or snapshot them
+                stored = await _store_account_events(
+                    db,
+                    item,
+                    simplefin_service.iter_account_events(reader),
+                    snapshot_balances=False,
+                    update_accounts=False,
+                    skip_unchanged=False,
+                )
+            finally:
+                reader.close()
+            totals["accounts_synced"] = max(
+                totals["accounts_synced"], stored["accounts_synced"]
+            )
+            for key in (
+                "transactions_added",
+                "transactions_updated",
+                "transactions_unchanged",
+            ):
+                totals[key] += stored[key]
+            errors.extend(stored["write_errors"])
+
+    except Exception as e:
+        await asyncio.to_thread(_fail_sync_job, db, sync_job["id"], str(e))
+        raise
+
+    await asyncio.to_thread(
+        db.update_simplefin_sync_job,
+        sync_job["id"],
+        {
+            "status": "completed",
+            "completed_at": "now()",
+            **totals,
+            "error_message": "; ".join(errors) or None,
+        },
+    )
+
+    return {
+        "sync_job_id": sync_job["id"],
+        "payloads_replayed": len(source_job["raw_payloads"]),
+        **totals,
+        "errors": errors,
+    }
+
+
+def _start_replay(db: Database, job_id: str) -> tuple[dict, dict, dict]:
+    """
+    Load the sync job to replay and its item, and create the replay's job.
+
+    Blocking; call through asyncio.to_thread.
+
+    Returns:
+        (source_job, item, replay sync_job).
+    """
+    source_job = db.get_simplefin_sync_job_by_id(job_id)
+    if not source_job:
+        raise ValueError(f"Sync job {job_id} not found")
+    if not source_job.get("raw_payloads"):
+        raise ValueError(f"Sync job {job_id} has no archived payloads")
+    item = db.get_simplefin_item_by_id(source_job["simplefin_item_id"])
+    if not item:
+        raise ValueError(f"SimpleFin item {source_job['simplefin_item_id']} not found")
+
+    sync_job = db.create_simplefin_sync_job(
+        {
+            "user_id": item["user_id"],
+            "simplefin_item_id": item["id"],
+            "status": "running",
+            "job_type": "replay",
+            "raw_payloads": source_job["raw_payloads"],
+        }
+    )
+    return source_job, item, sync_job
@@ -5,10 +5,12 @@ Handles account balance history and calculates net worth on-the-fly:
 - Calculates net worth by summing all account balances per date
 """
 
+import asyncio
 from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional, Dict
 from decimal import Decimal
 from app.database import Database
+from app.services.sync_scheduler import utc_today
 
 
 class InsufficientDataError(Exception):
@@ -40,42 +42,60 @@ class SnapshotService:
         """
         Store current account balances as daily snapshots.
 
-        Called by cron job to snapshot each account's balance from simplefin_accounts table.
-        This runs daily to ensure continuous data for charting.
+        Snapshots each account's balance from the simplefin_accounts table.
+        Syncs already snapshot the accounts they upsert (see
+        store_account_snapshots), so this is only needed for manual backfills.
 
         Args:
             user_id: User ID to snapshot accounts for
             snapshot_date: Date to snapshot (defaults to today)
         """
-        if not snapshot_date:
-            snapshot_date = date.today()
-
         # Get all user's accounts with current balances
         accounts = (
             self.db.client.table("simplefin_accounts")
-            .select("id, balance")
+            .select("id, user_id, balance")
             .eq("user_id", user_id)
             .execute()
         )
 
-        if not accounts.data:
-            return
+        await self.store_account_snapshots(accounts.data, snapshot_date)
+
+    async def store_account_snapshots(
+        self, accounts: List[dict], snapshot_date: Optional[date] = None
+    ) -> dict:
+        """
+        Snapshot the balances of accounts already in hand, in one batch.
 
-        # Store snapshot for each account
-        for account in accounts.data:
-            balance = account.get("balance") or 0
+        Used by SimpleFin syncs right after the account upsert (with the
+        returned rows), so snapshots never need a separate read of
+        simplefin_accounts.
+
+        Args:
+            accounts: simplefin_accounts rows (id, user_id and balance)
+            snapshot_date: Date to snapshot (defaults to today)
 
-            snapshot_data = {
-                "user_id": user_id,
+        Returns:
+            The bulk_upsert() result: {"rows": [...], "failed_chunks": [...]}
+        """
+        if not snapshot_date:
+            snapshot_date = utc_today()
+
+        now = datetime.now(timezone.utc).isoformat()
+        snapshots = [
+            {
+                "user_id": account["user_id"],
                 "simplefin_account_id": account["id"],
                 "snapshot_date": snapshot_date.isoformat(),
-                "balance": float(balance),
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "balance": float(account.get("balance") or 0),
+                "updated_at": now,
             }
+            for account in accounts
+        ]
 
-            self.db.client.table("account_balance_history").upsert(
-                snapshot_data, on_conflict="user_id,simplefin_account_id,snapshot_date"
-            ).execute()
+        # Called from syncs on the worker loop; keep the upsert off it
+        return await asyncio.to_thread(
+            self.db.upsert_account_balance_history, snapshots
+        )
 
     async def get_snapshots(
         self,
@@ -102,7 +122,7 @@ class SnapshotService:
             InsufficientDataError: If less than 50% of requested dates have data
         """
         if not end_date:
-            end_date = date.today()
+            end_date = utc_today()
 
         if not start_date:
             # Default based on granularity
@@ -232,7 +252,7 @@ class SnapshotService:
             InsufficientDataError: If less than 50% of requested dates have data
         """
         if not end_date:
-            end_date = date.today()
+            end_date = utc_today()
 
         if not start_date:
             # Default based on granularity
@@ -0,0 +1,103 @@
+"""Quota-aware scheduling for SimpleFin syncs.
+
+Each item gets a stable time slot in the UTC day, derived from a hash of its
+ID, so scheduled syncs are spread evenly instead of firing all at once. The
+scheduler ticks every few minutes and syncs items whose latest slot has
+passed since their last sync, which also catches up any slot missed while
+the process was down. Per-item request usage (cron, manual and force syncs,
+balance refreshes, backfill windows) is tracked in
+simplefin_item_sync_state, and every fetch first takes a request with
+reserve_request(), so no caller exceeds SimpleFin's daily quota.
+"""
+
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from app.config import get_settings
+from app.database import Database
+
+SECONDS_PER_DAY = 86400
+
+
+def _parse_timestamp(value: str | datetime) -> datetime:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value
+
+
+def item_slot_offset(item_id: str) -> int:
+    """Get the item's stable sync slot as seconds after UTC midnight."""
+    digest = hashlib.sha256(item_id.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % SECONDS_PER_DAY
+
+
+def latest_slot(item_id: str, now: datetime) -> datetime:
+    """Get the most recent occurrence of the item's slot at or before now."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    slot = midnight + timedelta(seconds=item_slot_offset(item_id))
+    if slot > now:
+        slot -= timedelta(days=1)
+    return slot
+
+
+def is_due(item: dict, now: datetime) -> bool:
+    """Check whether the item has not synced since its latest slot."""
+    if not item.get("last_synced_at"):
+        return True
+    return _parse_timestamp(item["last_synced_at"]) < latest_slot(item["id"], now)
+
+
+def utc_today(now: datetime | None = None) -> date:
+    """Get the UTC day that quotas, sync slots and balance snapshots use."""
+    return (now or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+
+
+def quota_remaining(item: dict, now: datetime | None = None) -> int:
+    """Get the SimpleFin requests the item has left today (UTC)."""
+    quota = get_settings().simplefin_daily_request_quota
+    if item.get("quota_date") != utc_today(now).isoformat():
+        return quota
+    return max(0, quota - (item.get("quota_used") or 0))
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when an item has no SimpleFin requests left today."""
+
+    def __init__(self, item_id: str):
+        self.item_id = item_id
+        super().__init__(
+            "Daily SimpleFin request quota for this connection is used up. "
+            "It resets at midnight UTC."
+        )
+
+
+def reserve_request(db: Database, item: dict) -> None:
+    """
+    Count one SimpleFin request against the item's daily quota.
+
+    Call before every fetch; the check and the count are one atomic update.
+
+    Raises:
+        QuotaExhaustedError: If the item has no requests left today.
+    """
+    if not db.reserve_simplefin_request(
+        item["id"], get_settings().simplefin_daily_request_quota
+    ):
+        raise QuotaExhaustedError(item["id"])
+
+
+def select_due_items(items: list[dict], now: datetime, limit: int) -> list[dict]:
+    """
+    Pick the items to sync on this tick, most overdue first.
+
+    Args:
+        items: Active simplefin_items rows.
+        now: Current UTC time.
+        limit: Maximum items to dispatch per tick (keeps load steady).
+
+    Returns:
+        Due items, oldest slot first, capped at limit.
+    """
+    due = [item for item in items if is_due(item, now)]
+    due.sort(key=lambda item: latest_slot(item["id"], now))
+    return due[:limit]
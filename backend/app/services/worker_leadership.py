@@ -0,0 +1,124 @@
+"""Leader election and item sharding across background worker processes.
+
+Every worker ticks the same repeat_every schedules, so without coordination
+N workers would run every scheduled job N times. Workers heartbeat a DB
+lease (worker_leases) instead:
+
+- Leader mode (default): the holder of the 'scheduler' lease runs all
+  scheduled jobs; the others stand by and take over once the leader's lease
+  expires (it stops heartbeating or dies).
+- Sharded mode (WORKER_SHARDING=true): each worker also heartbeats its own
+  'worker:<id>' lease and takes the items whose hash falls in its shard of
+  the live workers, so scheduled item work is split instead of idle.
+
+Membership changes can briefly overlap shards; the per-item sync lease and
+the daily slot check keep that from syncing an item twice.
+"""
+
+import hashlib
+import os
+import socket
+import time
+import uuid
+
+from app.config import get_settings
+from app.database import Database
+from app.logging_config import get_logger
+
+logger = get_logger("worker_leadership")
+
+LEADER_LEASE = "scheduler"
+MEMBER_LEASE_PREFIX = "worker:"
+
+
+def _item_shard(item_id: str, shard_count: int) -> int:
+    digest = hashlib.sha256(item_id.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shard_count
+
+
+class WorkerLeadership:
+    """This worker's view of the scheduler lease and its item shard."""
+
+    def __init__(self):
+        settings = get_settings()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = settings.worker_lease_seconds
+        self.sharding = settings.worker_sharding
+        self.shard_index = 0
+        self.shard_count = 1
+        self._leader = False
+        # Monotonic deadline of our last successful heartbeat's leases
+        self._valid_until = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this worker holds an unexpired scheduler lease."""
+        return self._leader and time.monotonic() < self._valid_until
+
+    def heartbeat(self, db: Database) -> None:
+        """
+        Renew (or try to take) the leases and recompute this worker's shard.
+
+        Any failure demotes the worker until the next successful heartbeat,
+        so a worker cut off from the database never keeps acting as leader.
+        """
+        started = time.monotonic()
+        try:
+            holder = db.acquire_worker_lease(
+                LEADER_LEASE, self.worker_id, self.lease_seconds
+            )
+            if self.sharding:
+                db.acquire_worker_lease(
+                    f"{MEMBER_LEASE_PREFIX}{self.worker_id}",
+                    self.worker_id,
+                    self.lease_seconds,
+                )
+                members = sorted(
+                    set(db.get_live_worker_lease_holders(MEMBER_LEASE_PREFIX))
+                    | {self.worker_id}
+                )
+                self.shard_count = len(members)
+                self.shard_index = members.index(self.worker_id)
+        except Exception as e:
+            if self._leader:
+                logger.warning(f"Lost scheduler lease (heartbeat failed): {str(e)}")
+            self._leader = False
+            self.shard_index, self.shard_count = 0, 1
+            return
+
+        was_leader = self._leader
+        self._leader = holder == self.worker_id
+        # Count the TTL from before the round trip so we never overestimate it
+        self._valid_until = started + self.lease_seconds
+        if self._leader and not was_leader:
+            logger.info(f"Worker {self.worker_id} is now the scheduler leader")
+        elif was_leader and not self._leader:
+            logger.warning(f"Worker {self.worker_id} lost the scheduler lease")
+
+    def owns_item(self, item_id: str) -> bool:
+        """
+        Whether this worker should run scheduled work for an item.
+
+        Leader mode: only the leader owns items. Sharded mode: each live
+        worker owns the items hashed to its shard.
+        """
+        if not self.sharding:
+            return self.is_leader
+        if time.monotonic() >= self._valid_until:
+            return False
+        return _item_shard(item_id, self.shard_count) == self.shard_index
+
+    def release(self, db: Database) -> None:
+        """Give up this worker's leases on shutdown so others take over at once."""
+        try:
+            db.release_worker_lease(LEADER_LEASE, self.worker_id)
+            if self.sharding:
+                db.release_worker_lease(
+                    f"{MEMBER_LEASE_PREFIX}{self.worker_id}", self.worker_id
+                )
+        except Exception as e:
+            logger.warning(f"Failed to release worker leases: {str(e)}")
+        self._leader = False
+
+
+leadership = WorkerLeadership()
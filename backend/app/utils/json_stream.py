@@ -0,0 +1,68 @@
+"""Incremental parsing of streamed JSON arrays."""
+
+import json
+
+_decoder = json.JSONDecoder()
+
+
+class JSONArrayStream:
+    """
+    Parse a JSON array of objects from text that arrives in chunks.
+
+    feed() returns each element as soon as it is complete, so callers can act
+    on the first elements while the rest is still being generated. Text before
+    the opening bracket (e.g. a ```json fence) is ignored. If the stream stops
+    early, every element completed so far has already been returned and
+    `complete` stays False.
+    """
+
+    def __init__(self):
+        self.started = False  # Opening bracket seen
+        self.complete = False  # Closing bracket seen
+        self.count = 0  # Elements returned so far
+        self._buffer = ""
+        self._stalled = False  # Last decode attempt hit an incomplete element
+
+    def feed(self, text: str) -> list:
+        """Add a chunk of text and return the elements it completed."""
+        if self.complete:
+            return []
+        self._buffer += text
+
+        if not self.started:
+            start = self._buffer.find("[")
+            if start < 0:
+                self._buffer = ""
+                return []
+            self._buffer = self._buffer[start + 1 :]
+            self.started = True
+        elif self._stalled and "}" not in text and "]" not in text:
+            # The pending element can't have been completed by this chunk
+            return []
+
+        elements = []
+        pos = 0
+        while True:
+            while pos < len(self._buffer) and self._buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self._buffer):
+                break
+            if self._buffer[pos] == "]":
+                self.complete = True
+                break
+            try:
+                element, pos = _decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                self._stalled = True
+                break
+            self._stalled = False
+            elements.append(element)
+
+        self._buffer = self._buffer[pos:]
+        self.count += len(elements)
+        return elements
+
+    @property
+    def pending(self) -> str:
+        """Unparsed text after the last complete element (e.g. a truncated one)."""
+        return self._buffer.strip()
@@ -0,0 +1,82 @@
+"""Deterministic merchant normalization for transactions.
+
+Bank descriptions carry store numbers, dates, card suffixes and payment
+processor prefixes, so the same merchant shows up under many strings
+("SQ *BLUE BOTTLE 0423", "SQ *BLUE BOTTLE 0518"). normalize_merchant() maps
+them to one merchant key ("blue bottle") that is stored on each transaction
+(simplefin_transactions.merchant_key) for equality lookups, grouping and rules.
+
+The output must stay stable: changing these rules changes stored keys, so
+re-run backfill_merchant_keys.py --all afterwards.
+"""
+
+import re
+
+# Payment processor / aggregator prefixes: "SQ *", "TST* ", "PAYPAL *", ...
+_PROCESSOR_PREFIX = re.compile(
+    r"^(?:SQ|SQU|TST|SP|PP|PAYPAL|IC|PY|BT|CKO|DD|GOOGLE|APPLE\.COM/BILL)\s*\*\s*"
+)
+
+# Card-network and bank boilerplate at the start of a description
+_BANK_PREFIX = re.compile(
+    r"^(?:(?:POS|DEBIT CARD|DEBIT|CHECKCARD|CHECK CARD|VISA|RECURRING|PURCHASE|"
+    r"PURCHASE AUTHORIZED ON|AUTHORIZED ON|ACH|PREAUTHORIZED|PRE-AUTH)\s+)+"
+)
+
+# Dates (04/23, 04/23/2024, 2024-04-23) and card/reference suffixes
+# (CARD 1234, XXXX1234, ...1234, #1234)
+_NOISE = re.compile(
+    r"\b\d{1,4}[/-]\d{1,2}(?:[/-]\d{2,4})?\b"
+    r"|\bCARD\s*(?:ENDING\s*(?:IN\s*)?)?[X*#]*\d+\b"
+    r"|\bX{2,}\d*\b"
+    r"|\.{2,}\d+"
+    r"|#\s*\d+"
+)
+
+# Web domains: "NETFLIX.COM" -> "NETFLIX"
+_DOMAIN_SUFFIX = re.compile(r"\.(?:COM|NET|ORG|IO|CO|US)\b")
+
+# Everything but letters, digits, &, ' and - separates words
+_SEPARATORS = re.compile(r"[^A-Z0-9&'-]+")
+
+_FILLER_WORDS = {"STORE"}
+
+
+def _is_reference(word: str, position: int) -> bool:
+    """Store numbers and IDs: words that are at least half digits.
+
+    A short leading number is part of the name ("24 HOUR FITNESS").
+    """
+    digits = sum(ch.isdigit() for ch in word)
+    if position == 0 and len(word) <= 3:
+        return False
+    return digits > 0 and digits * 2 >= len(word)
+
+
+def normalize_merchant(payee: str | None, description: str | None = None) -> str | None:
+    """
+    Normalize a transaction's payee (or description) to a merchant key.
+
+    Args:
+        payee: SimpleFin's cleaned-up merchant name, if any.
+        description: Raw bank description, used when there is no payee.
+
+    Returns:
+        Lowercase words separated by single spaces (e.g. "blue bottle"), or
+        None if nothing merchant-like is left.
+    """
+    text = (payee or description or "").upper().strip()
+    if not text:
+        return None
+
+    text = _BANK_PREFIX.sub("", text)
+    text = _PROCESSOR_PREFIX.sub("", text)
+    text = _NOISE.sub(" ", text)
+    text = _DOMAIN_SUFFIX.sub("", text)
+
+    words = []
+    for word in _SEPARATORS.split(text):
+        word = word.strip("'-")
+        if word and word not in _FILLER_WORDS and not _is_reference(word, len(words)):
+            words.append(word)
+    return " ".join(words).lower() or None
@@ -0,0 +1,105 @@
+"""CashState background worker - runs scheduled and queued jobs.
+
+Owns all background work so API processes only serve requests:
+- Scheduled cron jobs (SimpleFin sync dispatch, balance refresh, daily
+  snapshots, payload archive pruning)
+- A pool that runs jobs from the durable job queue (app/jobs.py): SimpleFin
+  syncs, snapshots and categorization, queued by cron or the API
+
+Run as many workers as needed; they share the queue.
+
+Usage:
+    uv run python -m app.worker
+"""
+
+import asyncio
+import signal
+
+from fastapi_utils.tasks import repeat_every
+
+from app import jobs  # noqa: F401 - registers the job handlers
+from app.config import get_settings
+from app.cron import (
+    prune_simplefin_archive,
+    refresh_simplefin_balances,
+    sync_simplefin_transactions,
+    update_daily_snapshots,
+)
+from app.database import Database, get_supabase_client
+from app.logging_config import setup_logging
+from app.services import simplefin_service
+from app.services.job_queue import JOB_HANDLERS, JobWorkerPool
+from app.services.worker_leadership import leadership
+
+logger = setup_logging()
+
+settings = get_settings()
+
+
+@repeat_every(
+    seconds=settings.worker_heartbeat_seconds,
+    wait_first=settings.worker_heartbeat_seconds,
+)
+async def heartbeat_worker_leases():
+    """Renew this worker's leases (leader election and shard membership)."""
+    await asyncio.to_thread(leadership.heartbeat, Database(get_supabase_client()))
+
+
+async def run() -> None:
+    """Start the background jobs and run until SIGINT/SIGTERM."""
+    logger.info(f"Starting {settings.app_name} worker...")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Settle leadership before the first scheduled tick
+    db = Database(get_supabase_client())
+    await asyncio.to_thread(leadership.heartbeat, db)
+    logger.info(
+        f"Worker {leadership.worker_id}: "
+        + (
+            f"shard {leadership.shard_index + 1}/{leadership.shard_count}"
+            if leadership.sharding
+            else ("leader" if leadership.is_leader else "standby")
+        )
+    )
+    await heartbeat_worker_leases()
+
+    if settings.enable_cron_jobs:
+        logger.info("[CRON] Starting scheduled tasks...")
+        await sync_simplefin_transactions()  # Run immediately on startup
+        await update_daily_snapshots()  # Once a day, near the end of the UTC day
+        await refresh_simplefin_balances()  # First run after the refresh interval
+        await prune_simplefin_archive()  # Run immediately on startup
+        logger.info("[CRON] Scheduled tasks initialized")
+    else:
+        logger.info("[CRON] Cron jobs disabled")
+
+    pool = JobWorkerPool(db, leadership.worker_id)
+    pool_task = asyncio.create_task(pool.run(stop))
+    logger.info(
+        f"Worker pool running {pool.concurrency} at a time: {', '.join(JOB_HANDLERS)}"
+    )
+
+    await stop.wait()
+
+    # Shutdown: the pool cancels and requeues its in-flight jobs, then the
+    # scheduled loops are cancelled before closing the shared HTTP client
+    logger.info(f"Shutting down {settings.app_name} worker...")
+    await pool_task
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.to_thread(leadership.release, db)
+    await simplefin_service.close_http_client()
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Backfill simplefin_transactions.merchant_key for existing transactions.
+
+New and changed transactions get a merchant key when they are parsed during
+sync; unchanged history is never rewritten, so run this once after adding the
+column, and again with --all after changing app/utils/merchant.py.
+
+Usage:
+    uv run python backfill_merchant_keys.py
+    uv run python backfill_merchant_keys.py --all --batch-size 1000
+    uv run python backfill_merchant_keys.py --user-id <user_id> --dry-run
+"""
+
+import argparse
+
+from app.database import Database, get_supabase_client
+from app.utils.merchant import normalize_merchant
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Backfill normalized merchant keys on transactions"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Recompute every key (default: only transactions without one)",
+    )
+    parser.add_argument("--user-id", help="Only this user's transactions")
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Transactions per query"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report changes without writing"
+    )
+    args = parser.parse_args()
+
+    db = Database(get_supabase_client())
+
+    scanned = 0
+    changed = 0
+    last_id = None
+
+    # Keyset pagination on id, so rows updated along the way are not skipped
+    while True:
+        query = db.client.table("simplefin_transactions").select(
+            "id, payee, description, merchant_key"
+        )
+        if not args.all:
+            query = query.is_("merchant_key", "null")
+        if args.user_id:
+            query = query.eq("user_id", args.user_id)
+        if last_id:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(args.batch_size).execute().data
+
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        scanned += len(rows)
+
+        updates = []
+        for row in rows:
+            merchant_key = normalize_merchant(row["payee"], row["description"])
+            if merchant_key != row["merchant_key"]:
+                updates.append({"id": row["id"], "merchant_key": merchant_key})
+
+        if updates and not args.dry_run:
+            db.batch_update_merchant_keys(updates)
+        changed += len(updates)
+        print(f"Scanned {scanned} transactions, {changed} key(s) changed")
+
+    action = "would change" if args.dry_run else "changed"
+    print(f"Done: {scanned} scanned, {changed} merchant key(s) {action}")
+
+
+if __name__ == "__main__":
+    main()
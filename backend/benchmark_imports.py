@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold-start import time and memory for the API and worker.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and reports wall time, peak RSS and the slowest top-level packages. Provider
+SDKs (anthropic, plaid, openrouter) should only load on first use; pass
+--forbid to fail if an entry point imports them eagerly.
+
+Usage:
+    uv run python benchmark_imports.py
+    uv run python benchmark_imports.py --module app.worker --top 20
+    uv run python benchmark_imports.py --forbid anthropic,plaid,openrouter
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+DEFAULT_MODULES = ["app.main", "app.worker"]
+
+
+def measure(module: str) -> dict:
+    """Import a module in a fresh interpreter and collect its timings."""
+    # The child reports its own peak RSS (KiB on Linux) once the import is done
+    code = (
+        f"import {module}, resource; "
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    # "import time: self [us] | cumulative | imported package" lines
+    packages: dict[str, int] = defaultdict(int)
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        imported.add(name)
+        if "." not in name:
+            packages[name] = max(packages[name], int(cumulative))
+
+    return {
+        "wall": wall,
+        "peak_rss_kb": int(result.stdout.split()[-1]),
+        "packages": packages,
+        "imported": imported,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold-start import time and memory"
+    )
+    parser.add_argument(
+        "--module",
+        action="append",
+        help="Module to import (repeatable; default: app.main and app.worker)",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Runs per module (median is reported)"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Slowest top-level packages to list"
+    )
+    parser.add_argument(
+        "--forbid",
+        default="",
+        help="Comma-separated packages that must not be imported (exit 1 if they are)",
+    )
+    args = parser.parse_args()
+
+    forbidden = {name for name in args.forbid.split(",") if name}
+    violations = []
+
+    for module in args.module or DEFAULT_MODULES:
+        runs = [measure(module) for _ in range(args.runs)]
+        walls = [run["wall"] for run in runs]
+        rss = [run["peak_rss_kb"] for run in runs]
+        last = runs[-1]
+
+        print(f"\n{module}")
+        print(
+            f"  cold start: {statistics.median(walls):.2f}s median "
+            f"(min {min(walls):.2f}s, {args.runs} runs)"
+        )
+        print(f"  peak RSS:   {statistics.median(rss) / 1024:.0f} MiB")
+        print("  slowest packages (cumulative import time):")
+        slowest = sorted(last["packages"].items(), key=lambda kv: kv[1], reverse=True)
+        for name, micros in slowest[: args.top]:
+            print(f"    {micros / 1000:8.1f} ms  {name}")
+
+        eager = sorted(forbidden & last["imported"])
+        if eager:
+            violations.append(f"{module} imports {', '.join(eager)}")
+
+    if violations:
+        print("\nProvider SDKs imported eagerly:")
+        for violation in violations:
+            print(f"  ! {violation}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Replay SimpleFin sync jobs from archived raw payloads.
+
+Re-runs parsing and the transaction/account upserts for past sync jobs using
+the gzip'd payloads in SIMPLEFIN_ARCHIVE_DIR, without calling SimpleFin.
+Useful after a parser fix: history is reprocessed locally and no
+rate-limited fetch is spent.
+
+Usage:
+    uv run python replay_simplefin_payloads.py --job-id <sync_job_id>
+    uv run python replay_simplefin_payloads.py --item-id <item_id> --limit 10
+"""
+
+import argparse
+import asyncio
+
+from app.database import Database, get_supabase_client
+from app.services import simplefin_sync_service
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay SimpleFin sync jobs from archived payloads"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--job-id", help="Sync job to replay")
+    group.add_argument("--item-id", help="Replay recent archived jobs for this item")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="With --item-id: number of most recent jobs to replay (oldest first)",
+    )
+    args = parser.parse_args()
+
+    db = Database(get_supabase_client())
+
+    if args.job_id:
+        job_ids = [args.job_id]
+    else:
+        result = (
+            db.client.table("simplefin_sync_jobs")
+            .select("id")
+            .eq("simplefin_item_id", args.item_id)
+            .neq("job_type", "replay")
+            .neq("raw_payloads", "[]")
+            .order("created_at", desc=True)
+            .limit(args.limit)
+            .execute()
+        )
+        job_ids = [job["id"] for job in reversed(result.data)]
+
+    if not job_ids:
+        print("No archived sync jobs to replay")
+        return
+
+    for job_id in job_ids:
+        result = asyncio.run(simplefin_sync_service.replay_sync_job(db, job_id))
+        print(
+            f"Replayed {job_id} -> {result['sync_job_id']}: "
+            f"{result['payloads_replayed']} payload(s), "
+            f"{result['transactions_added']} added, "
+            f"{result['transactions_updated']} updated, "
+            f"{result['transactions_unchanged']} unchanged"
+        )
+        for error in result["errors"]:
+            print(f"  ! {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,14 @@
 -- SimpleFin + Daily Account Balance History
 -- Run this after ensuring auth.users table exists
 
+-- ============================================================================
+-- Extensions
+-- ============================================================================
+-- pg_trgm: trigram matching for transaction search
+-- btree_gin: lets the search index lead with user_id
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS btree_gin WITH SCHEMA extensions;
+
 -- ============================================================================
 -- Helper Functions
 -- ============================================================================
@@ -25,6 +33,8 @@ CREATE TABLE IF NOT EXISTS public.simplefin_items (
     institution_name TEXT,     -- User-provided name for this connection
     status TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'error')),
     last_synced_at TIMESTAMPTZ,
+    last_posted_date BIGINT,   -- Unix timestamp of the latest posted transaction seen (incremental sync high-water mark)
+    last_snapshot_date DATE,   -- Day of the latest account_balance_history write (sync or balance refresh)
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
@@ -44,6 +54,120 @@ CREATE TRIGGER simplefin_items_updated_at
     BEFORE UPDATE ON public.simplefin_items
     FOR EACH ROW EXECUTE FUNCTION public.handle_updated_at();
 
+-- ============================================================================
+-- SimpleFin Item Sync State Table (daily quota and single-flight lease)
+-- ============================================================================
+-- Kept out of simplefin_items so users can't reset their quota or steal a
+-- running sync's lease. Users may read their rows; only the service role
+-- writes them, through the RPCs below. A row is created on first use.
+CREATE TABLE IF NOT EXISTS public.simplefin_item_sync_state (
+    simplefin_item_id UUID PRIMARY KEY REFERENCES public.simplefin_items(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    quota_date DATE,                    -- UTC day quota_used counts toward
+    quota_used INT NOT NULL DEFAULT 0,  -- SimpleFin requests made on quota_date (all callers)
+    sync_lease_job_id UUID,             -- Sync job currently allowed to sync this item (single flight)
+    sync_lease_expires_at TIMESTAMPTZ,  -- Lease is free once this passes (crashed holder)
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.simplefin_item_sync_state ENABLE ROW LEVEL SECURITY;
+GRANT SELECT ON public.simplefin_item_sync_state TO authenticated;
+
+CREATE POLICY "Users can view own simplefin item sync state"
+    ON public.simplefin_item_sync_state FOR SELECT
+    USING ((SELECT auth.uid()) = user_id);
+
+CREATE INDEX idx_simplefin_item_sync_state_user_id ON public.simplefin_item_sync_state(user_id);
+
+CREATE TRIGGER simplefin_item_sync_state_updated_at
+    BEFORE UPDATE ON public.simplefin_item_sync_state
+    FOR EACH ROW EXECUTE FUNCTION public.handle_updated_at();
+
+-- Atomically take one SimpleFin request from an item's daily quota.
+-- Resets the counter on the first request of a new UTC day. Returns FALSE
+-- (and counts nothing) if p_quota requests were already made today or the
+-- item doesn't exist; concurrent callers can never overshoot the quota.
+CREATE OR REPLACE FUNCTION public.reserve_simplefin_request(
+    p_item_id UUID,
+    p_quota INT
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO public.simplefin_item_sync_state AS s (simplefin_item_id, user_id, quota_date, quota_used)
+    SELECT id, user_id, (NOW() AT TIME ZONE 'UTC')::DATE, 1
+    FROM public.simplefin_items
+    WHERE id = p_item_id
+        AND p_quota > 0
+    ON CONFLICT (simplefin_item_id) DO UPDATE
+    SET quota_used = CASE
+            WHEN s.quota_date = EXCLUDED.quota_date THEN s.quota_used + 1
+            ELSE 1
+        END,
+        quota_date = EXCLUDED.quota_date
+    WHERE s.quota_date IS DISTINCT FROM EXCLUDED.quota_date
+        OR s.quota_used < p_quota;
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Single-flight lease for syncing an item.
+-- Takes the lease for p_job_id if it is free, expired, or already held by
+-- p_job_id (which extends it). Returns the job ID holding the lease
+-- afterwards: p_job_id on success, otherwise the in-flight job.
+CREATE OR REPLACE FUNCTION public.acquire_simplefin_sync_lease(
+    p_item_id UUID,
+    p_job_id UUID,
+    p_ttl_seconds INT
+)
+RETURNS UUID AS $$
+DECLARE
+    v_holder UUID;
+BEGIN
+    INSERT INTO public.simplefin_item_sync_state AS s (
+        simplefin_item_id, user_id, sync_lease_job_id, sync_lease_expires_at
+    )
+    SELECT id, user_id, p_job_id, NOW() + make_interval(secs => p_ttl_seconds)
+    FROM public.simplefin_items
+    WHERE id = p_item_id
+    ON CONFLICT (simplefin_item_id) DO UPDATE
+    SET sync_lease_job_id = EXCLUDED.sync_lease_job_id,
+        sync_lease_expires_at = EXCLUDED.sync_lease_expires_at
+    WHERE s.sync_lease_job_id IS NULL
+        OR s.sync_lease_job_id = p_job_id
+        OR s.sync_lease_expires_at < NOW()
+    RETURNING s.sync_lease_job_id INTO v_holder;
+
+    IF v_holder IS NULL THEN
+        SELECT sync_lease_job_id INTO v_holder
+        FROM public.simplefin_item_sync_state
+        WHERE simplefin_item_id = p_item_id;
+    END IF;
+
+    RETURN v_holder;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Release the item's sync lease if p_job_id still holds it.
+CREATE OR REPLACE FUNCTION public.release_simplefin_sync_lease(
+    p_item_id UUID,
+    p_job_id UUID
+)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE public.simplefin_item_sync_state
+    SET sync_lease_job_id = NULL,
+        sync_lease_expires_at = NULL
+    WHERE simplefin_item_id = p_item_id
+        AND sync_lease_job_id = p_job_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Quota and lease functions are for the service role only
+REVOKE EXECUTE ON FUNCTION public.reserve_simplefin_request(UUID, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.acquire_simplefin_sync_lease(UUID, UUID, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.release_simplefin_sync_lease(UUID, UUID) FROM PUBLIC, anon, authenticated;
+
 -- ============================================================================
 -- SimpleFin Accounts Table
 -- ============================================================================
@@ -201,8 +325,8 @@ CREATE TRIGGER subcategories_updated_at
 CREATE TABLE IF NOT EXISTS public.categorization_rules (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
-    match_field TEXT NOT NULL CHECK (match_field IN ('payee', 'description', 'memo')),
-    match_value TEXT NOT NULL,              -- case-insensitive substring match
+    match_field TEXT NOT NULL CHECK (match_field IN ('payee', 'description', 'memo', 'merchant_key')),
+    match_value TEXT NOT NULL,              -- case-insensitive substring match; exact normalized key for merchant_key
     category_id UUID NOT NULL REFERENCES public.categories(id) ON DELETE CASCADE,
     subcategory_id UUID REFERENCES public.subcategories(id) ON DELETE SET NULL,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
@@ -219,6 +343,84 @@ CREATE POLICY "Users can manage own categorization rules"
 CREATE INDEX idx_categorization_rules_user_id ON public.categorization_rules(user_id);
 CREATE INDEX idx_categorization_rules_user_category ON public.categorization_rules(user_id, category_id);
 
+-- ============================================================================
+-- Categorization Runs Table
+-- ============================================================================
+-- One row per categorize_transactions() call: what was categorized and what
+-- the LLM calls cost (tokens, latency, retries, estimated USD). Feeds
+-- GET /categories/ai/runs and GET /categories/ai/metrics.
+CREATE TABLE IF NOT EXISTS public.categorization_runs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    provider TEXT NOT NULL,                 -- claude or openrouter
+    model TEXT NOT NULL,
+    transactions_requested INT NOT NULL DEFAULT 0,
+    rule_matched_count INT NOT NULL DEFAULT 0,
+    ai_transactions_count INT NOT NULL DEFAULT 0,  -- Transactions sent to the LLM
+    categorized_count INT NOT NULL DEFAULT 0,
+    failed_count INT NOT NULL DEFAULT 0,
+    llm_calls INT NOT NULL DEFAULT 0,
+    prompt_tokens INT NOT NULL DEFAULT 0,
+    completion_tokens INT NOT NULL DEFAULT 0,
+    llm_latency_ms INT NOT NULL DEFAULT 0,  -- Sum over calls, including queueing and retries
+    llm_retries INT NOT NULL DEFAULT 0,
+    estimated_cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
+    calls JSONB NOT NULL DEFAULT '[]'::jsonb,  -- Per-call model, tokens, latency_ms, retries, transactions
+    error_message TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMPTZ
+);
+
+ALTER TABLE public.categorization_runs ENABLE ROW LEVEL SECURITY;
+GRANT SELECT, INSERT, UPDATE ON public.categorization_runs TO authenticated;
+
+CREATE POLICY "Users can manage own categorization runs"
+    ON public.categorization_runs FOR ALL
+    USING ((SELECT auth.uid()) = user_id)
+    WITH CHECK ((SELECT auth.uid()) = user_id);
+
+CREATE INDEX idx_categorization_runs_user_created ON public.categorization_runs(user_id, created_at DESC);
+
+-- Usage and cost totals per provider/model for GET /categories/ai/metrics.
+-- Aggregated here rather than over fetched rows, which PostgREST caps at
+-- its max-rows setting.
+CREATE OR REPLACE FUNCTION public.get_categorization_metrics(
+    p_user_id UUID,
+    p_since TIMESTAMPTZ
+)
+RETURNS TABLE (
+    provider TEXT,
+    model TEXT,
+    runs BIGINT,
+    failed_runs BIGINT,
+    llm_calls BIGINT,
+    prompt_tokens BIGINT,
+    completion_tokens BIGINT,
+    llm_retries BIGINT,
+    llm_latency_ms BIGINT,
+    categorized_count BIGINT,
+    estimated_cost_usd NUMERIC
+) AS $$
+    SELECT
+        r.provider,
+        r.model,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE r.status = 'failed'),
+        COALESCE(SUM(r.llm_calls), 0),
+        COALESCE(SUM(r.prompt_tokens), 0),
+        COALESCE(SUM(r.completion_tokens), 0),
+        COALESCE(SUM(r.llm_retries), 0),
+        COALESCE(SUM(r.llm_latency_ms), 0),
+        COALESCE(SUM(r.categorized_count), 0),
+        COALESCE(SUM(r.estimated_cost_usd), 0)
+    FROM public.categorization_runs r
+    WHERE r.user_id = p_user_id
+        AND r.created_at >= p_since
+    GROUP BY r.provider, r.model
+    ORDER BY r.provider, r.model;
+$$ LANGUAGE sql STABLE;
+
 -- ============================================================================
 -- Budgets Table
 -- ============================================================================
@@ -254,6 +456,34 @@ CREATE TRIGGER budgets_updated_at
     BEFORE UPDATE ON public.budgets
     FOR EACH ROW EXECUTE FUNCTION public.handle_updated_at();
 
+-- Make a budget the user's default in ONE call: verifies ownership, unsets the
+-- previous default, then sets this one. Returns the updated budget (no rows if
+-- the budget doesn't exist or isn't owned by p_user_id).
+-- Two statements are needed because idx_budgets_default is checked per row.
+CREATE OR REPLACE FUNCTION public.set_default_budget(
+    p_budget_id UUID,
+    p_user_id UUID
+)
+RETURNS SETOF public.budgets AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM public.budgets WHERE id = p_budget_id AND user_id = p_user_id
+    ) THEN
+        RETURN;
+    END IF;
+
+    UPDATE public.budgets
+    SET is_default = FALSE
+    WHERE user_id = p_user_id AND is_default = TRUE AND id <> p_budget_id;
+
+    RETURN QUERY
+    UPDATE public.budgets
+    SET is_default = TRUE
+    WHERE id = p_budget_id AND user_id = p_user_id
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- Budget Accounts Table
 -- ============================================================================
@@ -370,9 +600,13 @@ CREATE TABLE IF NOT EXISTS public.simplefin_transactions (
     description TEXT NOT NULL,
     payee TEXT,
     memo TEXT,
+    merchant_key TEXT,  -- Normalized payee/description (app/utils/merchant.py); NULL if none
 
     pending BOOLEAN NOT NULL DEFAULT FALSE,
 
+    -- SHA-256 of the SimpleFin-sourced fields; syncs skip rows whose hash is unchanged
+    content_hash TEXT,
+
     -- Categorization
     category_id UUID REFERENCES public.categories(id) ON DELETE SET NULL,
     subcategory_id UUID REFERENCES public.subcategories(id) ON DELETE SET NULL,
@@ -399,7 +633,17 @@ CREATE INDEX idx_simplefin_transactions_transaction_date ON public.simplefin_tra
 CREATE INDEX idx_simplefin_transactions_amount ON public.simplefin_transactions(amount);
 CREATE INDEX idx_simplefin_transactions_category_id ON public.simplefin_transactions(category_id);
 CREATE INDEX idx_simplefin_transactions_subcategory_id ON public.simplefin_transactions(subcategory_id);
-CREATE INDEX idx_simplefin_transactions_user_category ON public.simplefin_transactions(user_id, category_id);
+-- Filtered listings: (user_id, filter column, posted_date DESC) matches the listing sort.
+-- category_id also serves the uncategorized-only filter (category_id IS NULL).
+CREATE INDEX idx_simplefin_transactions_user_account ON public.simplefin_transactions(user_id, simplefin_account_id, posted_date DESC);
+CREATE INDEX idx_simplefin_transactions_user_category ON public.simplefin_transactions(user_id, category_id, posted_date DESC);
+CREATE INDEX idx_simplefin_transactions_user_subcategory ON public.simplefin_transactions(user_id, subcategory_id, posted_date DESC);
+CREATE INDEX idx_simplefin_transactions_user_source ON public.simplefin_transactions(user_id, categorization_source, posted_date DESC);
+CREATE INDEX idx_simplefin_transactions_merchant_key ON public.simplefin_transactions(user_id, merchant_key);
+-- Free-text search (search_transactions): trigrams of description + payee, per user.
+-- The expression must match the one in search_transactions for the index to be used.
+CREATE INDEX idx_simplefin_transactions_search ON public.simplefin_transactions
+    USING gin (user_id, (description || ' ' || COALESCE(payee, '')) extensions.gin_trgm_ops);
 
 CREATE TRIGGER simplefin_transactions_updated_at
     BEFORE UPDATE ON public.simplefin_transactions
@@ -447,6 +691,32 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function for batch updating merchant keys (backfill_merchant_keys.py)
+-- Only rows whose key changes are written
+CREATE OR REPLACE FUNCTION public.batch_update_merchant_keys(
+    transaction_ids UUID[],
+    merchant_keys TEXT[]
+)
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    WITH updates AS (
+        SELECT
+            unnest(transaction_ids) AS id,
+            unnest(merchant_keys) AS merchant_key
+    )
+    UPDATE public.simplefin_transactions t
+    SET merchant_key = u.merchant_key
+    FROM updates u
+    WHERE t.id = u.id
+      AND t.merchant_key IS DISTINCT FROM u.merchant_key;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- SimpleFin Sync Jobs Table
 -- ============================================================================
@@ -456,11 +726,29 @@ CREATE TABLE IF NOT EXISTS public.simplefin_sync_jobs (
     simplefin_item_id UUID NOT NULL REFERENCES public.simplefin_items(id) ON DELETE CASCADE,
 
     status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    job_type TEXT NOT NULL DEFAULT 'sync' CHECK (job_type IN ('sync', 'backfill', 'replay')),
+    start_date BIGINT,            -- Requested start of a queued sync (Unix timestamp); NULL = incremental
+
+    -- Backfill plan and checkpoint (job_type = 'backfill')
+    backfill_start_date BIGINT,   -- Unix timestamp, inclusive
+    backfill_end_date BIGINT,     -- Unix timestamp, exclusive
+    window_days INT,
+    completed_windows JSONB NOT NULL DEFAULT '[]'::jsonb,  -- Start timestamps of finished windows
+
+    -- SHA-256 digests of the archived raw SimpleFin payloads this job processed
+    raw_payloads JSONB NOT NULL DEFAULT '[]'::jsonb,
 
     -- Sync results
     accounts_synced INT NOT NULL DEFAULT 0,
     transactions_added INT NOT NULL DEFAULT 0,
     transactions_updated INT NOT NULL DEFAULT 0,
+    transactions_unchanged INT NOT NULL DEFAULT 0,
+
+    -- Live progress, updated while the job runs (poll GET /simplefin/sync-jobs/{id})
+    accounts_processed INT NOT NULL DEFAULT 0,
+    rows_written INT NOT NULL DEFAULT 0,       -- Transactions inserted or updated so far
+    bytes_fetched BIGINT NOT NULL DEFAULT 0,   -- Raw SimpleFin response bytes streamed
+    progress_updated_at TIMESTAMPTZ,
 
     error_message TEXT,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
@@ -479,6 +767,8 @@ CREATE INDEX idx_simplefin_sync_jobs_user_id ON public.simplefin_sync_jobs(user_
 CREATE INDEX idx_simplefin_sync_jobs_item_id ON public.simplefin_sync_jobs(simplefin_item_id);
 CREATE INDEX idx_simplefin_sync_jobs_status ON public.simplefin_sync_jobs(status);
 CREATE INDEX idx_simplefin_sync_jobs_created_at ON public.simplefin_sync_jobs(created_at DESC);
+CREATE INDEX idx_simplefin_sync_jobs_unfinished_backfill ON public.simplefin_sync_jobs(simplefin_item_id, created_at DESC)
+    WHERE job_type = 'backfill' AND status <> 'completed';
 
 -- ============================================================================
 -- Account Balance History Table
@@ -539,7 +829,9 @@ SELECT
     t.subcategory_id,
     t.categorization_source,
     t.created_at,
-    t.updated_at
+    t.updated_at,
+    t.merchant_key,
+    t.posted_date  -- Raw timestamp, so sorts can use the posted_date indexes
 FROM public.simplefin_transactions t
 JOIN public.simplefin_accounts a ON t.simplefin_account_id = a.id;
 
@@ -548,6 +840,96 @@ JOIN public.simplefin_accounts a ON t.simplefin_account_id = a.id;
 -- policies from simplefin_transactions and simplefin_accounts apply properly.
 -- Without this, the view would bypass RLS and expose all users' data!
 
+-- ============================================================================
+-- Transaction Search Function
+-- ============================================================================
+-- Free-text search over description + payee for GET /transactions/search.
+-- Matches substrings (ILIKE) and misspellings (word similarity >=
+-- pg_trgm.word_similarity_threshold), both served by idx_simplefin_transactions_search.
+-- Ranked by word similarity, then most recent first; pages continue after the
+-- (search_rank, posted_date, id) of the previous page's last row (keyset).
+-- Runs as the caller (RLS applies), with the same columns as transactions_view.
+CREATE OR REPLACE FUNCTION public.search_transactions(
+    p_user_id UUID,
+    p_query TEXT,
+    p_min_amount NUMERIC DEFAULT NULL,
+    p_max_amount NUMERIC DEFAULT NULL,
+    p_date_from DATE DEFAULT NULL,   -- Inclusive, on transaction_date (UTC)
+    p_date_to DATE DEFAULT NULL,     -- Inclusive
+    p_after_rank REAL DEFAULT NULL,
+    p_after_posted_date BIGINT DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INT DEFAULT 50
+)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    simplefin_item_id UUID,
+    simplefin_transaction_id TEXT,
+    account_id UUID,
+    account_name TEXT,
+    amount NUMERIC,
+    currency TEXT,
+    date TEXT,
+    posted TIMESTAMPTZ,
+    posted_date BIGINT,
+    description TEXT,
+    payee TEXT,
+    pending BOOLEAN,
+    category_id UUID,
+    subcategory_id UUID,
+    categorization_source TEXT,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    merchant_key TEXT,
+    search_rank REAL
+) AS $$
+    WITH matches AS (
+        SELECT
+            t.*,
+            word_similarity(p_query, t.description || ' ' || COALESCE(t.payee, '')) AS search_rank
+        FROM public.simplefin_transactions t
+        WHERE t.user_id = p_user_id
+          AND (
+              (t.description || ' ' || COALESCE(t.payee, ''))
+                  ILIKE '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%'
+              OR p_query <% (t.description || ' ' || COALESCE(t.payee, ''))
+          )
+          AND (p_min_amount IS NULL OR t.amount >= p_min_amount)
+          AND (p_max_amount IS NULL OR t.amount <= p_max_amount)
+          AND (p_date_from IS NULL OR t.transaction_date >= EXTRACT(EPOCH FROM p_date_from)::BIGINT)
+          AND (p_date_to IS NULL OR t.transaction_date < EXTRACT(EPOCH FROM p_date_to + 1)::BIGINT)
+    )
+    SELECT
+        m.id,
+        m.user_id,
+        a.simplefin_item_id,
+        m.simplefin_transaction_id,
+        m.simplefin_account_id,
+        a.name,
+        m.amount,
+        m.currency,
+        to_char(to_timestamp(m.transaction_date), 'YYYY-MM-DD'),
+        to_timestamp(m.posted_date),
+        m.posted_date,
+        m.description,
+        m.payee,
+        m.pending,
+        m.category_id,
+        m.subcategory_id,
+        m.categorization_source,
+        m.created_at,
+        m.updated_at,
+        m.merchant_key,
+        m.search_rank
+    FROM matches m
+    JOIN public.simplefin_accounts a ON m.simplefin_account_id = a.id
+    WHERE p_after_rank IS NULL
+       OR (m.search_rank, m.posted_date, m.id) < (p_after_rank, p_after_posted_date, p_after_id)
+    ORDER BY m.search_rank DESC, m.posted_date DESC, m.id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE SET search_path = public, extensions;
+
 -- ============================================================================
 -- Goals Table
 -- ============================================================================
@@ -616,3 +998,370 @@ CREATE INDEX idx_goal_accounts_account_id ON public.goal_accounts(simplefin_acco
 CREATE TRIGGER goal_accounts_updated_at
     BEFORE UPDATE ON public.goal_accounts
     FOR EACH ROW EXECUTE FUNCTION public.handle_updated_at();
+
+-- ============================================================================
+-- Worker Leases Table
+-- ============================================================================
+-- Heartbeat leases between background worker processes (python -m app.worker):
+-- 'scheduler' elects the single worker that runs scheduled jobs, and
+-- 'worker:<id>' rows track live workers when items are sharded across them.
+-- Service role only (no RLS policies): workers are not end users.
+CREATE TABLE IF NOT EXISTS public.worker_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,              -- Worker ID (host:pid:nonce)
+    expires_at TIMESTAMPTZ NOT NULL,   -- Free for takeover once this passes
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.worker_leases ENABLE ROW LEVEL SECURITY;
+
+-- Take (or renew) a lease for p_holder if it is free, expired, or already
+-- held by p_holder. Returns the holder afterwards: p_holder on success.
+CREATE OR REPLACE FUNCTION public.acquire_worker_lease(
+    p_name TEXT,
+    p_holder TEXT,
+    p_ttl_seconds INT
+)
+RETURNS TEXT AS $$
+DECLARE
+    v_holder TEXT;
+BEGIN
+    INSERT INTO public.worker_leases (name, holder, expires_at, updated_at)
+    VALUES (p_name, p_holder, NOW() + make_interval(secs => p_ttl_seconds), NOW())
+    ON CONFLICT (name) DO UPDATE
+    SET holder = EXCLUDED.holder,
+        expires_at = EXCLUDED.expires_at,
+        updated_at = NOW()
+    WHERE public.worker_leases.holder = EXCLUDED.holder
+        OR public.worker_leases.expires_at < NOW()
+    RETURNING holder INTO v_holder;
+
+    IF v_holder IS NULL THEN
+        SELECT holder INTO v_holder
+        FROM public.worker_leases
+        WHERE name = p_name;
+    END IF;
+
+    RETURN v_holder;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Institution Circuits Table (SimpleFin circuit breaker state)
+-- ============================================================================
+-- Per-institution circuit breaker shared by every API and worker process
+-- (app/services/circuit_breaker.py). A row exists only while an institution
+-- is failing; closing the circuit deletes it.
+-- Service role only (no RLS policies): circuits are shared across users.
+CREATE TABLE IF NOT EXISTS public.institution_circuits (
+    key TEXT PRIMARY KEY,              -- Institution domain, else SFIN URL
+    state TEXT NOT NULL DEFAULT 'closed' CHECK (state IN ('closed', 'open', 'half_open')),
+    consecutive_failures INT NOT NULL DEFAULT 0,
+    opened_at TIMESTAMPTZ,             -- When it opened, or when the half-open probe started
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.institution_circuits ENABLE ROW LEVEL SECURITY;
+
+-- Check whether a fetch for p_key may proceed. A closed (or missing) circuit
+-- admits it; an open or half-open circuit past its cooldown moves to
+-- half-open and admits exactly one probe (the row lock serializes callers).
+CREATE OR REPLACE FUNCTION public.admit_institution_circuit(
+    p_key TEXT,
+    p_cooldown_seconds INT
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_state TEXT;
+BEGIN
+    UPDATE public.institution_circuits
+    SET state = 'half_open',
+        opened_at = NOW(),
+        updated_at = NOW()
+    WHERE key = p_key
+        AND state <> 'closed'
+        AND opened_at + make_interval(secs => p_cooldown_seconds) <= NOW();
+    IF FOUND THEN
+        RETURN TRUE;
+    END IF;
+
+    SELECT state INTO v_state
+    FROM public.institution_circuits
+    WHERE key = p_key;
+
+    RETURN v_state IS NULL OR v_state = 'closed';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Count a failed fetch for p_key; opens the circuit at p_threshold
+-- consecutive failures, or at once if the failure was the half-open probe.
+CREATE OR REPLACE FUNCTION public.record_institution_circuit_failure(
+    p_key TEXT,
+    p_threshold INT
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO public.institution_circuits AS c (key, consecutive_failures, state, opened_at)
+    VALUES (
+        p_key,
+        1,
+        CASE WHEN p_threshold <= 1 THEN 'open' ELSE 'closed' END,
+        CASE WHEN p_threshold <= 1 THEN NOW() END
+    )
+    ON CONFLICT (key) DO UPDATE
+    SET consecutive_failures = c.consecutive_failures + 1,
+        state = CASE
+            WHEN c.state = 'half_open' OR c.consecutive_failures + 1 >= p_threshold THEN 'open'
+            ELSE c.state
+        END,
+        opened_at = CASE
+            WHEN c.state = 'half_open' OR c.consecutive_failures + 1 >= p_threshold THEN NOW()
+            ELSE c.opened_at
+        END,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Jobs Table (durable background job queue)
+-- ============================================================================
+-- Work for the background worker pool (python -m app.worker). Workers claim
+-- jobs with claim_jobs() (FOR UPDATE SKIP LOCKED, so concurrent workers never
+-- claim the same job), heartbeat their lease while running, then complete or
+-- fail them. Failed jobs are retried with backoff up to max_attempts, and a
+-- job whose lease expires (crashed worker) is claimed again by another worker.
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,  -- Owner (NULL for system jobs)
+    job_type TEXT NOT NULL CHECK (job_type IN ('simplefin_sync', 'balance_refresh', 'snapshot', 'categorization')),
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+    priority INT NOT NULL DEFAULT 0,          -- Higher runs first
+    dedupe_key TEXT,                          -- At most one queued/running job per key
+    attempts INT NOT NULL DEFAULT 0,          -- Claims so far (including crashed ones)
+    max_attempts INT NOT NULL DEFAULT 3,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),  -- Not claimable before this (retry backoff)
+    locked_by TEXT,                           -- Worker ID holding the lease
+    locked_until TIMESTAMPTZ,                 -- Lease expiry; reclaimable after this
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMPTZ
+);
+
+ALTER TABLE public.jobs ENABLE ROW LEVEL SECURITY;
+GRANT SELECT ON public.jobs TO authenticated;
+
+-- Users can watch their own jobs. Only the service role enqueues, claims and
+-- updates them: workers run with the service role and act on the payload, so
+-- a user-inserted job could make them touch another user's data.
+CREATE POLICY "Users can view own jobs"
+    ON public.jobs FOR SELECT
+    USING ((SELECT auth.uid()) = user_id);
+
+CREATE INDEX idx_jobs_user_id ON public.jobs(user_id);
+CREATE INDEX idx_jobs_claimable ON public.jobs(priority DESC, run_after) WHERE status = 'queued';
+CREATE INDEX idx_jobs_running_lease ON public.jobs(locked_until) WHERE status = 'running';
+CREATE UNIQUE INDEX idx_jobs_active_dedupe_key ON public.jobs(dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+
+CREATE TRIGGER jobs_updated_at
+    BEFORE UPDATE ON public.jobs
+    FOR EACH ROW EXECUTE FUNCTION public.handle_updated_at();
+
+-- Enqueue a job; with a dedupe_key, returns the already queued/running job
+-- for that key instead of adding another (backpressure for periodic work).
+CREATE OR REPLACE FUNCTION public.enqueue_job(
+    p_job_type TEXT,
+    p_payload JSONB DEFAULT '{}'::jsonb,
+    p_user_id UUID DEFAULT NULL,
+    p_dedupe_key TEXT DEFAULT NULL,
+    p_priority INT DEFAULT 0,
+    p_delay_seconds INT DEFAULT 0,
+    p_max_attempts INT DEFAULT 3
+)
+RETURNS UUID AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    INSERT INTO public.jobs (user_id, job_type, payload, dedupe_key, priority, run_after, max_attempts)
+    VALUES (
+        p_user_id,
+        p_job_type,
+        p_payload,
+        p_dedupe_key,
+        p_priority,
+        NOW() + make_interval(secs => p_delay_seconds),
+        p_max_attempts
+    )
+    ON CONFLICT (dedupe_key) WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running')
+    DO NOTHING
+    RETURNING id INTO v_id;
+
+    IF v_id IS NULL THEN
+        SELECT id INTO v_id
+        FROM public.jobs
+        WHERE dedupe_key = p_dedupe_key
+            AND status IN ('queued', 'running');
+    END IF;
+
+    RETURN v_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Claim up to p_limit runnable jobs of the given types for p_worker.
+-- Runnable: queued and due, or running with an expired lease (crashed worker).
+-- SKIP LOCKED lets many workers claim concurrently without blocking or
+-- double-claiming.
+CREATE OR REPLACE FUNCTION public.claim_jobs(
+    p_worker TEXT,
+    p_job_types TEXT[],
+    p_limit INT,
+    p_lease_seconds INT
+)
+RETURNS SETOF public.jobs AS $$
+BEGIN
+    -- Expired leases on jobs that used up their attempts are failed, not retried
+    UPDATE public.jobs
+    SET status = 'failed',
+        completed_at = NOW(),
+        locked_by = NULL,
+        locked_until = NULL,
+        last_error = 'Lease expired after ' || attempts || ' attempt(s); worker presumed dead'
+    WHERE status = 'running'
+        AND locked_until < NOW()
+        AND attempts >= max_attempts;
+
+    RETURN QUERY
+    UPDATE public.jobs j
+    SET status = 'running',
+        locked_by = p_worker,
+        locked_until = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = j.attempts + 1
+    FROM (
+        SELECT id
+        FROM public.jobs
+        WHERE job_type = ANY(p_job_types)
+            AND (
+                (status = 'queued' AND run_after <= NOW())
+                OR (status = 'running' AND locked_until < NOW())
+            )
+        ORDER BY priority DESC, run_after
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ) claimable
+    WHERE j.id = claimable.id
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Extend a running job's lease. FALSE if p_worker no longer holds it.
+CREATE OR REPLACE FUNCTION public.heartbeat_job(
+    p_job_id UUID,
+    p_worker TEXT,
+    p_lease_seconds INT
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE public.jobs
+    SET locked_until = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE id = p_job_id
+        AND locked_by = p_worker
+        AND status = 'running';
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mark a running job completed. FALSE if p_worker no longer holds it.
+CREATE OR REPLACE FUNCTION public.complete_job(
+    p_job_id UUID,
+    p_worker TEXT,
+    p_result JSONB DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE public.jobs
+    SET status = 'completed',
+        result = p_result,
+        last_error = NULL,
+        completed_at = NOW(),
+        locked_by = NULL,
+        locked_until = NULL
+    WHERE id = p_job_id
+        AND locked_by = p_worker
+        AND status = 'running';
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Record a failed attempt. Requeues the job after p_retry_delay_seconds while
+-- it has attempts left (NULL delay = don't retry). Returns the new status,
+-- or NULL if p_worker no longer holds the job.
+CREATE OR REPLACE FUNCTION public.fail_job(
+    p_job_id UUID,
+    p_worker TEXT,
+    p_error TEXT,
+    p_retry_delay_seconds INT DEFAULT NULL
+)
+RETURNS TEXT AS $$
+DECLARE
+    v_status TEXT;
+BEGIN
+    UPDATE public.jobs
+    SET status = CASE
+            WHEN p_retry_delay_seconds IS NOT NULL AND attempts < max_attempts THEN 'queued'
+            ELSE 'failed'
+        END,
+        run_after = CASE
+            WHEN p_retry_delay_seconds IS NOT NULL AND attempts < max_attempts
+                THEN NOW() + make_interval(secs => p_retry_delay_seconds)
+            ELSE run_after
+        END,
+        completed_at = CASE
+            WHEN p_retry_delay_seconds IS NOT NULL AND attempts < max_attempts THEN NULL
+            ELSE NOW()
+        END,
+        last_error = p_error,
+        locked_by = NULL,
+        locked_until = NULL
+    WHERE id = p_job_id
+        AND locked_by = p_worker
+        AND status = 'running'
+    RETURNING status INTO v_status;
+
+    RETURN v_status;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hand a running job back to the queue without using up an attempt (worker
+-- shutting down). FALSE if p_worker no longer holds it.
+CREATE OR REPLACE FUNCTION public.release_job(
+    p_job_id UUID,
+    p_worker TEXT
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE public.jobs
+    SET status = 'queued',
+        attempts = GREATEST(attempts - 1, 0),  -- Undo this claim's increment
+        run_after = NOW(),
+        locked_by = NULL,
+        locked_until = NULL
+    WHERE id = p_job_id
+        AND locked_by = p_worker
+        AND status = 'running';
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Queue functions are for the service role only (API enqueue and workers)
+REVOKE EXECUTE ON FUNCTION public.enqueue_job(TEXT, JSONB, UUID, TEXT, INT, INT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_jobs(TEXT, TEXT[], INT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.heartbeat_job(UUID, TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_job(UUID, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.fail_job(UUID, TEXT, TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.release_job(UUID, TEXT) FROM PUBLIC, anon, authenticated;
@@ -29,16 +29,23 @@ DROP TABLE IF EXISTS public.budget_accounts CASCADE;
 DROP TABLE IF EXISTS public.budgets CASCADE;
 
 -- Categorization tables
+DROP TABLE IF EXISTS public.categorization_runs CASCADE;
 DROP TABLE IF EXISTS public.categorization_rules CASCADE;
 DROP TABLE IF EXISTS public.categorization_feedback CASCADE;
 DROP TABLE IF EXISTS public.subcategories CASCADE;
 DROP TABLE IF EXISTS public.categories CASCADE;
 
+-- Background worker tables
+DROP TABLE IF EXISTS public.jobs CASCADE;
+DROP TABLE IF EXISTS public.worker_leases CASCADE;
+DROP TABLE IF EXISTS public.institution_circuits CASCADE;
+
 -- SimpleFin tables (most dependent first)
 DROP TABLE IF EXISTS public.simplefin_sync_jobs CASCADE;
 DROP TABLE IF EXISTS public.account_balance_history CASCADE;
 DROP TABLE IF EXISTS public.simplefin_transactions CASCADE;
 DROP TABLE IF EXISTS public.simplefin_accounts CASCADE;
+DROP TABLE IF EXISTS public.simplefin_item_sync_state CASCADE;
 DROP TABLE IF EXISTS public.simplefin_items CASCADE;
 
 -- Old Budget Template tables (from previous schema - safe to drop if they exist)
@@ -54,6 +61,22 @@ DROP TABLE IF EXISTS public.budget_templates CASCADE;
 
 DROP FUNCTION IF EXISTS public.batch_update_transaction_categories(UUID[], UUID[], UUID[]) CASCADE;
 DROP FUNCTION IF EXISTS public.batch_update_transaction_categories(UUID[], UUID[], UUID[], TEXT[]) CASCADE;
+DROP FUNCTION IF EXISTS public.batch_update_merchant_keys(UUID[], TEXT[]) CASCADE;
+DROP FUNCTION IF EXISTS public.get_categorization_metrics(UUID, TIMESTAMPTZ) CASCADE;
+DROP FUNCTION IF EXISTS public.search_transactions(UUID, TEXT, NUMERIC, NUMERIC, DATE, DATE, REAL, BIGINT, UUID, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.set_default_budget(UUID, UUID) CASCADE;
+DROP FUNCTION IF EXISTS public.reserve_simplefin_request(UUID, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.acquire_simplefin_sync_lease(UUID, UUID, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.release_simplefin_sync_lease(UUID, UUID) CASCADE;
+DROP FUNCTION IF EXISTS public.acquire_worker_lease(TEXT, TEXT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.admit_institution_circuit(TEXT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.record_institution_circuit_failure(TEXT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.enqueue_job(TEXT, JSONB, UUID, TEXT, INT, INT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.claim_jobs(TEXT, TEXT[], INT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.heartbeat_job(UUID, TEXT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.complete_job(UUID, TEXT, JSONB) CASCADE;
+DROP FUNCTION IF EXISTS public.fail_job(UUID, TEXT, TEXT, INT) CASCADE;
+DROP FUNCTION IF EXISTS public.release_job(UUID, TEXT) CASCADE;
 DROP FUNCTION IF EXISTS public.handle_updated_at() CASCADE;
 
 -- ============================================================================
@@ -76,8 +99,12 @@ WHERE schemaname = 'public'
         'budgets',
         -- Categorization tables
         'categorization_rules',
+        'categorization_runs',
         'subcategories',
         'categories',
+        -- Background worker tables
+        'jobs',
+        'worker_leases',
         -- SimpleFin tables
         'simplefin_sync_jobs',
         'account_balance_history',
@@ -12,6 +12,18 @@ load_dotenv()
 # Set test environment before importing app
 os.environ["APP_ENV"] = "testing"
 
+# Placeholders so unit tests can build Settings without real credentials.
+# Integration tests still need the real values (from .env, loaded above).
+for _key in (
+    "SUPABASE_URL",
+    "SUPABASE_SECRET_KEY",
+    "SUPABASE_PUBLISHABLE_KEY",
+    "PLAID_CLIENT_ID",
+    "PLAID_SECRET",
+    "ENCRYPTION_KEY",
+):
+    os.environ.setdefault(_key, "http://localhost" if _key == "SUPABASE_URL" else "test")
+
 
 @pytest.fixture(scope="session")
 def test_settings():
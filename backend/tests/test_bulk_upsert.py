@@ -0,0 +1,110 @@
+"""Unit tests for chunked bulk upserts (fake PostgREST client)."""
+
+import threading
+import time
+
+from app.database import Database
+from app.services import simplefin_service
+
+
+class FakeUpsertClient:
+    """Mimics client.table(...).upsert(...).execute() for bulk_upsert.
+
+    Chunks containing a row with "bad": True raise like a PostgREST error.
+    Later chunks finish first, so results arrive out of order.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict):
+        return FakeUpsertRequest(self, list(rows), on_conflict)
+
+
+class FakeUpsertRequest:
+    def __init__(self, client, rows, on_conflict):
+        self.client = client
+        self.rows = rows
+        self.on_conflict = on_conflict
+
+    def execute(self):
+        client = self.client
+        with client._lock:
+            client.requests.append((self.rows, self.on_conflict))
+            client.in_flight += 1
+            client.max_in_flight = max(client.max_in_flight, client.in_flight)
+        try:
+            time.sleep(0.01 + 0.02 / (1 + self.rows[0]["n"]))
+            if any(row.get("bad") for row in self.rows):
+                raise RuntimeError("invalid input syntax for type numeric")
+            return type("Response", (), {"data": [dict(row) for row in self.rows]})
+        finally:
+            with client._lock:
+                client.in_flight -= 1
+
+
+def make_rows(count: int, bad: set[int] = frozenset()) -> list[dict]:
+    return [{"n": n, **({"bad": True} if n in bad else {})} for n in range(count)]
+
+
+class TestBulkUpsert:
+    """Test chunking, ordering and per-chunk failures."""
+
+    def test_01_empty_makes_no_requests(self):
+        """Test nothing is sent for an empty row list."""
+        client = FakeUpsertClient()
+        result = Database(client).bulk_upsert("t", [], on_conflict="id")
+        assert result == {"rows": [], "failed_chunks": []}
+        assert client.requests == []
+
+    def test_02_chunks_in_input_order(self):
+        """Test rows are split into chunks and returned in input order."""
+        client = FakeUpsertClient()
+        result = Database(client).bulk_upsert(
+            "t", make_rows(10), on_conflict="id", chunk_size=3, max_concurrency=4
+        )
+        assert sorted(len(rows) for rows, _ in client.requests) == [1, 3, 3, 3]
+        assert {on_conflict for _, on_conflict in client.requests} == {"id"}
+        assert [row["n"] for row in result["rows"]] == list(range(10))
+        assert result["failed_chunks"] == []
+
+    def test_03_failed_chunk_does_not_stop_others(self):
+        """Test a bad row fails only its own chunk, which is reported."""
+        client = FakeUpsertClient()
+        result = Database(client).bulk_upsert(
+            "t", make_rows(10, bad={4}), on_conflict="id", chunk_size=3
+        )
+        assert [row["n"] for row in result["rows"]] == [0, 1, 2, 6, 7, 8, 9]
+        assert result["failed_chunks"] == [
+            {"chunk": 1, "rows": 3, "error": "invalid input syntax for type numeric"}
+        ]
+        assert simplefin_service.describe_failed_chunks(
+            "transactions", result["failed_chunks"]
+        ) == [
+            "Failed to write 3 transactions (chunk 1): "
+            "invalid input syntax for type numeric"
+        ]
+
+    def test_04_all_chunks_fail(self):
+        """Test every failure is reported, in chunk order, with no rows."""
+        client = FakeUpsertClient()
+        result = Database(client).bulk_upsert(
+            "t", make_rows(4, bad={0, 2}), on_conflict="id", chunk_size=2
+        )
+        assert result["rows"] == []
+        assert [c["chunk"] for c in result["failed_chunks"]] == [0, 1]
+
+    def test_05_concurrency_bounded(self):
+        """Test no more than max_concurrency requests are in flight."""
+        client = FakeUpsertClient()
+        Database(client).bulk_upsert(
+            "t", make_rows(12), on_conflict="id", chunk_size=1, max_concurrency=3
+        )
+        assert len(client.requests) == 12
+        assert 1 < client.max_in_flight <= 3
@@ -0,0 +1,238 @@
+"""Unit tests for the per-institution circuit breaker (fake circuit store)."""
+
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app.services import circuit_breaker, simplefin_sync_service
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class FakeCircuitDB:
+    """Stands in for the institution_circuits RPCs; records every call."""
+
+    def __init__(self, circuits: dict | None = None, admit: dict | None = None):
+        self.circuits = circuits or {}
+        self.admit = admit or {}
+        self.calls = []
+
+    def admit_institution_circuit(self, key, cooldown_seconds):
+        self.calls.append(("admit", key, cooldown_seconds))
+        return self.admit.get(key, True)
+
+    def record_institution_circuit_failure(self, key, threshold):
+        self.calls.append(("failure", key, threshold))
+
+    def close_institution_circuit(self, key):
+        self.calls.append(("close", key))
+
+    def get_institution_circuits(self, keys):
+        return [self.circuits[key] for key in keys if key in self.circuits]
+
+
+class BrokenDB:
+    """A circuit store that can't be reached."""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+
+        return fail
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A breaker (threshold 3, cooldown 900s) over a fake circuit store."""
+    db = FakeCircuitDB()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=900)
+    monkeypatch.setattr(breaker, "_db", lambda: db)
+    breaker.db = db
+    return breaker
+
+
+class TestCircuitBreaker:
+    """Test the breaker's calls into the shared circuit store."""
+
+    def test_01_passes_threshold_and_cooldown(self, breaker):
+        """Test the store gets the configured threshold and cooldown."""
+        breaker.allow("bank.com")
+        breaker.record_failure("bank.com")
+        breaker.record_success("bank.com")
+        assert breaker.db.calls == [
+            ("admit", "bank.com", 900),
+            ("failure", "bank.com", 3),
+            ("close", "bank.com"),
+        ]
+
+    def test_02_denied_by_store(self, breaker):
+        """Test allow() reports the store's decision."""
+        breaker.db.admit = {"bank.com": False}
+        assert breaker.allow("bank.com") is False
+        assert breaker.allow("other.com") is True
+
+    def test_03_fails_open(self, monkeypatch):
+        """Test an unreachable store allows fetches and swallows records."""
+        breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=900)
+        monkeypatch.setattr(breaker, "_db", lambda: BrokenDB())
+        assert breaker.allow("bank.com") is True
+        breaker.record_failure("bank.com")
+        breaker.record_success("bank.com")
+
+
+class TestCircuitState:
+    """Test how stored circuits are reported."""
+
+    def test_01_no_row_is_closed(self, breaker):
+        """Test an institution without a row is closed with no failures."""
+        assert breaker.state("bank.com") == {
+            "key": "bank.com",
+            "state": "closed",
+            "consecutive_failures": 0,
+            "opened_at": None,
+            "retry_at": None,
+        }
+
+    def test_02_open_within_cooldown(self, breaker):
+        """Test an open circuit reports when it will admit a probe."""
+        opened_at = time.time() - 60
+        breaker.db.circuits["bank.com"] = {
+            "key": "bank.com",
+            "state": "open",
+            "consecutive_failures": 3,
+            "opened_at": iso(opened_at),
+        }
+        state = breaker.state("bank.com")
+        assert state["state"] == "open"
+        assert state["consecutive_failures"] == 3
+        assert state["retry_at"] == pytest.approx(opened_at + 900, abs=1)
+
+    def test_03_open_past_cooldown_is_half_open(self, breaker):
+        """Test an open circuit past its cooldown is reported half-open."""
+        breaker.db.circuits["bank.com"] = {
+            "key": "bank.com",
+            "state": "open",
+            "consecutive_failures": 3,
+            "opened_at": iso(time.time() - 901),
+        }
+        assert breaker.state("bank.com")["state"] == "half_open"
+
+    def test_04_states_for_many_keys(self, breaker):
+        """Test states() returns every requested key, stored or not."""
+        breaker.db.circuits["a.com"] = {
+            "key": "a.com",
+            "state": "closed",
+            "consecutive_failures": 1,
+            "opened_at": None,
+        }
+        states = breaker.states(["a.com", "b.com"])
+        assert states["a.com"]["consecutive_failures"] == 1
+        assert states["b.com"]["state"] == "closed"
+
+
+@pytest.fixture
+def sync_breaker(monkeypatch, breaker):
+    """Route the sync service's breaker calls to the fake store."""
+    monkeypatch.setattr(simplefin_sync_service, "institution_breaker", breaker)
+    return breaker
+
+
+def http_status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://bridge.example.com/accounts")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+class TestFetchOutcomes:
+    """Test which fetch outcomes count for or against an institution."""
+
+    def test_01_outages_count_as_failures(self, sync_breaker):
+        """Test transport errors and 5xx count against every institution."""
+        simplefin_sync_service._record_fetch_failure(
+            ["a.com", "b.com"], httpx.ConnectError("refused")
+        )
+        simplefin_sync_service._record_fetch_failure(["a.com"], http_status_error(502))
+        assert sync_breaker.db.calls == [
+            ("failure", "a.com", 3),
+            ("failure", "b.com", 3),
+            ("failure", "a.com", 3),
+        ]
+
+    def test_02_client_errors_do_not_count(self, sync_breaker):
+        """Test a 4xx (e.g. revoked access) is not an institution outage."""
+        simplefin_sync_service._record_fetch_failure(["a.com"], http_status_error(403))
+        assert sync_breaker.db.calls == []
+
+    def test_03_missing_institution_with_errors_fails(self, sync_breaker):
+        """Test institutions missing from a payload with errors count as failed."""
+        accounts = [{"org": {"domain": "a.com"}}]
+        simplefin_sync_service._record_fetch_outcome(
+            ["a.com", "b.com"], accounts, ["Connection to b.com failed"]
+        )
+        assert sync_breaker.db.calls == [("close", "a.com"), ("failure", "b.com", 3)]
+
+    def test_04_missing_institution_without_errors_closes(self, sync_breaker):
+        """Test an institution with no accounts but no errors is healthy."""
+        simplefin_sync_service._record_fetch_outcome(["a.com"], [], [])
+        assert sync_breaker.db.calls == [("close", "a.com")]
+
+
+class FakeAccountsDB:
+    def __init__(self, accounts):
+        self.accounts = accounts
+
+    def get_simplefin_accounts_by_item(self, item_id):
+        return self.accounts
+
+
+class TestAdmitInstitutions:
+    """Test admitting an item's fetch based on its institutions' circuits."""
+
+    def test_01_admits_open_subset(self, sync_breaker):
+        """Test a fetch proceeds while any institution is admitted."""
+        sync_breaker.db.admit = {"a.com": False}
+        db = FakeAccountsDB(
+            [{"organization_domain": "a.com"}, {"organization_domain": "b.com"}]
+        )
+        assert simplefin_sync_service._admit_institutions(db, {"id": "item"}) == [
+            "b.com"
+        ]
+
+    def test_02_all_open_raises(self, sync_breaker):
+        """Test an item whose institutions are all open fails fast."""
+        opened_at = time.time() - 60
+        sync_breaker.db.admit = {"a.com": False}
+        sync_breaker.db.circuits["a.com"] = {
+            "key": "a.com",
+            "state": "open",
+            "consecutive_failures": 3,
+            "opened_at": iso(opened_at),
+        }
+        db = FakeAccountsDB([{"organization_domain": "a.com"}])
+        with pytest.raises(CircuitOpenError) as error:
+            simplefin_sync_service._admit_institutions(db, {"id": "item"})
+        assert error.value.institutions == ["a.com"]
+        assert error.value.retry_at == pytest.approx(opened_at + 900, abs=1)
+
+    def test_03_first_sync_admitted(self, sync_breaker):
+        """Test an item without stored accounts is always admitted."""
+        assert simplefin_sync_service._admit_institutions(
+            FakeAccountsDB([]), {"id": "item"}
+        ) == []
+
+
+def test_institution_key_prefers_domain():
+    """Test the breaker key is the domain, falling back to the SFIN URL."""
+    assert circuit_breaker.institution_key(
+        {"organization_domain": "a.com", "organization_sfin_url": "https://sfin"}
+    ) == "a.com"
+    assert circuit_breaker.institution_key({"organization_sfin_url": "https://sfin"}) == (
+        "https://sfin"
+    )
+    assert circuit_breaker.institution_key({}) is None
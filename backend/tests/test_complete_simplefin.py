@@ -1060,3 +1060,61 @@ class TestCompleteSimplefinFlow:
         print(f"   ✅ Found {data['total']} budget(s)")
         for b in data["items"]:
             print(f"      - {b['name']} (default: {b['is_default']})")
+
+    # =========================================
+    # Step 28: Search transactions
+    # =========================================
+    def test_28_search_transactions(self):
+        """Search synced transactions by description and page through the results."""
+        if not self.access_token:
+            pytest.skip("Not logged in - run test_01_login first")
+
+        response = self.client.get(
+            f"{self.base_url}/transactions",
+            params={"limit": 20},
+            headers=self.get_headers(),
+        )
+        assert response.status_code == 200
+        words = [
+            (txn["id"], word)
+            for txn in response.json()["items"]
+            for word in txn["description"].split()
+            if len(word) >= 4 and word.isalpha()
+        ]
+        if not words:
+            pytest.skip("No transaction descriptions to search for")
+        transaction_id, term = words[0]
+
+        print(f"\n🔎 Searching transactions for '{term}'...")
+
+        response = self.client.get(
+            f"{self.base_url}/transactions/search",
+            params={"q": term, "limit": 200},
+            headers=self.get_headers(),
+        )
+        assert response.status_code == 200, f"Search failed: {response.json()}"
+        results = response.json()["items"]
+        assert transaction_id in [r["id"] for r in results]
+        ranks = [r["search_rank"] for r in results]
+        assert ranks == sorted(ranks, reverse=True), "Results not best match first"
+
+        # Keyset pages of 1 must return the same rows, each once
+        paged, cursor = [], None
+        while len(paged) < min(len(results), 5):
+            params = {"q": term, "limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get(
+                f"{self.base_url}/transactions/search",
+                params=params,
+                headers=self.get_headers(),
+            )
+            assert response.status_code == 200
+            page = response.json()
+            paged.extend(r["id"] for r in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert paged == [r["id"] for r in results[: len(paged)]]
+
+        print(f"   ✅ Found {len(results)} match(es), paging is consistent")
@@ -0,0 +1,216 @@
+"""Unit tests for the job worker pool (in-memory job store, no database)."""
+
+import asyncio
+
+import pytest
+
+from app.services import job_queue
+from app.services.job_queue import JobWorkerPool, NonRetryableJobError
+
+
+class FakeJobDB:
+    """Records the job RPCs the worker pool makes."""
+
+    def __init__(self, jobs: list[dict] | None = None, lease_held: bool = True):
+        self.queued = list(jobs or [])
+        self.lease_held = lease_held
+        self.claims = []
+        self.completed = {}
+        self.failed = {}
+        self.released = []
+        self.heartbeats = 0
+
+    def claim_jobs(self, worker_id, job_types, limit, lease_seconds):
+        self.claims.append(limit)
+        claimed, self.queued = self.queued[:limit], self.queued[limit:]
+        return claimed
+
+    def heartbeat_job(self, job_id, worker_id, lease_seconds):
+        self.heartbeats += 1
+        return self.lease_held
+
+    def complete_job(self, job_id, worker_id, result_data=None):
+        self.completed[job_id] = result_data
+        return True
+
+    def fail_job(self, job_id, worker_id, error, retry_delay_seconds=None):
+        self.failed[job_id] = (error, retry_delay_seconds)
+        return "queued" if retry_delay_seconds is not None else "failed"
+
+    def release_job(self, job_id, worker_id):
+        self.released.append(job_id)
+        return True
+
+
+def make_job(job_id: str, job_type: str = "test", attempts: int = 1) -> dict:
+    return {"id": job_id, "job_type": job_type, "payload": {}, "attempts": attempts}
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Replace the registered handlers with test ones."""
+    registry = {}
+    monkeypatch.setattr(job_queue, "JOB_HANDLERS", registry)
+    return registry
+
+
+def make_pool(db: FakeJobDB, concurrency: int = 2) -> JobWorkerPool:
+    pool = JobWorkerPool(db, "worker-1")
+    pool.concurrency = concurrency
+    pool.lease_seconds = 60
+    pool.poll_seconds = 0.01
+    pool.retry_backoff_seconds = 30
+    return pool
+
+
+class TestExecute:
+    """Test how a job's outcome is recorded."""
+
+    async def test_01_result_completes_job(self, handlers):
+        """Test a handler's return value is stored on the completed job."""
+
+        async def handler(db, job):
+            return {"done": job["id"]}
+
+        handlers["test"] = handler
+        db = FakeJobDB()
+        await make_pool(db)._execute(make_job("job-1"))
+        assert db.completed == {"job-1": {"done": "job-1"}}
+        assert db.failed == {}
+
+    async def test_02_error_retried_with_backoff(self, handlers):
+        """Test a failure is requeued with a delay doubling per attempt."""
+
+        async def handler(db, job):
+            raise RuntimeError("bridge down")
+
+        handlers["test"] = handler
+        db = FakeJobDB()
+        pool = make_pool(db)
+        await pool._execute(make_job("job-1", attempts=1))
+        await pool._execute(make_job("job-3", attempts=3))
+        assert db.failed == {
+            "job-1": ("bridge down", 30),
+            "job-3": ("bridge down", 120),
+        }
+
+    async def test_03_non_retryable_error_fails_at_once(self, handlers):
+        """Test NonRetryableJobError fails the job without a retry delay."""
+
+        async def handler(db, job):
+            raise NonRetryableJobError("item not found")
+
+        handlers["test"] = handler
+        db = FakeJobDB()
+        await make_pool(db)._execute(make_job("job-1"))
+        assert db.failed == {"job-1": ("item not found", None)}
+
+    async def test_04_cancel_releases_job(self, handlers):
+        """Test a cancelled job is released for another worker, not failed."""
+        started = asyncio.Event()
+
+        async def handler(db, job):
+            started.set()
+            await asyncio.Event().wait()
+
+        handlers["test"] = handler
+        db = FakeJobDB()
+        task = asyncio.create_task(make_pool(db)._execute(make_job("job-1")))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert db.released == ["job-1"]
+        assert db.completed == {} and db.failed == {}
+
+    async def test_05_lost_lease_cancels_job(self, handlers):
+        """Test a job whose lease was taken over stops and is released."""
+
+        async def handler(db, job):
+            await asyncio.Event().wait()
+
+        handlers["test"] = handler
+        db = FakeJobDB(lease_held=False)
+        pool = make_pool(db)
+        pool.lease_seconds = 0.03  # Heartbeat every 10 ms
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(pool._execute(make_job("job-1")), timeout=1)
+        assert db.heartbeats == 1
+        assert db.released == ["job-1"]
+
+
+class TestRun:
+    """Test claiming and shutdown."""
+
+    async def test_01_claims_only_free_slots(self, handlers):
+        """Test the pool never claims more jobs than it can run at once."""
+        release = asyncio.Event()
+        running = []
+
+        async def handler(db, job):
+            running.append(job["id"])
+            await release.wait()
+
+        handlers["test"] = handler
+        db = FakeJobDB([make_job(f"job-{i}") for i in range(5)])
+        stop = asyncio.Event()
+        pool_task = asyncio.create_task(make_pool(db, concurrency=2).run(stop))
+
+        await asyncio.sleep(0.05)
+        assert running == ["job-0", "job-1"]
+        assert db.claims[0] == 2
+        assert all(limit <= 2 for limit in db.claims)
+
+        release.set()
+        for _ in range(100):
+            if len(db.completed) == 5:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.wait_for(pool_task, timeout=1)
+        assert sorted(db.completed) == [f"job-{i}" for i in range(5)]
+
+    async def test_02_stop_releases_running_jobs(self, handlers):
+        """Test shutdown cancels in-flight jobs and releases them."""
+
+        async def handler(db, job):
+            await asyncio.Event().wait()
+
+        handlers["test"] = handler
+        db = FakeJobDB([make_job("job-1")])
+        stop = asyncio.Event()
+        pool_task = asyncio.create_task(make_pool(db).run(stop))
+        await asyncio.sleep(0.05)
+
+        stop.set()
+        await asyncio.wait_for(pool_task, timeout=1)
+        assert db.released == ["job-1"]
+        assert db.completed == {} and db.failed == {}
+
+    async def test_03_claim_error_keeps_polling(self, handlers):
+        """Test a failed claim is logged and retried on the next poll."""
+
+        async def handler(db, job):
+            return None
+
+        handlers["test"] = handler
+        db = FakeJobDB([make_job("job-1")])
+        claim_jobs = db.claim_jobs
+        calls = []
+
+        def flaky_claim(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise ConnectionError("PostgREST unavailable")
+            return claim_jobs(*args)
+
+        db.claim_jobs = flaky_claim
+        stop = asyncio.Event()
+        pool_task = asyncio.create_task(make_pool(db).run(stop))
+        for _ in range(100):
+            if db.completed:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.wait_for(pool_task, timeout=1)
+        assert db.completed == {"job-1": None}
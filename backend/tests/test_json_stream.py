@@ -0,0 +1,80 @@
+"""Unit tests for incremental JSON array parsing."""
+
+import json
+
+from app.utils.json_stream import JSONArrayStream
+
+ELEMENTS = [
+    {"id": "t1", "category": "Food"},
+    {"id": "t2", "category": "Transport", "note": 'He said "hi" [ok] {x}'},
+    {"id": "t3", "category": "Bills", "nested": {"confidence": 0.9}},
+]
+
+
+def feed_all(parser: JSONArrayStream, chunks: list[str]) -> list:
+    elements = []
+    for chunk in chunks:
+        elements.extend(parser.feed(chunk))
+    return elements
+
+
+def chunked(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class TestJSONArrayStream:
+    """Test parsing a JSON array that arrives in chunks."""
+
+    def test_01_whole_array(self):
+        """Test an array fed in one chunk yields every element."""
+        parser = JSONArrayStream()
+        assert parser.feed(json.dumps(ELEMENTS)) == ELEMENTS
+        assert parser.complete
+        assert parser.count == 3
+
+    def test_02_split_mid_object(self):
+        """Test elements split across chunks are returned once complete."""
+        text = json.dumps(ELEMENTS)
+        for size in (1, 3, 7, 20):
+            parser = JSONArrayStream()
+            assert feed_all(parser, chunked(text, size)) == ELEMENTS
+            assert parser.complete
+
+    def test_03_returns_elements_as_they_complete(self):
+        """Test the first element is returned before the rest arrives."""
+        parser = JSONArrayStream()
+        assert parser.feed('[{"id": "t1"}, {"id": "t') == [{"id": "t1"}]
+        assert parser.feed('2"}') == [{"id": "t2"}]
+        assert parser.feed("]") == []
+        assert parser.complete
+
+    def test_04_escaped_quotes_and_brackets_in_strings(self):
+        """Test quotes, brackets and braces inside strings don't end elements."""
+        parser = JSONArrayStream()
+        chunks = ['[{"note": "a \\"}', '\\" b ]', ' c"}]']
+        assert feed_all(parser, chunks) == [{"note": 'a "}" b ] c'}]
+        assert parser.complete
+
+    def test_05_ignores_code_fence(self):
+        """Test text before the opening bracket is skipped."""
+        parser = JSONArrayStream()
+        chunks = ["```js", "on\n", '[{"id": "t1"}]', "\n```"]
+        assert feed_all(parser, chunks) == [{"id": "t1"}]
+        assert parser.complete
+        assert parser.feed('[{"id": "t2"}]') == []
+
+    def test_06_truncated_stream(self):
+        """Test a truncated stream keeps completed elements and the remainder."""
+        parser = JSONArrayStream()
+        elements = feed_all(parser, ['[{"id": "t1"}, {"id": "t2"},', ' {"id": "t'])
+        assert elements == [{"id": "t1"}, {"id": "t2"}]
+        assert not parser.complete
+        assert parser.count == 2
+        assert parser.pending == '{"id": "t'
+
+    def test_07_empty_array(self):
+        """Test an empty array completes with no elements."""
+        parser = JSONArrayStream()
+        assert parser.feed("[ ]") == []
+        assert parser.complete
+        assert parser.count == 0
@@ -0,0 +1,53 @@
+"""Unit tests for merchant normalization."""
+
+import pytest
+
+from app.utils.merchant import normalize_merchant
+
+
+class TestNormalizeMerchant:
+    """Test mapping payees and bank descriptions to merchant keys."""
+
+    def test_01_store_numbers_collapse(self):
+        """Test the same merchant with different store numbers gets one key."""
+        assert normalize_merchant("SQ *BLUE BOTTLE 0423") == "blue bottle"
+        assert normalize_merchant("SQ *BLUE BOTTLE 0518") == "blue bottle"
+
+    @pytest.mark.parametrize(
+        "payee, expected",
+        [
+            ("7-ELEVEN", "7-eleven"),
+            ("24 HOUR FITNESS", "24 hour fitness"),
+            ("NETFLIX.COM", "netflix"),
+            ("Trader Joe's", "trader joe's"),
+        ],
+    )
+    def test_02_keeps_names_with_digits_and_punctuation(self, payee, expected):
+        """Test leading numbers, hyphens and apostrophes survive, domains don't."""
+        assert normalize_merchant(payee) == expected
+
+    @pytest.mark.parametrize(
+        "description, expected",
+        [
+            ("POS DEBIT TARGET STORE 1234", "target"),
+            ("PURCHASE AUTHORIZED ON 04/23 SAFEWAY #1234", "safeway"),
+            ("CHECKCARD 0423 SHELL OIL 57444", "shell oil"),
+            ("TST* CHIPOTLE 2024-04-23 CARD 1234", "chipotle"),
+            ("AMAZON MKTPLACE XXXX1234", "amazon mktplace"),
+            ("SPOTIFY USA ...4821", "spotify usa"),
+        ],
+    )
+    def test_03_strips_bank_noise(self, description, expected):
+        """Test prefixes, dates, card suffixes and filler words are removed."""
+        assert normalize_merchant(None, description) == expected
+
+    def test_04_prefers_payee(self):
+        """Test the payee is used over the description when present."""
+        assert normalize_merchant("Blue Bottle", "SQ *BLUE BTL 0423") == "blue bottle"
+        assert normalize_merchant("", "SQ *BLUE BOTTLE 0423") == "blue bottle"
+
+    def test_05_nothing_merchant_like(self):
+        """Test empty or all-noise input has no merchant key."""
+        assert normalize_merchant(None) is None
+        assert normalize_merchant("   ", None) is None
+        assert normalize_merchant("POS 04/23 #1234") is None
@@ -0,0 +1,132 @@
+"""Unit tests for the raw SimpleFin payload archive (temporary directory)."""
+
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.services import payload_archive, simplefin_service
+from app.services.payload_archive import (
+    PayloadArchiveReader,
+    PayloadArchiveWriter,
+    payload_path,
+)
+
+PAYLOAD = json.dumps(
+    {
+        "errors": ["Connection to Example Bank may need attention"],
+        "accounts": [
+            {
+                "id": "ACT-1",
+                "name": "Checking",
+                "currency": "USD",
+                "balance": "100.25",
+                "transactions": [
+                    {"id": "TRN-1", "amount": "-12.50", "description": "BLUE BOTTLE"},
+                    {"id": "TRN-2", "amount": "1000.00", "description": "PAYROLL"},
+                ],
+            }
+        ],
+    }
+).encode()
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "simplefin_archive_dir", str(tmp_path))
+    return tmp_path
+
+
+def archive(payload: bytes, chunk_size: int = 16) -> str:
+    writer = PayloadArchiveWriter()
+    for i in range(0, len(payload), chunk_size):
+        writer.write(payload[i : i + chunk_size])
+    return writer.commit()
+
+
+async def read_all(digest: str) -> bytes:
+    reader = PayloadArchiveReader(digest)
+    try:
+        return await reader.read()
+    finally:
+        reader.close()
+
+
+class TestRoundTrip:
+    """Test payloads come back exactly as they were streamed in."""
+
+    async def test_01_round_trip(self, archive_dir):
+        """Test a chunked payload is stored by its SHA-256 and read back intact."""
+        digest = archive(PAYLOAD)
+        assert digest == hashlib.sha256(PAYLOAD).hexdigest()
+        assert payload_path(digest) == (archive_dir / digest[:2] / f"{digest}.json.gz")
+        assert await read_all(digest) == PAYLOAD
+        assert list(archive_dir.glob("*.partial")) == []
+
+    async def test_02_identical_payloads_stored_once(self, archive_dir):
+        """Test the same payload archived twice keeps one file."""
+        assert archive(PAYLOAD) == archive(PAYLOAD, chunk_size=7)
+        assert len(list(archive_dir.glob("*/*.json.gz"))) == 1
+
+    async def test_03_replays_through_parser(self):
+        """Test an archived payload decodes like the live stream."""
+        reader = PayloadArchiveReader(archive(PAYLOAD))
+        try:
+            events = [
+                event async for event in simplefin_service.iter_account_events(reader)
+            ]
+        finally:
+            reader.close()
+        assert [kind for kind, _ in events] == [
+            "error",
+            "transactions_start",
+            "transaction",
+            "transaction",
+            "account",
+        ]
+        assert events[2][1]["id"] == "TRN-1"
+        assert events[4][1]["id"] == "ACT-1"
+
+    async def test_04_abort_leaves_nothing(self, archive_dir):
+        """Test an aborted write removes its partial file."""
+        writer = PayloadArchiveWriter()
+        writer.write(PAYLOAD[:10])
+        writer.abort()
+        assert list(archive_dir.rglob("*")) == []
+
+    async def test_05_missing_payload(self):
+        """Test reading an unknown digest raises FileNotFoundError."""
+        with pytest.raises(FileNotFoundError):
+            PayloadArchiveReader("ab" + "0" * 62)
+
+
+class TestPrune:
+    """Test retention of archived payloads."""
+
+    def age(self, path, days: float) -> None:
+        then = time.time() - days * 86400
+        os.utime(path, (then, then))
+
+    def test_01_prunes_only_expired(self, archive_dir):
+        """Test payloads and partial writes past retention are deleted."""
+        old = payload_path(archive(PAYLOAD))
+        recent = payload_path(archive(b'{"accounts": []}'))
+        partial = archive_dir / "abandoned.partial"
+        partial.write_bytes(b"...")
+        self.age(old, 31)
+        self.age(partial, 31)
+        self.age(recent, 29)
+
+        assert payload_archive.prune(retention_days=30) == 2
+        assert not old.exists() and not partial.exists()
+        assert recent.exists()
+
+    def test_02_missing_archive_dir(self, archive_dir, monkeypatch):
+        """Test pruning before anything was archived deletes nothing."""
+        monkeypatch.setattr(
+            get_settings(), "simplefin_archive_dir", str(archive_dir / "missing")
+        )
+        assert payload_archive.prune(retention_days=30) == 0
@@ -0,0 +1,118 @@
+"""Unit tests for SimpleFin sync helpers (no database or network)."""
+
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.services import simplefin_service
+from app.services.simplefin_sync_service import (
+    _classify_transactions,
+    incremental_start_date,
+)
+
+RAW_TRANSACTION = {
+    "id": "TRN-1",
+    "posted": 1700000000,
+    "transacted_at": 1699990000,
+    "amount": "-12.50",
+    "description": "SQ *BLUE BOTTLE 0423",
+    "payee": "Blue Bottle",
+    "memo": "",
+}
+
+
+def parse(**overrides) -> dict:
+    return simplefin_service.parse_simplefin_transaction(
+        {**RAW_TRANSACTION, **overrides}, "account-uuid", "user-uuid"
+    )
+
+
+class TestContentHash:
+    """Test the content hash that lets syncs skip unchanged transactions."""
+
+    def test_01_same_content_same_hash(self):
+        """Test parsing the same transaction twice gives the same hash."""
+        assert parse()["content_hash"] == parse()["content_hash"]
+
+    def test_02_changed_field_changes_hash(self):
+        """Test every SimpleFin-sourced field change is detected."""
+        original = parse()["content_hash"]
+        assert parse(amount="-13.00")["content_hash"] != original
+        assert parse(description="BLUE BOTTLE")["content_hash"] != original
+        assert parse(posted=1700000001)["content_hash"] != original
+        assert parse(payee="Blue Bottle Coffee")["content_hash"] != original
+
+    def test_03_derived_fields_not_hashed(self):
+        """Test merchant_key (derived by our parser) doesn't affect the hash."""
+        transaction = parse()
+        changed = {**transaction, "merchant_key": "something else"}
+        assert simplefin_service.compute_transaction_hash(changed) == (
+            transaction["content_hash"]
+        )
+
+    def test_04_equivalent_amounts_same_hash(self):
+        """Test amounts are hashed by value, not by their string form."""
+        assert parse(amount="-12.5")["content_hash"] == parse()["content_hash"]
+
+
+class TestClassifyTransactions:
+    """Test splitting parsed transactions into new, changed and unchanged."""
+
+    def test_01_classify(self):
+        """Test each transaction lands in the right bucket."""
+        unchanged = parse(id="TRN-1")
+        changed = parse(id="TRN-2")
+        new = parse(id="TRN-3")
+        existing = {
+            "TRN-1": unchanged["content_hash"],
+            "TRN-2": "stale-hash",
+        }
+
+        added, updated, unchanged_count = _classify_transactions(
+            [unchanged, changed, new], existing
+        )
+
+        assert added == [new]
+        assert updated == [changed]
+        assert unchanged_count == 1
+
+    def test_02_stored_row_without_hash_is_changed(self):
+        """Test rows stored before hashing existed (NULL hash) get rewritten."""
+        transaction = parse()
+        added, updated, unchanged_count = _classify_transactions(
+            [transaction], {"TRN-1": None}
+        )
+        assert (added, updated, unchanged_count) == ([], [transaction], 0)
+
+    def test_03_empty_batch(self):
+        """Test an empty batch classifies to nothing."""
+        assert _classify_transactions([], {}) == ([], [], 0)
+
+
+class TestIncrementalStartDate:
+    """Test the start date of an incremental sync."""
+
+    @pytest.fixture(autouse=True)
+    def overlap(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "simplefin_sync_overlap_days", 3)
+
+    def test_01_high_water_mark_minus_overlap(self):
+        """Test syncs start the overlap before the latest posted transaction."""
+        item = {"last_posted_date": 1700000000}
+        assert incremental_start_date(item, default_lookback_days=30) == (
+            1700000000 - 3 * 86400
+        )
+
+    def test_02_clamped_at_epoch(self):
+        """Test an early high-water mark never gives a negative start."""
+        assert incremental_start_date({"last_posted_date": 3600}) == 0
+
+    def test_03_default_lookback_when_never_synced(self):
+        """Test an item without a high-water mark uses the lookback window."""
+        start = incremental_start_date({}, default_lookback_days=30)
+        assert abs(start - (time.time() - 30 * 86400)) < 5
+
+    def test_04_simplefin_default_without_lookback(self):
+        """Test None (SimpleFin's default window) with no mark and no lookback."""
+        assert incremental_start_date({"last_posted_date": None}) is None
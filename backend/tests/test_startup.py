@@ -0,0 +1,80 @@
+"""Test API startup: cold-start budget and readiness."""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Cold start (interpreter, imports, lifespan) to the first served request.
+# Rollouts and scale-out wait on this, so keep it within a couple of seconds.
+STARTUP_BUDGET_SECONDS = 2.0
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Serves one request in a fresh interpreter, then exits without waiting for
+# background warm-up (not part of the budget)
+COLD_START_SCRIPT = """
+import os
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+client.__enter__()
+response = client.get("/health")
+print(response.status_code, flush=True)
+os._exit(0)
+"""
+
+
+class TestStartup:
+    """Test that the API starts quickly and reports readiness."""
+
+    def test_01_cold_start_within_budget(self):
+        """Test cold start to first served request stays within budget."""
+        # Best of three, so one slow run on a busy machine doesn't fail the test
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", COLD_START_SCRIPT],
+                cwd=BACKEND_DIR,
+                env={**os.environ, "APP_ENV": "testing"},
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            timings.append(time.perf_counter() - started)
+            assert result.returncode == 0, result.stderr
+            assert result.stdout.strip().endswith("200")
+
+        assert min(timings) < STARTUP_BUDGET_SECONDS, (
+            f"Cold start took {min(timings):.2f}s "
+            f"(budget {STARTUP_BUDGET_SECONDS}s); profile with "
+            f"`python -X importtime -c 'import app.main'`"
+        )
+
+    def test_02_health_served_while_warming(self, client: TestClient):
+        """Test /health answers regardless of cache warm-up."""
+        response = client.get("/health")
+        assert response.status_code == 200
+
+    def test_03_ready_after_warm_up(self, client: TestClient):
+        """Test /ready reports warming (503) until caches are loaded, then 200."""
+        deadline = time.monotonic() + 30
+        while True:
+            response = client.get("/ready")
+            data = response.json()
+            assert data["status"] in ("warming", "ready")
+            if response.status_code == 200:
+                break
+            assert response.status_code == 503
+            if time.monotonic() > deadline:
+                pytest.fail(f"Caches still warming after 30s: {data['caches']}")
+            time.sleep(0.2)
+
+        assert data["status"] == "ready"
+        assert set(data["caches"]) == {"supabase_client", "jwks"}
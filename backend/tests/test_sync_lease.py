@@ -0,0 +1,155 @@
+"""Unit tests for the single-flight SimpleFin sync lease (in-memory lease store)."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.services import simplefin_sync_service
+from app.services.simplefin_sync_service import (
+    SyncInProgressError,
+    _renew_sync_lease,
+    _sync_item_with_lease,
+    sync_item,
+)
+
+ITEM = {"id": "item-1"}
+
+
+class FakeLeaseDB:
+    """Keeps item leases the way acquire/release_simplefin_sync_lease do."""
+
+    def __init__(self, sync_jobs: dict[str, dict] | None = None):
+        self.leases = {}  # item_id -> (job_id, expires_at)
+        self.sync_jobs = sync_jobs or {}
+        self.acquires = 0
+
+    def acquire_simplefin_sync_lease(self, item_id, job_id, ttl_seconds):
+        self.acquires += 1
+        holder, expires_at = self.leases.get(item_id, (None, 0))
+        if holder is None or holder == job_id or expires_at < time.monotonic():
+            self.leases[item_id] = (job_id, time.monotonic() + ttl_seconds)
+            return job_id
+        return holder
+
+    def release_simplefin_sync_lease(self, item_id, job_id):
+        if self.leases.get(item_id, (None, 0))[0] == job_id:
+            del self.leases[item_id]
+
+    def get_simplefin_sync_job_by_id(self, job_id):
+        return self.sync_jobs.get(job_id)
+
+
+@pytest.fixture
+def syncs(monkeypatch):
+    """Replace the sync itself with a recorder; returns the recorded job IDs."""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "simplefin_sync_lease_seconds", 60)
+    monkeypatch.setattr(settings, "simplefin_sync_attach_timeout_seconds", 0)
+    ran = []
+
+    async def run_sync(db, item, institutions, sync_job, *args):
+        ran.append(sync_job["id"])
+        await asyncio.sleep(0.01)
+        return {"sync_job_id": sync_job["id"], "accounts_synced": 1}
+
+    monkeypatch.setattr(
+        simplefin_sync_service, "_admit_institutions", lambda db, item: []
+    )
+    monkeypatch.setattr(
+        simplefin_sync_service,
+        "_create_sync_job",
+        lambda db, item, job_id: {"id": job_id},
+    )
+    monkeypatch.setattr(simplefin_sync_service, "_run_sync", run_sync)
+    return ran
+
+
+class TestSyncLease:
+    """Test taking, attaching to and releasing the item's sync lease."""
+
+    async def test_01_free_lease_runs_and_releases(self, syncs):
+        """Test a free item is synced under the lease, which is then released."""
+        db = FakeLeaseDB()
+        result = await _sync_item_with_lease(db, ITEM, None, None)
+        assert syncs == [result["sync_job_id"]]
+        assert db.leases == {}
+
+    async def test_02_attaches_to_finished_holder(self, syncs):
+        """Test a held item returns the holder's result without syncing again."""
+        db = FakeLeaseDB(
+            {
+                "other-job": {
+                    "id": "other-job",
+                    "status": "completed",
+                    "accounts_synced": 3,
+                    "transactions_added": 7,
+                }
+            }
+        )
+        db.leases[ITEM["id"]] = ("other-job", time.monotonic() + 60)
+        result = await _sync_item_with_lease(db, ITEM, None, None)
+        assert syncs == []
+        assert result["sync_job_id"] == "other-job"
+        assert result["transactions_added"] == 7
+        assert db.leases[ITEM["id"]][0] == "other-job"
+
+    async def test_03_attach_to_failed_holder_raises(self, syncs):
+        """Test the holder's failure is surfaced to attached callers."""
+        db = FakeLeaseDB(
+            {"other-job": {"status": "failed", "error_message": "bridge down"}}
+        )
+        db.leases[ITEM["id"]] = ("other-job", time.monotonic() + 60)
+        with pytest.raises(RuntimeError, match="bridge down"):
+            await _sync_item_with_lease(db, ITEM, None, None)
+
+    async def test_04_attach_timeout(self, syncs):
+        """Test a holder still running after the attach timeout raises."""
+        db = FakeLeaseDB({"other-job": {"status": "running"}})
+        db.leases[ITEM["id"]] = ("other-job", time.monotonic() + 60)
+        with pytest.raises(SyncInProgressError) as error:
+            await _sync_item_with_lease(db, ITEM, None, None)
+        assert error.value.sync_job_id == "other-job"
+        assert syncs == []
+
+    async def test_05_expired_lease_is_taken_over(self, syncs):
+        """Test a crashed holder's lease is reclaimed once it expires."""
+        db = FakeLeaseDB()
+        db.leases[ITEM["id"]] = ("crashed-job", time.monotonic() - 1)
+        result = await _sync_item_with_lease(db, ITEM, None, None)
+        assert syncs == [result["sync_job_id"]]
+
+    async def test_06_concurrent_calls_share_one_sync(self, syncs):
+        """Test concurrent sync_item calls in one process run a single sync."""
+        db = FakeLeaseDB()
+        results = await asyncio.gather(*(sync_item(db, ITEM) for _ in range(3)))
+        assert len(syncs) == 1
+        assert {r["sync_job_id"] for r in results} == {syncs[0]}
+        assert db.acquires == 1
+
+
+class TestLeaseRenewal:
+    """Test the running sync keeps its lease from expiring."""
+
+    async def test_01_renewal_keeps_lease(self, monkeypatch):
+        """Test a sync longer than the lease TTL still holds the lease."""
+        monkeypatch.setattr(get_settings(), "simplefin_sync_lease_seconds", 0.03)
+        db = FakeLeaseDB()
+        db.acquire_simplefin_sync_lease(ITEM["id"], "job-1", 0.03)
+        renewal = asyncio.create_task(_renew_sync_lease(db, ITEM["id"], "job-1"))
+        await asyncio.sleep(0.1)  # Over three TTLs
+
+        assert db.acquire_simplefin_sync_lease(ITEM["id"], "job-2", 0.03) == "job-1"
+        renewal.cancel()
+
+        await asyncio.sleep(0.05)  # Not renewed any more, so it expires
+        assert db.acquire_simplefin_sync_lease(ITEM["id"], "job-2", 0.03) == "job-2"
+
+    async def test_02_renewal_stops_when_lease_lost(self, monkeypatch):
+        """Test renewal gives up once another job holds the lease."""
+        monkeypatch.setattr(get_settings(), "simplefin_sync_lease_seconds", 0.03)
+        db = FakeLeaseDB()
+        db.leases[ITEM["id"]] = ("job-2", time.monotonic() + 60)
+        await asyncio.wait_for(_renew_sync_lease(db, ITEM["id"], "job-1"), timeout=1)
+        assert db.leases[ITEM["id"]][0] == "job-2"
@@ -0,0 +1,133 @@
+"""Unit tests for quota-aware SimpleFin sync scheduling."""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.config import get_settings
+from app.services import sync_scheduler
+from app.services.sync_scheduler import (
+    QuotaExhaustedError,
+    is_due,
+    item_slot_offset,
+    latest_slot,
+    quota_remaining,
+    reserve_request,
+    select_due_items,
+    utc_today,
+)
+
+NOW = datetime(2026, 3, 15, 12, 0, tzinfo=timezone.utc)
+
+
+class TestSlots:
+    """Test per-item sync slots."""
+
+    def test_01_offset_is_stable_and_in_range(self):
+        """Test an item's slot is the same every call and within one day."""
+        for item_id in ("item-a", "item-b", "0c5e3a52-7d1e-4f0b-9a51-6f2a1c9b8e47"):
+            offset = item_slot_offset(item_id)
+            assert offset == item_slot_offset(item_id)
+            assert 0 <= offset < sync_scheduler.SECONDS_PER_DAY
+
+    def test_02_offsets_spread_items(self):
+        """Test different items land in different slots."""
+        offsets = {item_slot_offset(f"item-{i}") for i in range(100)}
+        assert len(offsets) > 90
+
+    def test_03_latest_slot_not_in_future(self, monkeypatch):
+        """Test the latest slot is today's slot once passed, else yesterday's."""
+        monkeypatch.setattr(sync_scheduler, "item_slot_offset", lambda item_id: 3600)
+        assert latest_slot("item", NOW) == NOW.replace(hour=1)
+        early = NOW.replace(hour=0, minute=30)
+        assert latest_slot("item", early) == NOW.replace(hour=1) - timedelta(days=1)
+
+    def test_04_is_due(self, monkeypatch):
+        """Test an item is due until it syncs after its latest slot."""
+        monkeypatch.setattr(sync_scheduler, "item_slot_offset", lambda item_id: 3600)
+        assert is_due({"id": "item"}, NOW)
+        assert is_due({"id": "item", "last_synced_at": "2026-03-15T00:59:00Z"}, NOW)
+        assert not is_due(
+            {"id": "item", "last_synced_at": "2026-03-15T01:00:01+00:00"}, NOW
+        )
+
+
+class TestSelectDueItems:
+    """Test picking the items to sync on a tick."""
+
+    @pytest.fixture(autouse=True)
+    def slots(self, monkeypatch):
+        offsets = {"a": 3600, "b": 7200, "c": 10800, "later": 50000}
+        monkeypatch.setattr(
+            sync_scheduler, "item_slot_offset", lambda item_id: offsets[item_id]
+        )
+
+    def test_01_most_overdue_first(self):
+        """Test due items are ordered by slot, skipping items not yet due."""
+        items = [
+            {"id": "c"},
+            {"id": "a"},
+            {"id": "b", "last_synced_at": "2026-03-15T11:00:00Z"},
+            {"id": "later", "last_synced_at": "2026-03-14T20:00:00Z"},
+        ]
+        assert [item["id"] for item in select_due_items(items, NOW, 10)] == ["a", "c"]
+
+    def test_02_respects_limit(self):
+        """Test no more than limit items are dispatched per tick."""
+        items = [{"id": "c"}, {"id": "b"}, {"id": "a"}]
+        assert [item["id"] for item in select_due_items(items, NOW, 2)] == ["a", "b"]
+
+
+class FakeQuotaDB:
+    def __init__(self, allowed: bool):
+        self.allowed = allowed
+        self.calls = []
+
+    def reserve_simplefin_request(self, item_id, quota):
+        self.calls.append((item_id, quota))
+        return self.allowed
+
+
+class TestQuota:
+    """Test the per-item daily request quota."""
+
+    @pytest.fixture(autouse=True)
+    def quota(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "simplefin_daily_request_quota", 24)
+
+    def test_01_remaining_today(self):
+        """Test requests used today count against the quota."""
+        item = {"quota_date": "2026-03-15", "quota_used": 10}
+        assert quota_remaining(item, NOW) == 14
+
+    def test_02_resets_on_new_day(self):
+        """Test usage from a previous day is ignored."""
+        item = {"quota_date": "2026-03-14", "quota_used": 24}
+        assert quota_remaining(item, NOW) == 24
+        assert quota_remaining({}, NOW) == 24
+
+    def test_03_never_negative(self):
+        """Test overuse reports zero remaining."""
+        item = {"quota_date": "2026-03-15", "quota_used": 30}
+        assert quota_remaining(item, NOW) == 0
+
+    def test_04_reserve_request(self):
+        """Test a reservation passes the configured quota to the database."""
+        db = FakeQuotaDB(allowed=True)
+        reserve_request(db, {"id": "item"})
+        assert db.calls == [("item", 24)]
+
+    def test_05_reserve_request_exhausted(self):
+        """Test a refused reservation raises QuotaExhaustedError."""
+        with pytest.raises(QuotaExhaustedError) as error:
+            reserve_request(FakeQuotaDB(allowed=False), {"id": "item"})
+        assert error.value.item_id == "item"
+
+    def test_06_utc_day(self):
+        """Test the quota day is the UTC date, not the caller's local date."""
+        pacific_evening = datetime(
+            2026, 3, 14, 20, 0, tzinfo=timezone(timedelta(hours=-8))
+        )
+        assert utc_today(pacific_evening) == date(2026, 3, 15)
+        item = {"quota_date": "2026-03-15", "quota_used": 10}
+        assert quota_remaining(item, pacific_evening) == 14